@@ -0,0 +1,368 @@
+# api/attempt_archive.py - Archivo mensual de intentos antiguos (tabla por periodo) y retención
+"""
+exercise_attempts guarda solo los intentos recientes; los anteriores a
+ATTEMPT_ARCHIVE_AFTER_DAYS se mueven por lotes pequeños a una tabla por mes
+(exercise_attempts_YYYYMM). La retención es un DROP TABLE del mes caducado.
+
+No se usa el particionado nativo de MySQL: exige que la columna de partición
+forme parte de cada clave única (aquí la PK es solo id) y no admite claves
+foráneas, y exercise_attempts las tiene hacia users y lessons. La tabla por
+periodo funciona igual en MySQL y SQLite.
+
+El código de los intentos archivados queda en code_blobs (comprimido), así
+que las tablas mensuales solo guardan metadatos y el hash.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from sqlalchemy import (
+    Boolean, Column, Index, Integer, MetaData, String, Table, Text, delete, inspect, insert, select,
+)
+
+import metrics
+from code_store import code_store
+from database import engine
+from models import ExerciseAttempt, SecondsDateTime
+from pagination import decode_cursor, keyset_filter, keyset_order
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuración
+ATTEMPT_ARCHIVE_ENABLED = os.getenv("ATTEMPT_ARCHIVE_ENABLED", "false").lower() in ("1", "true", "yes")
+ATTEMPT_ARCHIVE_AFTER_DAYS = int(os.getenv("ATTEMPT_ARCHIVE_AFTER_DAYS", "180"))
+# Filas por transacción: cada lote bloquea pocas filas de la tabla caliente y durante poco tiempo
+ATTEMPT_ARCHIVE_BATCH_SIZE = int(os.getenv("ATTEMPT_ARCHIVE_BATCH_SIZE", "500"))
+ATTEMPT_ARCHIVE_BATCH_SLEEP = float(os.getenv("ATTEMPT_ARCHIVE_BATCH_SLEEP", "0.2"))
+ATTEMPT_ARCHIVE_INTERVAL = float(os.getenv("ATTEMPT_ARCHIVE_INTERVAL", "3600"))
+# Meses de archivo a conservar (0 = para siempre)
+ATTEMPT_RETENTION_MONTHS = int(os.getenv("ATTEMPT_RETENTION_MONTHS", "0"))
+# Cada cuánto otros procesos vuelven a listar las tablas mensuales
+ARCHIVE_CATALOG_TTL = float(os.getenv("ARCHIVE_CATALOG_TTL", "300"))
+
+TABLE_PREFIX = "exercise_attempts_"
+TABLE_PATTERN = re.compile(rf"^{TABLE_PREFIX}(\d{{6}})$")
+
+# Fuera de Base.metadata: create_all no debe crearlas y se definen bajo demanda
+archive_metadata = MetaData()
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def period_of(moment: datetime) -> str:
+    return f"{moment.year:04d}{moment.month:02d}"
+
+
+def shift_period(period: str, months: int) -> str:
+    index = int(period[:4]) * 12 + int(period[4:]) - 1 + months
+    return f"{index // 12:04d}{index % 12 + 1:02d}"
+
+
+def archive_table(period: str) -> Table:
+    """Tabla mensual con las columnas de exercise_attempts (sin claves foráneas)"""
+    name = TABLE_PREFIX + period
+    if name in archive_metadata.tables:
+        return archive_metadata.tables[name]
+    return Table(
+        name, archive_metadata,
+        Column("id", Integer, primary_key=True, autoincrement=False),
+        Column("user_id", Integer, nullable=False),
+        Column("lesson_id", Integer, nullable=False),
+        Column("code_submitted", Text, nullable=False),
+        Column("code_hash", String(64)),
+        Column("is_correct", Boolean, nullable=False),
+        Column("attempt_date", SecondsDateTime),
+        # Mismos accesos que la tabla caliente
+        Index(f"ix_{name}_user_lesson_date", "user_id", "lesson_id", "attempt_date"),
+        Index(f"ix_{name}_user_date", "user_id", "attempt_date"),
+    )
+
+
+class ArchivedAttempt:
+    """Intento leído de una tabla mensual, con los atributos de ExerciseAttempt"""
+
+    def __init__(self, id, user_id, lesson_id, code_submitted, code_hash, is_correct, attempt_date):
+        self.id = id
+        self.user_id = user_id
+        self.lesson_id = lesson_id
+        self.code_submitted = code_submitted
+        self.code_hash = code_hash
+        self.is_correct = is_correct
+        self.attempt_date = attempt_date
+
+
+class ArchiveCatalog:
+    """Periodos archivados (del más reciente al más antiguo), releídos cada ARCHIVE_CATALOG_TTL"""
+
+    def __init__(self, ttl: float = ARCHIVE_CATALOG_TTL):
+        self.ttl = ttl
+        self._periods = []
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        names = inspect(engine).get_table_names()
+        periods = sorted((match.group(1) for match in map(TABLE_PATTERN.match, names) if match), reverse=True)
+        with self._lock:
+            self._periods = periods
+            self._loaded_at = time.monotonic()
+        return periods
+
+    def _fresh(self):
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return list(self._periods)
+        return None
+
+    def periods(self):
+        periods = self._fresh()
+        return periods if periods is not None else self.refresh()
+
+    async def periods_async(self):
+        periods = self._fresh()
+        return periods if periods is not None else await asyncio.to_thread(self.refresh)
+
+
+def _page_periods(periods, cursor_values):
+    # Con cursor, los meses posteriores a su fecha no pueden aportar filas
+    if cursor_values is None:
+        return periods
+    newest = period_of(cursor_values[0])
+    return [period for period in periods if period <= newest]
+
+
+def archived_page_query(table, user_id, cursor_values, count):
+    keys = (table.c.attempt_date, table.c.id)
+    statement = select(table).where(table.c.user_id == user_id)
+    if cursor_values is not None:
+        statement = statement.where(keyset_filter(keys, cursor_values, descending=True))
+    return statement.order_by(*keyset_order(keys, descending=True)).limit(count)
+
+
+def archived_last_query(table, user_id, lesson_id):
+    return (
+        select(table)
+        .where(table.c.user_id == user_id, table.c.lesson_id == lesson_id)
+        .order_by(table.c.attempt_date.desc())
+        .limit(1)
+    )
+
+
+def archived_attempts(db, user_id, cursor, count):
+    """Continuación de /intentos en el archivo: todo lo archivado es anterior a la tabla caliente"""
+    cursor_values = decode_cursor(cursor, 2) if cursor else None
+    rows = []
+    for period in _page_periods(catalog.periods(), cursor_values):
+        if len(rows) >= count:
+            break
+        statement = archived_page_query(archive_table(period), user_id, cursor_values, count - len(rows))
+        rows.extend(ArchivedAttempt(**row._mapping) for row in db.execute(statement))
+    return rows
+
+
+async def archived_attempts_async(db, user_id, cursor, count):
+    cursor_values = decode_cursor(cursor, 2) if cursor else None
+    rows = []
+    for period in _page_periods(await catalog.periods_async(), cursor_values):
+        if len(rows) >= count:
+            break
+        statement = archived_page_query(archive_table(period), user_id, cursor_values, count - len(rows))
+        rows.extend(ArchivedAttempt(**row._mapping) for row in await db.execute(statement))
+    return rows
+
+
+def archived_last_attempt(db, user_id, lesson_id):
+    """Último intento archivado de la lección, buscando del mes más reciente hacia atrás"""
+    for period in catalog.periods():
+        row = db.execute(archived_last_query(archive_table(period), user_id, lesson_id)).first()
+        if row is not None:
+            return ArchivedAttempt(**row._mapping)
+    return None
+
+
+async def archived_last_attempt_async(db, user_id, lesson_id):
+    for period in await catalog.periods_async():
+        row = (await db.execute(archived_last_query(archive_table(period), user_id, lesson_id))).first()
+        if row is not None:
+            return ArchivedAttempt(**row._mapping)
+    return None
+
+
+def delete_archived_attempt(db, user_id, attempt_id):
+    """Borrar un intento archivado del usuario; None si no existe, False si es de otro usuario"""
+    for period in catalog.periods():
+        table = archive_table(period)
+        owner = db.execute(select(table.c.user_id).where(table.c.id == attempt_id)).scalar()
+        if owner is not None:
+            if owner != user_id:
+                return False
+            db.execute(delete(table).where(table.c.id == attempt_id))
+            return True
+    return None
+
+
+async def delete_archived_attempt_async(db, user_id, attempt_id):
+    for period in await catalog.periods_async():
+        table = archive_table(period)
+        owner = (await db.execute(select(table.c.user_id).where(table.c.id == attempt_id))).scalar()
+        if owner is not None:
+            if owner != user_id:
+                return False
+            await db.execute(delete(table).where(table.c.id == attempt_id))
+            return True
+    return None
+
+
+def archive_batch_query(horizon: datetime, batch_size: int):
+    """Lote de intentos más antiguos que `horizon`, en orden de fecha"""
+    attempts = ExerciseAttempt.__table__
+    return (
+        select(attempts)
+        .where(attempts.c.attempt_date < horizon)
+        .order_by(attempts.c.attempt_date)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def archive_batch(horizon: datetime, batch_size: int = ATTEMPT_ARCHIVE_BATCH_SIZE) -> int:
+    """Mover un lote de los intentos más antiguos que `horizon` a su tabla mensual.
+
+    Una transacción por lote: INSERT en el archivo y DELETE por id en la tabla
+    caliente. SKIP LOCKED evita que dos archivadores (o un envío) se esperen.
+    """
+    attempts = ExerciseAttempt.__table__
+    with engine.begin() as conn:
+        rows = conn.execute(archive_batch_query(horizon, batch_size)).all()
+        if not rows:
+            return 0
+        by_period = {}
+        for row in rows:
+            by_period.setdefault(period_of(row.attempt_date), []).append(dict(row._mapping))
+        # Filas anteriores a migrate_code_blobs.py: el código se comprime al archivarlas
+        legacy = [row for group in by_period.values() for row in group if row["code_hash"] is None]
+        if legacy:
+            hashes = code_store.put_many(conn, [row["code_submitted"] for row in legacy])
+            for row, digest in zip(legacy, hashes):
+                row["code_hash"], row["code_submitted"] = digest, ""
+        for period, group in by_period.items():
+            table = archive_table(period)
+            table.create(bind=conn, checkfirst=True)
+            conn.execute(insert(table), group)
+        conn.execute(delete(attempts).where(attempts.c.id.in_([row.id for row in rows])))
+    return len(rows)
+
+
+def drop_expired(now: datetime = None, retention_months: int = ATTEMPT_RETENTION_MONTHS):
+    """Retención: borrar las tablas mensuales más antiguas que retention_months"""
+    if retention_months <= 0:
+        return []
+    oldest_kept = shift_period(period_of(now or _utcnow()), -retention_months)
+    dropped = []
+    for period in catalog.refresh():
+        if period < oldest_kept:
+            archive_table(period).drop(bind=engine, checkfirst=True)
+            archive_metadata.remove(archive_table(period))
+            dropped.append(period)
+            logger.info("🗑️ Archive table dropped: %s%s", TABLE_PREFIX, period)
+    return dropped
+
+
+class AttemptArchiver:
+    """Hilo que archiva por lotes con pausas y aplica la retención cada ATTEMPT_ARCHIVE_INTERVAL"""
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread = None
+        self.archived_rows = 0
+        self.batches = 0
+        self.dropped_tables = 0
+        self.last_run = None
+        self.run_duration = metrics.Histogram(buckets=(0.1, 1.0, 10.0, 60.0, 300.0, 1800.0))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="attempt-archiver", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("❌ Attempt archival failed: %s", e)
+            self._stop.wait(ATTEMPT_ARCHIVE_INTERVAL)
+
+    def run_once(self, after_days: int = ATTEMPT_ARCHIVE_AFTER_DAYS, max_batches: int = None):
+        started = time.perf_counter()
+        horizon = _utcnow() - timedelta(days=after_days)
+        moved = batches = 0
+        while not self._stop.is_set() and (max_batches is None or batches < max_batches):
+            count = archive_batch(horizon)
+            if not count:
+                break
+            moved += count
+            batches += 1
+            self.archived_rows += count
+            self.batches += 1
+            # Pausa entre lotes: deja pasar a las escrituras de la API
+            self._stop.wait(ATTEMPT_ARCHIVE_BATCH_SLEEP)
+        if moved:
+            logger.info("📦 %s attempts archived in %s batches", moved, batches)
+        self.dropped_tables += len(drop_expired())
+        catalog.refresh()
+        self.last_run = _utcnow()
+        self.run_duration.observe(time.perf_counter() - started)
+        return moved
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        return {
+            "enabled": ATTEMPT_ARCHIVE_ENABLED,
+            "after_days": ATTEMPT_ARCHIVE_AFTER_DAYS,
+            "retention_months": ATTEMPT_RETENTION_MONTHS,
+            "archive_tables": len(catalog._periods),
+            "archived_rows": self.archived_rows,
+            "batches": self.batches,
+            "dropped_tables": self.dropped_tables,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "run_seconds": self.run_duration.snapshot(),
+        }
+
+
+catalog = ArchiveCatalog()
+archiver = AttemptArchiver()
+metrics.register("attempt_archive", archiver.stats)
+
+
+if __name__ == "__main__":
+    from logging_config import setup_logging, stop_logging
+
+    parser = argparse.ArgumentParser(description="Archivar intentos antiguos en tablas mensuales")
+    parser.add_argument("--after-days", type=int, default=ATTEMPT_ARCHIVE_AFTER_DAYS, help="antigüedad mínima a archivar")
+    parser.add_argument("--max-batches", type=int, default=None, help="parar tras N lotes")
+    args = parser.parse_args()
+
+    setup_logging()
+    try:
+        moved = archiver.run_once(args.after_days, args.max_batches)
+        print(f"📦 {moved} attempts archived, {len(catalog.periods())} archive tables")
+    finally:
+        stop_logging()
@@ -0,0 +1,422 @@
+# api/attempt_buffer.py - Escritura diferida (write-behind) de intentos en lotes
+import asyncio
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import DBAPIError, IntegrityError, InterfaceError, OperationalError, TimeoutError as PoolTimeout
+
+import metrics
+from code_store import CODE_STORE_ENABLED, code_store
+from database import engine
+from logging_config import LOG_DIR
+from models import ExerciseAttempt, IdBlock
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuración (activar en todos los procesos a la vez: los ids se reservan por bloques
+# y un INSERT autoincremental concurrente podría caer dentro de un bloque ya reservado)
+ATTEMPT_BUFFER_ENABLED = os.getenv("ATTEMPT_BUFFER_ENABLED", "false").lower() in ("1", "true", "yes")
+ATTEMPT_BUFFER_MAX_ROWS = int(os.getenv("ATTEMPT_BUFFER_MAX_ROWS", "200"))
+ATTEMPT_BUFFER_MAX_DELAY = float(os.getenv("ATTEMPT_BUFFER_MAX_DELAY", "0.5"))
+ATTEMPT_ID_BLOCK_SIZE = int(os.getenv("ATTEMPT_ID_BLOCK_SIZE", "100"))
+# Tope de intentos sin insertar (BD caída): por encima cada petición inserta el suyo
+ATTEMPT_BUFFER_MAX_PENDING = int(os.getenv("ATTEMPT_BUFFER_MAX_PENDING", "10000"))
+# Reintentos del último flush al apagar; lo que siga sin insertar se aparta en dead-letter
+ATTEMPT_BUFFER_SHUTDOWN_RETRIES = int(os.getenv("ATTEMPT_BUFFER_SHUTDOWN_RETRIES", "3"))
+# Filas por sentencia INSERT multi-fila (6 parámetros por fila)
+INSERT_CHUNK_ROWS = 500
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def attempt_time():
+    """attempt_date de un intento nuevo, buffer o INSERT directo: UTC de la API sin microsegundos.
+
+    Un solo reloj para las filas del buffer y las de la tabla (func.now() de
+    MySQL es la hora local del servidor) y el mismo formato que SecondsDateTime.
+    """
+    return _utcnow().replace(microsecond=0)
+
+
+def _is_transient(error) -> bool:
+    """Fallo de conexión o de la base de datos (reintentable), no de los datos del lote"""
+    if isinstance(error, (OperationalError, InterfaceError, PoolTimeout)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+class HiLoAllocator:
+    """Ids sin ida y vuelta a la base de datos: hi de id_blocks * tamaño + lo local"""
+
+    def __init__(self, name: str, table_id_column, block_size: int = ATTEMPT_ID_BLOCK_SIZE):
+        self.name = name
+        self.table_id_column = table_id_column
+        self.block_size = block_size
+        self._next = 0
+        self._limit = 0
+        # _lock solo protege los contadores (nunca durante E/S); _reserve_lock serializa las reservas
+        self._lock = threading.Lock()
+        self._reserve_lock = threading.Lock()
+        self.blocks = 0
+
+    def _reserve_block(self):
+        """Incrementar next_hi en su propia transacción y devolver el hi reservado"""
+        for _ in range(3):
+            with engine.begin() as conn:
+                updated = conn.execute(
+                    update(IdBlock).where(IdBlock.name == self.name).values(next_hi=IdBlock.next_hi + 1)
+                ).rowcount
+                if updated:
+                    return conn.execute(select(IdBlock.next_hi).where(IdBlock.name == self.name)).scalar_one() - 1
+                # Primer bloque: empezar por encima de los ids ya existentes
+                max_id = conn.execute(select(func.max(self.table_id_column))).scalar() or 0
+                first_hi = max_id // self.block_size + 1
+                try:
+                    with conn.begin_nested():
+                        conn.execute(insert(IdBlock).values(name=self.name, next_hi=first_hi + 1))
+                    return first_hi
+                except IntegrityError:
+                    continue  # otro proceso lo creó a la vez: reintentar el UPDATE
+        raise RuntimeError(f"Could not reserve an id block for {self.name}")
+
+    def _take(self):
+        if self._next < self._limit:
+            value = self._next
+            self._next += 1
+            return value
+        return None
+
+    def next_id(self) -> int:
+        with self._lock:
+            value = self._take()
+        if value is not None:
+            return value
+        with self._reserve_lock:
+            # Otro hilo puede haber reservado un bloque mientras se esperaba
+            with self._lock:
+                value = self._take()
+            if value is not None:
+                return value
+            hi = self._reserve_block()
+            with self._lock:
+                self.blocks += 1
+                self._next, self._limit = hi * self.block_size, (hi + 1) * self.block_size
+                return self._take()
+
+    async def next_id_async(self) -> int:
+        # _lock nunca se retiene durante la reserva: tomarlo en el event loop no lo bloquea
+        with self._lock:
+            value = self._take()
+        if value is not None:
+            return value
+        # Reservar bloque (1 de cada block_size llamadas) fuera del event loop
+        return await asyncio.to_thread(self.next_id)
+
+
+class AttemptBuffer:
+    """Acumula intentos y los inserta en lote por tamaño o por tiempo"""
+
+    def __init__(self, max_rows: int = ATTEMPT_BUFFER_MAX_ROWS, max_delay: float = ATTEMPT_BUFFER_MAX_DELAY,
+                 max_pending: int = ATTEMPT_BUFFER_MAX_PENDING):
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.ids = HiLoAllocator("exercise_attempts", ExerciseAttempt.id)
+        self._rows = []
+        # Lote que se está insertando: sigue visible para pending() hasta el commit
+        self._inflight = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dead_letters = 0
+        self.overflows = 0
+        self.flush_duration = metrics.Histogram()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="attempt-buffer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.max_delay)
+            self._wakeup.clear()
+            self.flush()
+
+    def _row(self, attempt_id, user_id, lesson_id, code_submitted, is_correct):
+        return {
+            "id": attempt_id,
+            "user_id": user_id,
+            "lesson_id": lesson_id,
+            "code_submitted": code_submitted,
+            "is_correct": is_correct,
+        }
+
+    def _append(self, row):
+        # La fecha de envío se inserta con la fila: en el buffer y en la tabla es la misma
+        queued = dict(row, attempt_date=attempt_time())
+        with self._lock:
+            if len(self._rows) + len(self._inflight) >= self.max_pending:
+                self.overflows += 1
+                return False
+            self._rows.append(queued)
+            full = len(self._rows) >= self.max_rows
+        if full:
+            self._wakeup.set()
+        return True
+
+    def add(self, user_id, lesson_id, code_submitted, is_correct):
+        """Encolar un intento y devolver su id ya asignado; None si el buffer está lleno"""
+        attempt_id = self.ids.next_id()
+        if self._append(self._row(attempt_id, user_id, lesson_id, code_submitted, is_correct)):
+            return attempt_id
+        return None
+
+    async def add_async(self, user_id, lesson_id, code_submitted, is_correct):
+        attempt_id = await self.ids.next_id_async()
+        if self._append(self._row(attempt_id, user_id, lesson_id, code_submitted, is_correct)):
+            return attempt_id
+        return None
+
+    def pending(self, user_id, lesson_id=None):
+        """Intentos aún no insertados del usuario, del más reciente al más antiguo"""
+        with self._lock:
+            rows = [
+                row for row in self._inflight + self._rows
+                if row["user_id"] == user_id and (lesson_id is None or row["lesson_id"] == lesson_id)
+            ]
+        return rows[::-1]
+
+    def _insert(self, rows):
+        with engine.begin() as conn:
+            for start in range(0, len(rows), INSERT_CHUNK_ROWS):
+                chunk = rows[start:start + INSERT_CHUNK_ROWS]
+                conn.execute(insert(ExerciseAttempt.__table__).values(_stored_rows(conn, chunk)))
+
+    def _insert_isolating(self, rows):
+        """Insertar por mitades hasta aislar las filas que nunca entrarán (FK, duplicado...).
+
+        Devuelve (filas insertadas, filas a reintentar); las que fallan solas van a dead-letter.
+        Un fallo transitorio a mitad devuelve todo lo que aún no se ha insertado.
+        """
+        try:
+            self._insert(rows)
+            return len(rows), []
+        except Exception as e:
+            if _is_transient(e):
+                return 0, rows
+            if len(rows) == 1:
+                self._dead_letter(rows, e)
+                return 0, []
+        middle = len(rows) // 2
+        inserted, retry = self._insert_isolating(rows[:middle])
+        if retry:
+            return inserted, retry + rows[middle:]
+        inserted_right, retry = self._insert_isolating(rows[middle:])
+        return inserted + inserted_right, retry
+
+    def _dead_letter(self, rows, error):
+        """Apartar intentos que no se pueden insertar: logs/attempt_dead_letters_YYYYMMDD.log"""
+        ts, reason = _utcnow().isoformat(), str(getattr(error, "orig", None) or error)
+        lines = [json.dumps({"ts": ts, "error": reason, "row": row}, ensure_ascii=False, default=str) for row in rows]
+        path = os.path.join(LOG_DIR, f'attempt_dead_letters_{datetime.now().strftime("%Y%m%d")}.log')
+        try:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("".join(line + "\n" for line in lines))
+        except OSError as e:
+            logger.error("❌ Could not write attempt dead letters to %s: %s (%s)", path, e, lines)
+        logger.error("❌ %d attempts (ids %s) not inserted, moved to %s: %s",
+                     len(rows), [row["id"] for row in rows[:20]], path, reason)
+        with self._lock:
+            self.dead_letters += len(rows)
+
+    def flush(self):
+        """Insertar todo lo pendiente con INSERTs multi-fila.
+
+        Los fallos transitorios (conexión, deadlock) se reintentan en el siguiente
+        ciclo; si el lote tiene filas inválidas, se aíslan y se apartan las que fallan.
+        """
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+                self._inflight = rows
+            if not rows:
+                return 0
+            started = time.perf_counter()
+            try:
+                self._insert(rows)
+                inserted, retry = len(rows), []
+            except Exception as e:
+                if _is_transient(e):
+                    inserted, retry = 0, rows
+                else:
+                    logger.warning("⚠️ Attempt buffer batch rejected, inserting by halves: %s", getattr(e, "orig", None) or e)
+                    inserted, retry = self._insert_isolating(rows)
+            if retry:
+                logger.error("❌ Attempt buffer flush failed (%s rows kept for retry)", len(retry))
+            else:
+                self.flush_duration.observe(time.perf_counter() - started)
+            with self._lock:
+                self._rows[:0] = retry
+                self._inflight = []
+                self.flushes += not retry
+                self.failed_flushes += bool(retry)
+                self.flushed_rows += inserted
+            return inserted
+
+    def stop(self):
+        """Vaciar el buffer antes de salir (shutdown de la app y atexit).
+
+        Un fallo transitorio se reintenta ATTEMPT_BUFFER_SHUTDOWN_RETRIES veces
+        (1, 2, 4... s); lo que quede se escribe en dead-letter en vez de
+        perderse con el proceso.
+        """
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+        for retry in range(ATTEMPT_BUFFER_SHUTDOWN_RETRIES + 1):
+            if retry:
+                time.sleep(min(2 ** (retry - 1), 5))
+            self.flush()
+            with self._lock:
+                if not self._rows:
+                    return
+        with self._lock:
+            rows, self._rows = self._rows, []
+        self._dead_letter(rows, "database unavailable at shutdown")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": ATTEMPT_BUFFER_ENABLED,
+                "pending": len(self._rows),
+                "max_rows": self.max_rows,
+                "max_pending": self.max_pending,
+                "overflows": self.overflows,
+                "dead_letters": self.dead_letters,
+                "max_delay_seconds": self.max_delay,
+                "flushes": self.flushes,
+                "failed_flushes": self.failed_flushes,
+                "flushed_rows": self.flushed_rows,
+                "id_blocks_reserved": self.ids.blocks,
+                "flush_seconds": self.flush_duration.snapshot(),
+            }
+
+
+def _stored_rows(conn, rows):
+    """Filas del INSERT: con code_store el código va a code_blobs (un INSERT por lote) y el intento guarda el hash"""
+    if not CODE_STORE_ENABLED:
+        return [dict(_row_columns(row), code_hash=None) for row in rows]
+    hashes = code_store.put_many(conn, [row["code_submitted"] for row in rows])
+    return [dict(_row_columns(row), code_submitted="", code_hash=digest) for row, digest in zip(rows, hashes)]
+
+
+def _row_columns(row):
+    return {
+        column: row[column]
+        for column in ("id", "user_id", "lesson_id", "code_submitted", "is_correct", "attempt_date")
+    }
+
+
+def record_attempt(db, user_id, lesson_id, code_submitted, is_correct) -> int:
+    """Id del intento: encolado si el buffer está activo, si no INSERT en la sesión (sin commit)"""
+    attempt_id = None
+    if ATTEMPT_BUFFER_ENABLED:
+        queued_id = attempt_buffer.add(user_id, lesson_id, code_submitted, is_correct)
+        if queued_id is not None:
+            return queued_id
+        # Buffer lleno: la petición paga su propio INSERT (con id del bloque, no autoincremental)
+        attempt_id = attempt_buffer.ids.next_id()
+    attempt = ExerciseAttempt(
+        id=attempt_id, user_id=user_id, lesson_id=lesson_id, code_submitted=code_submitted, is_correct=is_correct,
+        attempt_date=attempt_time(),
+    )
+    if CODE_STORE_ENABLED:
+        attempt.code_submitted, attempt.code_hash = "", code_store.put(db, code_submitted)
+    db.add(attempt)
+    db.flush()
+    return attempt.id
+
+
+async def record_attempt_async(db, user_id, lesson_id, code_submitted, is_correct) -> int:
+    attempt_id = None
+    if ATTEMPT_BUFFER_ENABLED:
+        queued_id = await attempt_buffer.add_async(user_id, lesson_id, code_submitted, is_correct)
+        if queued_id is not None:
+            return queued_id
+        attempt_id = await attempt_buffer.ids.next_id_async()
+    attempt = ExerciseAttempt(
+        id=attempt_id, user_id=user_id, lesson_id=lesson_id, code_submitted=code_submitted, is_correct=is_correct,
+        attempt_date=attempt_time(),
+    )
+    if CODE_STORE_ENABLED:
+        attempt.code_submitted, attempt.code_hash = "", await code_store.put_async(db, code_submitted)
+    db.add(attempt)
+    await db.flush()
+    return attempt.id
+
+
+class PendingAttempt:
+    """Intento aún en el buffer, con los atributos de ExerciseAttempt"""
+
+    def __init__(self, id, user_id, lesson_id, code_submitted, is_correct, attempt_date):
+        self.id = id
+        self.user_id = user_id
+        self.lesson_id = lesson_id
+        self.code_submitted = code_submitted
+        self.code_hash = None
+        self.is_correct = is_correct
+        self.attempt_date = attempt_date
+
+
+def merge_pending(rows, pending, cursor_values, page_size):
+    """Filas de una página de /intentos con los intentos del buffer, por (attempt_date, id) descendente.
+
+    pending se lee antes que la consulta: un intento insertado entre medias
+    llega por las dos vías y se descarta por id. Con cursor solo entran los
+    anteriores a él, como en el filtro keyset de la consulta.
+    """
+    stored = {row.id for row in rows}
+    queued = [
+        PendingAttempt(**row) for row in pending
+        if row["id"] not in stored
+        and (cursor_values is None or (row["attempt_date"], row["id"]) < tuple(cursor_values))
+    ]
+    if not queued:
+        return rows
+    return sorted(rows + queued, key=lambda attempt: (attempt.attempt_date, attempt.id), reverse=True)[:page_size]
+
+
+def pending_attempts(user_id, lesson_id=None):
+    return attempt_buffer.pending(user_id, lesson_id) if ATTEMPT_BUFFER_ENABLED else []
+
+
+def flush_pending_attempts():
+    if ATTEMPT_BUFFER_ENABLED:
+        attempt_buffer.flush()
+
+
+attempt_buffer = AttemptBuffer()
+metrics.register("attempt_buffer", attempt_buffer.stats)
@@ -5,14 +5,21 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
+import asyncio
 import os
+import uuid
 from dotenv import load_dotenv
 import logging
 
 from database import get_db
 from models import User
 from schemas import TokenData
+from principal_cache import Principal, principal_cache, token_versions, PRINCIPAL_CACHE_ENABLED
+from password_pool import password_pool, PoolSaturated
+from revocation import revoked_tokens
+from refresh_sessions import REFRESH_SESSION_DAYS, RefreshRejected, refresh_sessions
 
 load_dotenv()
 
@@ -23,17 +30,34 @@ logger = logging.getLogger(__name__)
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
-REFRESH_TOKEN_EXPIRE_DAYS = 7
+REFRESH_TOKEN_EXPIRE_DAYS = REFRESH_SESSION_DAYS  # misma vigencia que la sesión que lo respalda
+# Consultas de las dependencias de auth en el threadpool en lugar del event loop
+AUTH_OFFLOAD_DB = os.getenv("AUTH_OFFLOAD_DB", "true").lower() in ("1", "true", "yes")
+
+# Coste de bcrypt (2^rounds iteraciones; medir con calibrate_bcrypt.py). Los hashes con otro
+# coste siguen siendo válidos y se rehacen con este al iniciar sesión
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
 
 # Contexto de encriptación
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    # Fuera de [min, max] needs_update() es cierto: cualquier coste distinto se rehace
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 # Security scheme
 security = HTTPBearer()
 
 def get_current_utc_time():
-    """✅ NUEVA FUNCIÓN: Obtener tiempo UTC consistente"""
-    return datetime.now(timezone.utc).replace(tzinfo=None)
+    """✅ NUEVA FUNCIÓN: Obtener tiempo UTC consistente.
+
+    Con zona: .timestamp() de una fecha sin zona la toma como hora local y
+    exp/iat dejarían de ser hora Unix en hosts fuera de UTC.
+    """
+    return datetime.now(timezone.utc)
 
 def verify_password(plain_password, hashed_password):
     """Verificar contraseña plana contra hash"""
@@ -43,6 +67,55 @@ def get_password_hash(password):
     """Generar hash de contraseña"""
     return pwd_context.hash(password)
 
+def verify_and_update_password(plain_password, hashed_password):
+    """(válida, hash nuevo o None): el hash nuevo solo si el guardado usa otro coste"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+def rehash_user_password(db: Session, user, new_hash: str):
+    """Guardar el hash con el coste configurado (hace commit); un fallo no impide el login"""
+    try:
+        user.password = new_hash
+        db.commit()
+        db.refresh(user)
+        logger.info("🔑 Password rehashed to %s rounds for user %s", BCRYPT_ROUNDS, user.id)
+    except Exception as e:
+        db.rollback()
+        logger.warning("⚠️ Could not rehash password for user %s: %s", user.id, e)
+
+async def run_db(fn, *args):
+    """Ejecutar una función síncrona que usa la sesión de BD sin bloquear el event loop.
+
+    La sesión de get_db solo la usa una petición, así que puede pasar a un hilo
+    del threadpool mientras la corrutina espera.
+    """
+    if AUTH_OFFLOAD_DB:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+async def run_in_password_pool(fn, *args):
+    """Ejecutar bcrypt en el pool acotado; 503 inmediato si está saturado"""
+    try:
+        return await password_pool.run(fn, *args)
+    except PoolSaturated:
+        logger.warning("⚠️ Password pool saturated, rejecting request")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+
+async def verify_password_async(plain_password, hashed_password):
+    """verify_password fuera del event loop"""
+    return await run_in_password_pool(verify_password, plain_password, hashed_password)
+
+async def verify_and_update_password_async(plain_password, hashed_password):
+    """verify_and_update_password fuera del event loop"""
+    return await run_in_password_pool(verify_and_update_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    """get_password_hash fuera del event loop"""
+    return await run_in_password_pool(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """✅ CORREGIDO: Crear token de acceso JWT con timezone correcto"""
     to_encode = data.copy()
@@ -63,11 +136,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     
-    logger.info(f"🔐 Access token created:")
-    logger.info(f"   Now UTC: {now}")
-    logger.info(f"   Expires UTC: {expire}")
-    logger.info(f"   Now timestamp: {int(now.timestamp())}")
-    logger.info(f"   Exp timestamp: {int(expire.timestamp())}")
+    logger.debug("🔐 Access token created: iat=%s exp=%s", to_encode["iat"], to_encode["exp"])
     
     return encoded_jwt
 
@@ -87,23 +156,28 @@ def create_refresh_token(data: dict):
     
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     
-    logger.info(f"🔄 Refresh token created:")
-    logger.info(f"   Now UTC: {now}")
-    logger.info(f"   Expires UTC: {expire}")
+    logger.debug("🔄 Refresh token created: iat=%s exp=%s", to_encode["iat"], to_encode["exp"])
     
     return encoded_jwt
 
-def create_token_pair(user_email: str):
-    """Crear par de tokens (access + refresh)"""
+def token_claims(user):
+    """Claims de identidad: id (resolución por clave primaria) y versión de tokens del usuario"""
+    return {"sub": user.email, "uid": user.id, "ver": user.token_version or 0}
+
+def create_token_pair(user, family: Optional[str] = None, generation: int = 0):
+    """Crear par de tokens (access + refresh) de la familia de sesión indicada"""
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    # jti propio por token; el access lleva el del refresh para revocar ambos en el logout
+    access_jti, refresh_jti = uuid.uuid4().hex, uuid.uuid4().hex
+    session_claims = {"fam": family} if family else {}
     
     access_token = create_access_token(
-        data={"sub": user_email}, 
+        data={**token_claims(user), **session_claims, "jti": access_jti, "rjti": refresh_jti}, 
         expires_delta=access_token_expires
     )
     
     refresh_token = create_refresh_token(
-        data={"sub": user_email}
+        data={**token_claims(user), **session_claims, "gen": generation, "jti": refresh_jti}
     )
     
     return {
@@ -116,78 +190,181 @@ def create_token_pair(user_email: str):
 def verify_token(token: str, token_type: str = "access"):
     """✅ CORREGIDO: Verificar token con timezone correcto"""
     try:
-        logger.info(f"🔍 Verifying {token_type} token...")
-        
         # Decodificar el token
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         
         # Extraer claims
         email: str = payload.get("sub")
+        user_id: int = payload.get("uid")
         exp: int = payload.get("exp")
         token_type_claim: str = payload.get("type")
         iat: int = payload.get("iat")
         
-        logger.info(f"📊 Token payload: sub={email}, exp={exp}, type={token_type_claim}, iat={iat}")
+        logger.debug("📊 Token payload: sub=%s, uid=%s, exp=%s, type=%s, iat=%s", email, user_id, exp, token_type_claim, iat)
         
         # Validaciones
-        if email is None:
-            logger.error("❌ Token missing 'sub' claim")
+        if email is None and user_id is None:
+            logger.debug("❌ Token missing 'sub'/'uid' claims")
             return None
             
         if token_type_claim != token_type:
-            logger.error(f"❌ Token type mismatch: expected {token_type}, got {token_type_claim}")
+            logger.debug("❌ Token type mismatch: expected %s, got %s", token_type, token_type_claim)
             return None
             
         # ✅ VERIFICAR EXPIRACIÓN CON UTC CORRECTO
         if exp:
             current_timestamp = int(get_current_utc_time().timestamp())
             
-            logger.info(f"🕐 Time comparison:")
-            logger.info(f"   Current timestamp: {current_timestamp}")
-            logger.info(f"   Token exp timestamp: {exp}")
-            logger.info(f"   Current UTC: {get_current_utc_time()}")
-            logger.info(f"   Token exp UTC: {datetime.fromtimestamp(exp)}")
-            
             if current_timestamp > exp:
-                remaining = exp - current_timestamp
-                logger.error(f"❌ Token expired: {remaining}s ago")
+                logger.debug("❌ Token expired: %ss ago", current_timestamp - exp)
                 return None
-            else:
-                remaining = exp - current_timestamp
-                logger.info(f"✅ Token valid, {remaining}s remaining")
+            logger.debug("✅ Token valid, %ss remaining", exp - current_timestamp)
         
-        return TokenData(email=email)
+        return TokenData(
+            email=email,
+            exp=exp,
+            user_id=user_id,
+            version=payload.get("ver", 0),
+            jti=payload.get("jti"),
+            refresh_jti=payload.get("rjti"),
+            iat=iat,
+            family=payload.get("fam"),
+            generation=payload.get("gen", 0),
+        )
         
     except JWTError as e:
-        logger.error(f"❌ JWT Error: {e}")
+        logger.debug("❌ JWT Error: %s", e)
         return None
     except Exception as e:
-        logger.error(f"❌ Token verification error: {e}")
+        logger.warning("❌ Token verification error: %s", e)
         return None
 
+def user_by_email_query(email: str):
+    return select(User).where(User.email == email).limit(1)
+
+def token_version_query(user_id: int):
+    return select(User.token_version).where(User.id == user_id)
+
 def get_user_by_email(db: Session, email: str):
     """Obtener usuario por email"""
-    user = db.query(User).filter(User.email == email).first()
-    if user:
-        logger.info(f"✅ User found: {email}")
+    user = db.execute(user_by_email_query(email)).scalars().first()
+    logger.debug("%s User lookup: %s", "✅" if user else "❌", email)
+    return user
+
+def get_token_user(db: Session, token_data: TokenData):
+    """Usuario del token: por clave primaria (uid) o por email en tokens antiguos; None si está revocado"""
+    if token_data.user_id is not None:
+        user = db.get(User, token_data.user_id)
     else:
-        logger.warning(f"❌ User not found: {email}")
+        user = get_user_by_email(db, token_data.email)
+    if user is None:
+        return None
+    token_versions.put(user.id, user.token_version)
+    if user.token_version != token_data.version:
+        logger.debug("❌ Token version %s revoked for user %s (current %s)", token_data.version, user.id, user.token_version)
+        return None
     return user
 
+def current_token_version(db: Session, user_id: int):
+    """token_version vigente del usuario (caché en proceso, si no una columna por clave primaria)"""
+    version = token_versions.get(user_id)
+    if version is None:
+        version = db.execute(token_version_query(user_id)).scalar()
+        if version is not None:
+            token_versions.put(user_id, version)
+    return version
+
+def open_session(db: Session, user):
+    """Login: abrir una familia de refresh tokens y emitir su primer par (hace commit)"""
+    family = refresh_sessions.create(db, user.id)
+    db.commit()
+    return create_token_pair(user, family)
+
+def rotate_refresh_token(db: Session, user, token_data: TokenData):
+    """/auth/refresh: rotar la familia del refresh presentado y emitir el par siguiente (hace commit).
+
+    Un refresh ya rotado presentado otra vez cierra la familia entera (401).
+    """
+    if token_data.family is None:
+        # Refresh sin familia (emitido antes de las sesiones): se retira y se abre una familia
+        revoked_tokens.revoke(db, token_data.jti, user.id, claim_time(token_data.exp))
+        return open_session(db, user)
+    try:
+        generation = refresh_sessions.rotate(db, token_data.family, token_data.generation, user.id)
+    except RefreshRejected as e:
+        db.rollback()
+        logger.debug("❌ Refresh rejected for user %s: %s", user.id, e)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token reused, session closed" if e.reused else "Session expired or closed",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    db.commit()
+    return create_token_pair(user, token_data.family, generation)
+
+def revoke_user_tokens(db: Session, user_id: int) -> int:
+    """Invalidar todos los tokens del usuario incrementando token_version y cerrar sus sesiones (hace commit)"""
+    refresh_sessions.revoke_user(db, user_id)
+    db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(token_version=User.token_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    version = db.execute(token_version_query(user_id)).scalar_one()
+    db.commit()
+    # Este proceso deja de aceptarlos ya; los demás al caducar su caché (PRINCIPAL_CACHE_MAX_AGE)
+    principal_cache.invalidate_user(user_id)
+    token_versions.put(user_id, version)
+    return version
+
+def claim_time(timestamp: int) -> datetime:
+    """exp/iat (hora Unix) -> hora UTC sin zona, como las columnas de la BD"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+def revoke_token(db: Session, token: str, token_data: TokenData):
+    """Revocar este token (y el refresh emitido con él) hasta su exp y cerrar su sesión (hace commit)"""
+    if token_data.family:
+        refresh_sessions.revoke(db, token_data.family)
+    revoked_tokens.revoke(db, token_data.jti, token_data.user_id or 0, claim_time(token_data.exp))
+    if token_data.refresh_jti and token_data.iat:
+        refresh_exp = claim_time(token_data.iat) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+        revoked_tokens.revoke(db, token_data.refresh_jti, token_data.user_id or 0, refresh_exp)
+    principal_cache.invalidate_token(token)
+
 def authenticate_user(db: Session, email: str, password: str):
     """Autenticar usuario con email y contraseña"""
-    logger.info(f"🔐 Authenticating user: {email}")
+    logger.debug("🔐 Authenticating user: %s", email)
     
     user = get_user_by_email(db, email)
     if not user:
-        logger.warning(f"❌ User not found for authentication: {email}")
+        logger.debug("❌ User not found for authentication: %s", email)
         return False
         
-    if not verify_password(password, user.password):
-        logger.warning(f"❌ Invalid password for user: {email}")
+    valid, new_hash = verify_and_update_password(password, user.password)
+    if not valid:
+        logger.debug("❌ Invalid password for user: %s", email)
         return False
+    if new_hash:
+        rehash_user_password(db, user, new_hash)
         
-    logger.info(f"✅ User authenticated successfully: {email}")
+    logger.debug("✅ User authenticated successfully: %s", email)
+    return user
+
+async def authenticate_user_async(db: Session, email: str, password: str):
+    """authenticate_user con la consulta en el threadpool y bcrypt en el pool de contraseñas"""
+    user = await run_db(get_user_by_email, db, email)
+    if not user:
+        logger.debug("❌ User not found for authentication: %s", email)
+        return False
+    
+    valid, new_hash = await verify_and_update_password_async(password, user.password)
+    if not valid:
+        logger.debug("❌ Invalid password for user: %s", email)
+        return False
+    if new_hash:
+        await run_db(rehash_user_password, db, user, new_hash)
+    
     return user
 
 async def get_current_user(
@@ -196,11 +373,9 @@ async def get_current_user(
 ):
     """Obtener usuario actual desde token JWT"""
     
-    logger.info(f"🔍 Getting current user from token")
-    
     # Validar que tenemos credenciales
     if not credentials or not credentials.credentials:
-        logger.error("❌ No credentials provided")
+        logger.debug("❌ No credentials provided")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="No authorization credentials provided",
@@ -208,31 +383,95 @@ async def get_current_user(
         )
     
     token = credentials.credentials
-    logger.info(f"🔐 Token received: {token[:30]}...")
+    
+    # ✅ Caché de usuarios autenticados: sin decode ni consulta a la BD
+    if PRINCIPAL_CACHE_ENABLED:
+        principal = principal_cache.get(token)
+        if principal is not None and not revoked_tokens.is_revoked(principal.jti):
+            return principal
     
     # Verificar token
     token_data = verify_token(token, "access")
     
-    if token_data is None:
-        logger.error("❌ Token validation failed")
+    if token_data is None or revoked_tokens.is_revoked(token_data.jti):
+        logger.debug("❌ Token validation failed")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Obtener usuario de la base de datos
-    user = get_user_by_email(db, email=token_data.email)
+    # Obtener usuario de la base de datos (por clave primaria) y comprobar la versión del token
+    user = await run_db(get_token_user, db, token_data)
     if user is None:
-        logger.error(f"❌ User not found in database: {token_data.email}")
+        logger.debug("❌ User not found or token revoked: %s", token_data.user_id or token_data.email)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
+            detail="User not found or token revoked",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    logger.info(f"✅ Current user retrieved: {user.email}")
-    return user
+    logger.debug("✅ Current user retrieved: %s", user.email)
+    
+    principal = Principal.from_user(user, token_data.jti)
+    if PRINCIPAL_CACHE_ENABLED:
+        principal_cache.put(token, principal, token_data.exp)
+    return principal
+
+async def get_current_user_id(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> int:
+    """Solo el id del usuario del token, para endpoints que no necesitan el resto del usuario.
+
+    Con el claim uid no se carga el usuario: solo se compara la versión del token
+    con la vigente, que normalmente ya está en caché.
+    """
+    if not credentials or not credentials.credentials:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="No authorization credentials provided",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    token = credentials.credentials
+    if PRINCIPAL_CACHE_ENABLED:
+        principal = principal_cache.get(token)
+        if principal is not None and not revoked_tokens.is_revoked(principal.jti):
+            return principal.id
+    
+    token_data = verify_token(token, "access")
+    if token_data is not None and revoked_tokens.is_revoked(token_data.jti):
+        token_data = None
+    if token_data is not None and token_data.user_id is None:
+        # Token antiguo sin uid: resolver por email
+        user = await run_db(get_token_user, db, token_data)
+        if user is not None:
+            return user.id
+    elif token_data is not None:
+        # Versión en caché: sin consulta ni salto al threadpool
+        version = token_versions.get(token_data.user_id)
+        if version is None:
+            version = await run_db(current_token_version, db, token_data.user_id)
+        if version == token_data.version:
+            return token_data.user_id
+    
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid, expired or revoked token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def require_token_data(token: str, token_type: str = "access") -> TokenData:
+    """Claims de un token ya aceptado por la dependencia; 401 si ha caducado entre medias"""
+    token_data = verify_token(token, token_type)
+    if token_data is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return token_data
 
 async def get_current_user_from_refresh_token(
     credentials: HTTPAuthorizationCredentials = Depends(security),
@@ -240,10 +479,8 @@ async def get_current_user_from_refresh_token(
 ):
     """Obtener usuario desde refresh token"""
     
-    logger.info("🔄 Getting user from refresh token")
-    
     if not credentials or not credentials.credentials:
-        logger.error("❌ No refresh token provided")
+        logger.debug("❌ No refresh token provided")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="No refresh token provided",
@@ -253,24 +490,24 @@ async def get_current_user_from_refresh_token(
     token = credentials.credentials
     token_data = verify_token(token, "refresh")
     
-    if token_data is None:
-        logger.error("❌ Refresh token validation failed")
+    if token_data is None or revoked_tokens.is_revoked(token_data.jti):
+        logger.debug("❌ Refresh token validation failed")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired refresh token",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = get_user_by_email(db, email=token_data.email)
+    user = await run_db(get_token_user, db, token_data)
     if user is None:
-        logger.error(f"❌ User not found for refresh token: {token_data.email}")
+        logger.debug("❌ User not found or refresh token revoked: %s", token_data.user_id or token_data.email)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
+            detail="User not found or token revoked",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    logger.info(f"✅ User retrieved from refresh token: {user.email}")
+    logger.debug("✅ User retrieved from refresh token: %s", user.email)
     return user
 
 # ✅ FUNCIÓN DE DEBUG ACTUALIZADA
@@ -285,6 +522,7 @@ def debug_token(token: str):
         print(f"   Header: {unverified}")
         print(f"   Payload: {payload}")
         print(f"   Subject: {payload.get('sub')}")
+        print(f"   User id: {payload.get('uid')} (token version {payload.get('ver', 0)})")
         print(f"   Type: {payload.get('type')}")
         print(f"   Expires: {payload.get('exp')}")
         print(f"   Issued: {payload.get('iat')}")
@@ -293,7 +531,7 @@ def debug_token(token: str):
             exp_timestamp = payload.get('exp')
             current_timestamp = int(get_current_utc_time().timestamp())
             
-            exp_time = datetime.fromtimestamp(exp_timestamp)
+            exp_time = datetime.fromtimestamp(exp_timestamp, timezone.utc)
             current_time = get_current_utc_time()
             
             print(f"   Exp Time: {exp_time}")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark del normalizador de envíos: envíos corregidos por segundo en un núcleo.
+
+Uso:
+    python benchmark_grading.py                    # 20000 envíos por lenguaje
+    python benchmark_grading.py -n 50000 --min-rate 5000
+"""
+import argparse
+import sys
+import time
+
+from grading import compile_matcher
+
+# Soluciones de seed_data.py y variantes que un estudiante enviaría
+SAMPLES = {
+    "python-basics": (
+        'mi_nombre = "Juan"\nmi_edad = 25',
+        [
+            'mi_nombre="Juan"\nmi_edad=25',
+            "mi_nombre = 'Juan'  # mi nombre\nmi_edad = 25\n",
+            'mi_nombre = "Juan"\nmi_edad = 26',
+            "def saludar(nombre):\n    # saluda\n    return f'Hola {nombre}'\n\nprint(saludar('Ana'))\n",
+            'mi_nombre = ("Juan"',
+        ],
+    ),
+    "javascript-basics": (
+        'let myName = "John";\nconst birthYear = 1998;',
+        [
+            "let myName='John'\nconst birthYear=1998",
+            'let myName = "John"; // name\nconst birthYear = 1998;',
+            'let myName = "John";\nconst birthYear = 1999;',
+            "/* saludo */\nfunction greet(name) {\n  return `Hi ${name}`;\n}\nconsole.log(greet('Ana'));\n",
+            'let myName = "John"; const birthYear = 1998;',
+        ],
+    ),
+}
+
+
+def run(course_id, solution, submissions, count):
+    matcher = compile_matcher(1, None, solution, course_id)
+    correct = 0
+    started = time.perf_counter()
+    for i in range(count):
+        correct += matcher.matches(submissions[i % len(submissions)])
+    elapsed = time.perf_counter() - started
+    return matcher.language, count / elapsed, correct
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--count", type=int, default=20000, help="Envíos por lenguaje")
+    parser.add_argument("--min-rate", type=float, default=2000, help="Envíos/s mínimos por núcleo")
+    args = parser.parse_args()
+
+    print(f"⏱️ Grading {args.count} submissions per language on one core...")
+    failures = 0
+    for course_id, (solution, submissions) in SAMPLES.items():
+        language, rate, correct = run(course_id, solution, submissions, args.count)
+        ok = rate >= args.min_rate
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {language}: {rate:,.0f} submissions/s ({correct} correct)")
+
+    if failures:
+        print(f"\n❌ Below {args.min_rate:,.0f} submissions/s")
+        return 1
+    print(f"\n✅ All languages above {args.min_rate:,.0f} submissions/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
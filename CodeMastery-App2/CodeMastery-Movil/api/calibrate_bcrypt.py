@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Calibración del coste de bcrypt: latencia de hash/verify por coste en este host.
+
+Mide cada coste en un núcleo, calcula el techo de logins/s con el pool de
+contraseñas (PASSWORD_POOL_WORKERS) y recomienda el coste más alto cuya
+verificación no supera la latencia objetivo. Se aplica con BCRYPT_ROUNDS en
+.env; los hashes existentes se rehacen al iniciar sesión.
+
+Uso:
+    python calibrate_bcrypt.py                         # costes 10..14, objetivo 250 ms
+    python calibrate_bcrypt.py --target-ms 100 --min-rounds 8 --max-rounds 13 -n 5
+"""
+import argparse
+import statistics
+import sys
+import time
+
+from passlib.context import CryptContext
+
+from auth import BCRYPT_ROUNDS
+from password_pool import PASSWORD_POOL_WORKERS
+
+PASSWORD = "calibration-Passw0rd"
+
+
+def measure(rounds: int, samples: int):
+    """Mediana (segundos) de hash y de verify con el coste dado"""
+    context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+    hash_times, verify_times = [], []
+    hashed = context.hash(PASSWORD)
+    for _ in range(samples):
+        started = time.perf_counter()
+        hashed = context.hash(PASSWORD)
+        hash_times.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        context.verify(PASSWORD, hashed)
+        verify_times.append(time.perf_counter() - started)
+    return statistics.median(hash_times), statistics.median(verify_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--min-rounds", type=int, default=10, help="Coste mínimo a medir (4..31)")
+    parser.add_argument("--max-rounds", type=int, default=14, help="Coste máximo a medir (4..31)")
+    parser.add_argument("-n", "--samples", type=int, default=3, help="Mediciones por coste")
+    parser.add_argument("--target-ms", type=float, default=250, help="Latencia máxima de verify por login")
+    parser.add_argument("--workers", type=int, default=PASSWORD_POOL_WORKERS, help="Hilos del pool de contraseñas")
+    args = parser.parse_args()
+
+    print(f"⏱️ bcrypt on one core, {args.samples} samples per cost, {args.workers} password pool workers")
+    print(f"{'rounds':>6} {'hash ms':>9} {'verify ms':>10} {'logins/s/core':>14} {'logins/s pool':>14}")
+    recommended = None
+    for rounds in range(args.min_rounds, args.max_rounds + 1):
+        hash_seconds, verify_seconds = measure(rounds, args.samples)
+        per_core = 1 / verify_seconds
+        within = verify_seconds * 1000 <= args.target_ms
+        if within:
+            recommended = rounds
+        marker = " (current)" if rounds == BCRYPT_ROUNDS else ""
+        print(f"{'✅' if within else '❌'}{rounds:>5} {hash_seconds * 1000:>9.1f} {verify_seconds * 1000:>10.1f} "
+              f"{per_core:>14.1f} {per_core * args.workers:>14.1f}{marker}")
+        if verify_seconds * 1000 > args.target_ms * 4:
+            break  # cada coste dobla el tiempo: los siguientes tampoco valen
+
+    if recommended is None:
+        print(f"\n❌ No cost verifies within {args.target_ms:g} ms on this host")
+        return 1
+    print(f"\n✅ Recommended BCRYPT_ROUNDS={recommended} (verify <= {args.target_ms:g} ms; current {BCRYPT_ROUNDS})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# api/catalog_cache.py - Caché versionada del catálogo (cursos/módulos/lecciones) con ETag
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+import metrics
+from pagination import Page
+
+load_dotenv()
+
+# Configuración
+CATALOG_CACHE_ENABLED = os.getenv("CATALOG_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "2048"))
+# La versión es por proceso: el TTL acota cuánto tarda un worker en ver cambios hechos en otro
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "60"))
+
+
+class CatalogEntry:
+    __slots__ = ("version", "etag", "body", "expires_at", "headers")
+
+    def __init__(self, version, etag, body, expires_at, headers=None):
+        self.version = version
+        self.etag = etag
+        self.body = body
+        self.expires_at = expires_at
+        self.headers = headers or {}
+
+
+class CatalogCache:
+    """Respuestas serializadas del catálogo, invalidadas al cambiar la versión"""
+
+    def __init__(self, max_size: int = CATALOG_CACHE_SIZE, ttl: float = CATALOG_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version = 1
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def bump(self):
+        """Llamar tras cualquier create/update/delete de cursos, módulos o lecciones"""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != self.version or entry.expires_at < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, data, version):
+        headers = None
+        if isinstance(data, Page):
+            # Listas paginadas: el cursor siguiente viaja en cabecera
+            headers = data.headers
+            data = data.items
+        body = json.dumps(
+            jsonable_encoder(data), ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+        etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+        entry = CatalogEntry(version, etag, body, time.monotonic() + self.ttl, headers)
+        with self._lock:
+            # No guardar datos leídos antes de una invalidación concurrente
+            if CATALOG_CACHE_ENABLED and version == self.version:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": CATALOG_CACHE_ENABLED,
+                "version": self.version,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+    def _respond(self, request: Request, entry: CatalogEntry):
+        headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache", **entry.headers}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            with self._lock:
+                self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    def respond(self, request: Request, key, loader):
+        """Read-through para handlers síncronos: loader() solo se llama en un fallo"""
+        entry = self.get(key) if CATALOG_CACHE_ENABLED else None
+        if entry is None:
+            version = self.version
+            entry = self.put(key, loader(), version)
+        return self._respond(request, entry)
+
+    async def respond_async(self, request: Request, key, loader):
+        """Igual que respond(), con un loader asíncrono (routers_async)"""
+        entry = self.get(key) if CATALOG_CACHE_ENABLED else None
+        if entry is None:
+            version = self.version
+            entry = self.put(key, await loader(), version)
+        return self._respond(request, entry)
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    """Comparación débil de If-None-Match (RFC 9110 §13.1.2)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+catalog_cache = CatalogCache()
+metrics.register("catalog_cache", catalog_cache.stats)
@@ -0,0 +1,203 @@
+# api/code_store.py - Código enviado deduplicado por hash y comprimido (tabla code_blobs)
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+import metrics
+from models import CodeBlob, ExerciseAttempt
+
+load_dotenv()
+
+try:
+    import zstandard
+except ImportError:  # dependencia opcional
+    zstandard = None
+
+# Configuración
+CODE_STORE_ENABLED = os.getenv("CODE_STORE_ENABLED", "true").lower() in ("1", "true", "yes")
+# zstd si está instalado 'zstandard', si no zlib
+CODE_STORE_CODEC = os.getenv("CODE_STORE_CODEC", "zstd" if zstandard else "zlib")
+CODE_STORE_CACHE_SIZE = int(os.getenv("CODE_STORE_CACHE_SIZE", "10000"))
+
+
+def code_hash(code: str) -> str:
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def compress(code: str):
+    """(codec, datos); 'raw' si comprimir no ahorra nada (códigos muy cortos)"""
+    raw = code.encode("utf-8")
+    if CODE_STORE_CODEC == "zstd" and zstandard is not None:
+        codec, data = "zstd", zstandard.ZstdCompressor(level=9).compress(raw)
+    else:
+        codec, data = "zlib", zlib.compress(raw, 6)
+    if len(data) >= len(raw):
+        return "raw", raw
+    return codec, data
+
+
+def decompress(codec: str, data: bytes) -> str:
+    if codec == "zlib":
+        raw = zlib.decompress(data)
+    elif codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("code blob compressed with zstd but 'zstandard' is not installed")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        raw = data
+    return raw.decode("utf-8")
+
+
+def blob_row(code: str):
+    codec, data = compress(code)
+    return {"hash": code_hash(code), "codec": codec, "size": len(code), "data": data}
+
+
+def insert_ignore(bind):
+    """INSERT que ignora hashes ya guardados (el contenido es idéntico por definición)"""
+    dialect_name = bind.dialect.name
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(CodeBlob.__table__).on_conflict_do_nothing()
+    statement = insert(CodeBlob.__table__)
+    if dialect_name == "sqlite":
+        return statement.prefix_with("OR IGNORE")
+    return statement.prefix_with("IGNORE")  # MySQL / MariaDB
+
+
+class CodeStore:
+    """Escritura idempotente de blobs y lectura con LRU de textos ya descomprimidos"""
+
+    def __init__(self, cache_size: int = CODE_STORE_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._texts = OrderedDict()
+        self._lock = threading.Lock()
+        self.writes = 0
+        self.dedup_hits = 0
+        self.reads = 0
+        self.cache_hits = 0
+
+    def _remember(self, digest: str, code: str):
+        with self._lock:
+            self._texts[digest] = code
+            self._texts.move_to_end(digest)
+            while len(self._texts) > self.cache_size:
+                self._texts.popitem(last=False)
+
+    def _rows(self, codes):
+        """Una fila por contenido distinto; el INSERT ignora los ya guardados.
+
+        No se omite el INSERT por estar en la caché: la transacción que lo guardó
+        pudo deshacerse y el intento quedaría apuntando a un blob inexistente.
+        """
+        distinct = {code_hash(code): code for code in codes}
+        with self._lock:
+            self.writes += len(distinct)
+            self.dedup_hits += len(codes) - len(distinct)
+        return distinct, [blob_row(code) for code in distinct.values()]
+
+    def _remember_all(self, distinct):
+        for digest, code in distinct.items():
+            self._remember(digest, code)
+
+    def put_many(self, conn, codes):
+        """Guardar varios códigos (Connection o Session síncrona); devuelve sus hashes"""
+        distinct, rows = self._rows(codes)
+        if rows:
+            conn.execute(insert_ignore(conn.get_bind() if isinstance(conn, Session) else conn), rows)
+            self._remember_all(distinct)
+        return [code_hash(code) for code in codes]
+
+    def put(self, db, code: str) -> str:
+        return self.put_many(db, [code])[0]
+
+    async def put_async(self, db, code: str) -> str:
+        distinct, rows = self._rows([code])
+        await db.execute(insert_ignore(db.bind), rows)
+        self._remember_all(distinct)
+        return code_hash(code)
+
+    def _cached(self, hashes):
+        found = {}
+        with self._lock:
+            for digest in hashes:
+                code = self._texts.get(digest)
+                if code is not None:
+                    self._texts.move_to_end(digest)
+                    found[digest] = code
+            self.cache_hits += len(found)
+        return found
+
+    def _decoded(self, rows):
+        texts = {}
+        for digest, codec, data in rows:
+            texts[digest] = decompress(codec, data)
+            self._remember(digest, texts[digest])
+        with self._lock:
+            self.reads += len(texts)
+        return texts
+
+    def get_many(self, db, hashes):
+        hashes = set(hashes)
+        texts = self._cached(hashes)
+        missing = hashes - texts.keys()
+        if missing:
+            texts.update(self._decoded(db.execute(blobs_query(missing)).all()))
+        return texts
+
+    async def get_many_async(self, db, hashes):
+        hashes = set(hashes)
+        texts = self._cached(hashes)
+        missing = hashes - texts.keys()
+        if missing:
+            texts.update(self._decoded((await db.execute(blobs_query(missing))).all()))
+        return texts
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": CODE_STORE_ENABLED,
+                "codec": CODE_STORE_CODEC,
+                "cached_texts": len(self._texts),
+                "blob_writes": self.writes,
+                "batch_dedup_hits": self.dedup_hits,
+                "blob_reads": self.reads,
+                "cache_hits": self.cache_hits,
+            }
+
+
+def blobs_query(hashes):
+    return select(CodeBlob.hash, CodeBlob.codec, CodeBlob.data).where(CodeBlob.hash.in_(hashes))
+
+
+def _fill(attempts, texts):
+    # set_committed_value: rellenar sin marcar el objeto ORM como modificado
+    for attempt in attempts:
+        if attempt.code_hash and attempt.code_hash in texts:
+            if isinstance(attempt, ExerciseAttempt):
+                set_committed_value(attempt, "code_submitted", texts[attempt.code_hash])
+            else:
+                attempt.code_submitted = texts[attempt.code_hash]
+    return attempts
+
+
+def resolve_code(db, attempts):
+    """Rellenar code_submitted de intentos guardados por hash (misma respuesta que antes)"""
+    hashes = [attempt.code_hash for attempt in attempts if attempt.code_hash]
+    return _fill(attempts, code_store.get_many(db, hashes)) if hashes else attempts
+
+
+async def resolve_code_async(db, attempts):
+    hashes = [attempt.code_hash for attempt in attempts if attempt.code_hash]
+    return _fill(attempts, await code_store.get_many_async(db, hashes)) if hashes else attempts
+
+
+code_store = CodeStore()
+metrics.register("code_store", code_store.stats)
@@ -0,0 +1,59 @@
+# api/course_tree.py - Árbol curso -> módulos -> lecciones en un número constante de consultas
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from models import Course, Module, Lesson
+
+# Columnas siempre incluidas en el resumen de una lección
+LESSON_SUMMARY_FIELDS = ("id", "module_id", "title", "position")
+# Cuerpo de la lección, seleccionable con ?fields=theory,practice_instructions,...
+LESSON_BODY_FIELDS = ("theory", "practice_instructions", "practice_initial_code", "practice_solution")
+COURSE_FIELDS = ("id", "title", "description", "icon", "color_class", "created_at", "updated_at")
+MODULE_FIELDS = ("id", "course_id", "title", "description", "position", "created_at", "updated_at")
+
+
+def parse_lesson_fields(fields: Optional[str]):
+    """Validar el selector de campos (coma separada, 'all' = cuerpo completo)"""
+    if not fields:
+        return ()
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    if requested == ["all"]:
+        return LESSON_BODY_FIELDS
+    unknown = [field for field in requested if field not in LESSON_BODY_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown lesson fields: {', '.join(unknown)}. Allowed: {', '.join(LESSON_BODY_FIELDS)}"
+        )
+    return tuple(field for field in LESSON_BODY_FIELDS if field in requested)
+
+
+def course_tree_query(lesson_fields=(), course_id: Optional[str] = None):
+    """SELECT de cursos con selectinload de módulos y lecciones (3 consultas en total)"""
+    lesson_columns = [getattr(Lesson, name) for name in LESSON_SUMMARY_FIELDS + tuple(lesson_fields)]
+    query = select(Course).options(
+        selectinload(Course.modules)
+        .selectinload(Module.lessons)
+        .load_only(*lesson_columns)
+    )
+    if course_id is not None:
+        query = query.where(Course.id == course_id)
+    return query.order_by(Course.id)
+
+
+def serialize_course_tree(course: Course, lesson_fields=()):
+    """Convertir un curso cargado con course_tree_query en un dict anidado"""
+    lesson_keys = LESSON_SUMMARY_FIELDS + tuple(lesson_fields)
+    data = {field: getattr(course, field) for field in COURSE_FIELDS}
+    data["modules"] = []
+    for module in course.modules:
+        module_data = {field: getattr(module, field) for field in MODULE_FIELDS}
+        module_data["lessons"] = [
+            {field: getattr(lesson, field) for field in lesson_keys}
+            for lesson in module.lessons
+        ]
+        data["modules"].append(module_data)
+    return data
@@ -0,0 +1,299 @@
+# api/grading.py - Corrección de ejercicios con matchers precompilados por lección
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import metrics
+from catalog_cache import CATALOG_CACHE_TTL, catalog_cache
+from models import Lesson, LessonTestCase, Module
+from normalizers import language_for_course, normalizer_for
+from sandbox import SandboxSaturated, SandboxUnavailable, sandbox_pool
+from verdict_cache import VERDICT_CACHE_PERSIST, Verdict, verdict_key, verdicts
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuración
+GRADING_CACHE_SIZE = int(os.getenv("GRADING_CACHE_SIZE", "4096"))
+# Sin CRUD de lecciones en la API, updated_at se revalida como mucho cada TTL
+# (al editar lesson_test_cases hay que tocar también lessons.updated_at)
+GRADING_REVALIDATE_SECONDS = float(os.getenv("GRADING_REVALIDATE_SECONDS", str(CATALOG_CACHE_TTL)))
+
+
+class SolutionMatcher:
+    """Solución de una lección normalizada una sola vez"""
+
+    __slots__ = ("lesson_id", "updated_at", "language", "expected_code", "accepted", "test_cases", "_normalize")
+
+    def __init__(self, lesson_id: int, updated_at, language: str, expected_code: str, accepted, test_cases=()):
+        self.lesson_id = lesson_id
+        self.updated_at = updated_at
+        self.language = language
+        self.expected_code = expected_code
+        self.accepted = frozenset(accepted)
+        # (stdin, stdout esperado): si hay casos, la lección se corrige ejecutando el código
+        self.test_cases = tuple(test_cases)
+        self._normalize = normalizer_for(language)
+
+    def normalize(self, submitted_code: str) -> str:
+        return self._normalize(submitted_code)
+
+    def matches(self, submitted_code: str) -> bool:
+        return self._normalize(submitted_code) in self.accepted
+
+
+def compile_matcher(lesson_id: int, updated_at, practice_solution: str, course_id=None, test_cases=()) -> SolutionMatcher:
+    """Tokens de la solución según el lenguaje del curso; texto plano si no se reconoce"""
+    language = language_for_course(course_id)
+    expected_code = practice_solution.strip()
+    accepted = [normalizer_for(language)(expected_code)]
+    # Solo Python se ejecuta en el sandbox; el resto sigue comparando tokens
+    test_cases = [tuple(case) for case in test_cases] if language == "python" else []
+    return SolutionMatcher(lesson_id, updated_at, language, expected_code, accepted, test_cases)
+
+
+class _Entry:
+    __slots__ = ("matcher", "version", "checked_at")
+
+    def __init__(self, matcher, version, checked_at):
+        self.matcher = matcher
+        self.version = version
+        self.checked_at = checked_at
+
+
+class MatcherCache:
+    """LRU lesson_id -> matcher, válido mientras no cambien updated_at ni la versión del catálogo"""
+
+    def __init__(self, max_size: int = GRADING_CACHE_SIZE, revalidate_seconds: float = GRADING_REVALIDATE_SECONDS):
+        self.max_size = max_size
+        self.revalidate_seconds = revalidate_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.compiled = 0
+
+    def _lookup(self, lesson_id: int):
+        """(entrada, fresca): fresca = usable sin tocar la base de datos"""
+        with self._lock:
+            entry = self._entries.get(lesson_id)
+            if entry is None:
+                return None, False
+            self._entries.move_to_end(lesson_id)
+            fresh = (
+                entry.version == catalog_cache.version
+                and time.monotonic() - entry.checked_at < self.revalidate_seconds
+            )
+            if fresh:
+                self.hits += 1
+            return entry, fresh
+
+    def _store(self, matcher: SolutionMatcher, version):
+        with self._lock:
+            self._entries[matcher.lesson_id] = _Entry(matcher, version, time.monotonic())
+            self._entries.move_to_end(matcher.lesson_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _resolve(self, entry, updated_at, version):
+        """Reutilizar el matcher si updated_at no cambió; None = hay que compilar"""
+        if entry is not None and entry.matcher.updated_at == updated_at:
+            with self._lock:
+                self.revalidated += 1
+            self._store(entry.matcher, version)
+            return entry.matcher
+        return None
+
+    def _compile(self, lesson_id: int, row, test_cases, version):
+        matcher = compile_matcher(lesson_id, row.updated_at, row.practice_solution, row.course_id, test_cases)
+        with self._lock:
+            self.compiled += 1
+        self._store(matcher, version)
+        return matcher
+
+    def get(self, db: Session, lesson_id: int):
+        """Matcher de la lección (None si no existe) para handlers síncronos"""
+        entry, fresh = self._lookup(lesson_id)
+        if fresh:
+            return entry.matcher
+        version = catalog_cache.version
+        if entry is not None:
+            updated_at = db.execute(updated_at_query(lesson_id)).scalar_one_or_none()
+            matcher = self._resolve(entry, updated_at, version)
+            if matcher is not None:
+                return matcher
+        row = db.execute(solution_query(lesson_id)).first()
+        if row is None:
+            self.invalidate(lesson_id)
+            return None
+        test_cases = db.execute(test_cases_query(lesson_id)).all()
+        return self._compile(lesson_id, row, test_cases, version)
+
+    async def get_async(self, db, lesson_id: int):
+        """Igual que get() con AsyncSession (routers_async)"""
+        entry, fresh = self._lookup(lesson_id)
+        if fresh:
+            return entry.matcher
+        version = catalog_cache.version
+        if entry is not None:
+            updated_at = (await db.execute(updated_at_query(lesson_id))).scalar_one_or_none()
+            matcher = self._resolve(entry, updated_at, version)
+            if matcher is not None:
+                return matcher
+        row = (await db.execute(solution_query(lesson_id))).first()
+        if row is None:
+            self.invalidate(lesson_id)
+            return None
+        test_cases = (await db.execute(test_cases_query(lesson_id))).all()
+        return self._compile(lesson_id, row, test_cases, version)
+
+    def invalidate(self, lesson_id: int = None):
+        with self._lock:
+            if lesson_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(lesson_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "compiled": self.compiled,
+            }
+
+
+def updated_at_query(lesson_id: int):
+    return select(Lesson.updated_at).where(Lesson.id == lesson_id)
+
+
+def solution_query(lesson_id: int):
+    """Solo las columnas que necesita el matcher (y el curso, para el lenguaje)"""
+    return (
+        select(Lesson.updated_at, Lesson.practice_solution, Module.course_id)
+        .join(Module, Lesson.module_id == Module.id)
+        .where(Lesson.id == lesson_id)
+    )
+
+
+def test_cases_query(lesson_id: int):
+    return (
+        select(LessonTestCase.stdin, LessonTestCase.expected_stdout)
+        .where(LessonTestCase.lesson_id == lesson_id)
+        .order_by(LessonTestCase.position)
+    )
+
+
+def _sandbox_busy():
+    logger.warning("⚠️ Sandbox pool saturated, rejecting submission")
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server busy, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+
+def _sandbox_unavailable(reason):
+    logger.error("❌ Sandbox unavailable, rejecting submission: %s", reason)
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Code runner unavailable, please retry later",
+        headers={"Retry-After": "30"},
+    )
+
+
+def _cache_key(matcher: SolutionMatcher, submitted_code: str):
+    """(clave de veredicto, forma normalizada)"""
+    if matcher.test_cases:
+        # Al ejecutar, mayúsculas y literales cambian la salida: se usa el código tal cual
+        return verdict_key(matcher.lesson_id, matcher.updated_at, submitted_code), None
+    normalized = matcher.normalize(submitted_code)
+    return verdict_key(matcher.lesson_id, matcher.updated_at, normalized), normalized
+
+
+def _run_verdict(outcome, started):
+    verdict = Verdict(outcome["passed"], outcome["results"], time.perf_counter() - started)
+    return verdict, not outcome.get("transient")
+
+
+def grade(matcher: SolutionMatcher, submitted_code: str, db: Session = None):
+    """(is_correct, resultados por caso o None) para handlers síncronos.
+
+    Un código ya corregido para la misma versión de la lección no se vuelve a corregir.
+    """
+    key, normalized = _cache_key(matcher, submitted_code)
+    verdict = verdicts.get(key)
+    if verdict is None and matcher.test_cases:
+        persist = VERDICT_CACHE_PERSIST and db is not None
+        verdict = verdicts.load(db, key) if persist else None
+        if verdict is None:
+            started = time.perf_counter()
+            try:
+                outcome = sandbox_pool.run_sync(submitted_code, matcher.test_cases)
+            except SandboxSaturated:
+                raise _sandbox_busy()
+            except SandboxUnavailable as e:
+                raise _sandbox_unavailable(e)
+            verdict, cacheable = _run_verdict(outcome, started)
+            if cacheable:
+                verdicts.put(key, verdict)
+                if persist:
+                    verdicts.save(db, key, verdict)
+    elif verdict is None:
+        started = time.perf_counter()
+        verdict = Verdict(normalized in matcher.accepted, None, time.perf_counter() - started)
+        verdicts.put(key, verdict)
+    return verdict.is_correct, verdict.test_results
+
+
+async def grade_async(matcher: SolutionMatcher, submitted_code: str, db=None):
+    """Igual que grade() sin bloquear el event loop"""
+    key, normalized = _cache_key(matcher, submitted_code)
+    verdict = verdicts.get(key)
+    if verdict is None and matcher.test_cases:
+        persist = VERDICT_CACHE_PERSIST and db is not None
+        verdict = (await verdicts.load_async(db, key)) if persist else None
+        if verdict is None:
+            started = time.perf_counter()
+            try:
+                outcome = await sandbox_pool.run(submitted_code, matcher.test_cases)
+            except SandboxSaturated:
+                raise _sandbox_busy()
+            except SandboxUnavailable as e:
+                raise _sandbox_unavailable(e)
+            verdict, cacheable = _run_verdict(outcome, started)
+            if cacheable:
+                verdicts.put(key, verdict)
+                if persist:
+                    await verdicts.save_async(db, key, verdict)
+    elif verdict is None:
+        started = time.perf_counter()
+        verdict = Verdict(normalized in matcher.accepted, None, time.perf_counter() - started)
+        verdicts.put(key, verdict)
+    return verdict.is_correct, verdict.test_results
+
+
+def submission_result(matcher: SolutionMatcher, submitted_code: str, is_correct: bool, attempt_id, test_results):
+    """Cuerpo de respuesta de un envío corregido (inline o desde la cola)"""
+    return {
+        "is_correct": is_correct,
+        "message": "¡Código correcto! 🎉" if is_correct else "Código incorrecto, revisa e intenta de nuevo. 💭",
+        "attempt_id": attempt_id,
+        "submitted_code": submitted_code,
+        "expected_code": matcher.expected_code if not is_correct else None,
+        "test_results": test_results,
+    }
+
+
+matchers = MatcherCache()
+metrics.register("grading", matchers.stats)
@@ -0,0 +1,113 @@
+# api/logging_config.py - Logging asíncrono (QueueHandler/QueueListener), JSON opcional y muestreo
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuración
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # text | json
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+# Fracción de peticiones cuyo par request/response se registra en INFO (0.0 - 1.0)
+LOG_REQUEST_SAMPLE_RATE = float(os.getenv("LOG_REQUEST_SAMPLE_RATE", "0.01"))
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Atributos estándar de LogRecord; el resto se considera contexto estructurado (extra=...)
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+# Valores de extra que pueden cruzar al hilo del listener sin copiarse
+_PLAIN_TYPES = (str, int, float, bool, type(None))
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro, incluyendo los campos pasados con extra={...}"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que solo interpola el mensaje en el hilo que registra.
+
+    El QueueHandler estándar llama a format() en prepare() (fecha, formato,
+    traceback); aquí solo se resuelve msg % args y el resto del formateo
+    ocurre en el hilo del QueueListener. Los argumentos (instancias ORM,
+    sesiones...) no viajan a ese hilo: allí podrían haber cambiado y no son
+    seguros entre hilos. Los campos de extra que no sean tipos JSON simples
+    viajan como str.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        for key, value in list(record.__dict__.items()):
+            if key not in _RESERVED_ATTRS and not key.startswith("_") and not isinstance(value, _PLAIN_TYPES):
+                record.__dict__[key] = str(value)
+        return record
+
+
+_listener = None
+
+
+def setup_logging():
+    """Configurar el logger raíz: la E/S a fichero ocurre en el hilo del QueueListener"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+
+    file_handler = logging.FileHandler(
+        os.path.join(LOG_DIR, f'app_{datetime.now().strftime("%Y%m%d")}.log'),
+        encoding="utf-8",
+    )
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(LazyQueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, file_handler, stream_handler, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Vaciar la cola y detener el hilo del listener (llamar en shutdown)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def should_sample(rate: float = LOG_REQUEST_SAMPLE_RATE) -> bool:
+    """Decidir si registrar una línea por petición según la tasa de muestreo"""
+    return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
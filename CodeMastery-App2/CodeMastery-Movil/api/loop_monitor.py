@@ -0,0 +1,157 @@
+# api/loop_monitor.py - Retraso del event loop (histograma) y watchdog de llamadas bloqueantes
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+import metrics
+from logging_config import LOG_DIR
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuración
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() in ("1", "true", "yes")
+# Cada cuánto se mide el retraso del loop (segundos)
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+# Modo depuración: pila de todo lo que retenga el loop más de LOOP_WATCHDOG_THRESHOLD segundos
+LOOP_WATCHDOG_ENABLED = os.getenv("LOOP_WATCHDOG_ENABLED", "false").lower() in ("1", "true", "yes")
+LOOP_WATCHDOG_THRESHOLD = float(os.getenv("LOOP_WATCHDOG_THRESHOLD", "0.1"))
+
+# Retrasos de 0.5 ms a 5 s
+LAG_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def route_of(frame):
+    """Ruta de la petición que ejecuta el frame: el primer 'scope' ASGI HTTP de la pila"""
+    while frame is not None:
+        if "scope" in frame.f_code.co_varnames:
+            scope = frame.f_locals.get("scope")
+            if isinstance(scope, dict) and scope.get("type") == "http":
+                route = scope.get("route")
+                path = getattr(route, "path", None) or scope.get("path")
+                return f"{scope.get('method')} {path}"
+        frame = frame.f_back
+    return None
+
+
+class LoopMonitor:
+    """Muestreo del retraso del event loop y, opcionalmente, watchdog de bloqueos.
+
+    El muestreador es una tarea del propio loop: duerme LOOP_LAG_INTERVAL y mide
+    cuánto tarda de más en despertar. El watchdog es un hilo que encola un latido
+    en el loop; si no se atiende en LOOP_WATCHDOG_THRESHOLD toma la pila del hilo
+    del loop (lo que lo está reteniendo), la atribuye a la ruta en curso y la
+    escribe en logs/loop_stalls_YYYYMMDD.log.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_WATCHDOG_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.lag = metrics.Histogram(LAG_BUCKETS)
+        self._loop = None
+        self._loop_thread_id = None
+        self._sampler = None
+        self._watchdog = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.stalls = 0
+        self.stalls_by_route = Counter()
+        self.longest_stall = 0.0
+
+    def start(self, watchdog: bool = LOOP_WATCHDOG_ENABLED):
+        """Llamar desde el event loop (startup)"""
+        if self._sampler is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stop.clear()
+        self._sampler = self._loop.create_task(self._sample())
+        if watchdog:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+            logger.info("🐢 Event loop watchdog enabled (threshold %.0f ms)", self.threshold * 1000)
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag.observe(max(0.0, loop.time() - expected))
+
+    def _watch(self):
+        while not self._stop.is_set():
+            beat = threading.Event()
+            started = time.monotonic()
+            try:
+                self._loop.call_soon_threadsafe(beat.set)
+            except RuntimeError:
+                return  # loop cerrado
+            if not beat.wait(self.threshold):
+                # La pila se toma mientras el loop sigue bloqueado
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = traceback.format_stack(frame) if frame is not None else []
+                route = route_of(frame)
+                del frame
+                while not beat.wait(0.5) and not self._stop.is_set():
+                    pass
+                self._record(time.monotonic() - started, route, stack)
+            self._stop.wait(self.threshold / 2)
+
+    def _record(self, duration: float, route, stack):
+        with self._lock:
+            self.stalls += 1
+            self.stalls_by_route[route or "-"] += 1
+            self.longest_stall = max(self.longest_stall, duration)
+        entry = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "pid": os.getpid(),
+            "blocked_ms": round(duration * 1000, 1),
+            "route": route,
+            "stack": stack,
+        }
+        path = os.path.join(LOG_DIR, f'loop_stalls_{datetime.now().strftime("%Y%m%d")}.log')
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.error("❌ Could not write loop stall to %s: %s", path, e)
+        logger.warning("🐢 Event loop blocked %.0f ms in %s (stack in %s)", duration * 1000, route or "background callback", path)
+
+    def stop(self):
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.cancel()
+            self._sampler = None
+        if self._watchdog is not None:
+            self._watchdog.join(2)
+            self._watchdog = None
+
+    def stats(self):
+        with self._lock:
+            stalls = {
+                "count": self.stalls,
+                "longest_ms": round(self.longest_stall * 1000, 1),
+                "by_route": dict(self.stalls_by_route.most_common(20)),
+            }
+        return {
+            "lag_seconds": self.lag.snapshot(),
+            "interval": self.interval,
+            "watchdog": self._watchdog is not None,
+            "watchdog_threshold": self.threshold,
+            "stalls": stalls,
+        }
+
+
+loop_monitor = LoopMonitor()
+metrics.register("event_loop", loop_monitor.stats)
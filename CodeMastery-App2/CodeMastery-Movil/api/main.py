@@ -6,26 +6,43 @@ from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from sqlalchemy.orm import Session
 import uvicorn
 import logging
+import time
 from datetime import datetime
 
-from database import SessionLocal, engine, get_db
-from routers import auth, courses, modules, lessons, progress, users
+from logging_config import setup_logging, stop_logging, should_sample
+
+from database import SessionLocal, engine, get_db, DB_ASYNC
+from routers import auth, monitoring
+if DB_ASYNC:
+    # ✅ Modo asíncrono: handlers async def sobre AsyncSession
+    from routers_async import courses, modules, lessons, progress, users
+else:
+    from routers import courses, modules, lessons, progress, users
 import models
+from password_pool import password_pool
+from attempt_buffer import ATTEMPT_BUFFER_ENABLED, attempt_buffer
+from attempt_archive import ATTEMPT_ARCHIVE_ENABLED, archiver
+from revocation import revoked_tokens
+from refresh_sessions import refresh_sessions
+from loop_monitor import LOOP_MONITOR_ENABLED, loop_monitor
+from sandbox import sandbox_pool
+from submission_jobs import SUBMISSION_WORKERS, worker_threads
+from progress_counters import ensure_counters
+from schema_upgrades import ensure_columns, ensure_indexes
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(f'logs/app_{datetime.now().strftime("%Y%m%d")}.log'),
-        logging.StreamHandler()
-    ]
-)
+# Configurar logging (cola + listener en segundo plano, ver logging_config.py)
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
 # Crear las tablas en la base de datos
 models.Base.metadata.create_all(bind=engine)
+ensure_columns(engine)
+ensure_indexes(engine)
+
+# Poblar los contadores de progreso en bases de datos existentes
+with SessionLocal() as _db:
+    ensure_counters(_db)
 
 app = FastAPI(
     title="Learning Platform API",
@@ -80,26 +97,27 @@ app.add_middleware(
     max_age=86400,
 )
 
-# Middleware para logging
+# Middleware para logging (muestreado: LOG_REQUEST_SAMPLE_RATE)
 @app.middleware("http")
 async def log_requests(request, call_next):
-    is_auth_request = "/auth/" in str(request.url.path)
-    
-    if is_auth_request:
-        logger.info(f"🔐 AUTH Request: {request.method} {request.url.path}")
-        logger.info(f"🔐 Origin: {request.headers.get('origin', 'No origin')}")
-        
-        if "/auth/refresh" in str(request.url.path):
-            logger.info(f"🔄 REFRESH TOKEN Request detected")
-    else:
-        logger.info(f"Request: {request.method} {request.url.path}")
-    
+    start = time.perf_counter()
     response = await call_next(request)
     
-    if is_auth_request:
-        logger.info(f"🔐 AUTH Response status: {response.status_code}")
-    else:
-        logger.info(f"Response status: {response.status_code}")
+    # Siempre registrar errores del servidor; el resto solo si cae en la muestra
+    if response.status_code >= 500 or should_sample():
+        logger.info(
+            "%s %s -> %s (%.1f ms)",
+            request.method,
+            request.url.path,
+            response.status_code,
+            (time.perf_counter() - start) * 1000,
+            extra={
+                "method": request.method,
+                "path": request.url.path,
+                "status": response.status_code,
+                "origin": request.headers.get("origin"),
+            },
+        )
     
     return response
 
@@ -108,12 +126,7 @@ async def enhanced_cors_handler(path: str, request):
     origin = request.headers.get("origin", "unknown")
     method = request.headers.get("access-control-request-method", "unknown")
     
-    logger.info(f"🌐 PREFLIGHT: {method} /{path} from {origin}")
-    
-    if "/auth/" in path:
-        logger.info(f"🔐 AUTH PREFLIGHT: {method} /{path}")
-        if "/auth/refresh" in path:
-            logger.info(f"🔄 REFRESH TOKEN PREFLIGHT detected")
+    logger.debug("🌐 PREFLIGHT: %s /%s from %s", method, path, origin)
     
     return {
         "message": "CORS preflight handled", 
@@ -123,13 +136,93 @@ async def enhanced_cors_handler(path: str, request):
     }
 
 # Incluir routers
-logger.info("Registrando routers...")
+logger.info(f"Registrando routers ({'async' if DB_ASYNC else 'sync'})...")
 app.include_router(auth.router, prefix="/auth", tags=["authentication"])
 app.include_router(courses.router, prefix="/courses", tags=["courses"])
 app.include_router(modules.router, prefix="/modules", tags=["modules"])
 app.include_router(lessons.router, prefix="/lessons", tags=["lessons"])
 app.include_router(progress.router, prefix="/progress", tags=["progress"])
 app.include_router(users.router, prefix="/usuarios", tags=["users"])
+app.include_router(monitoring.router, prefix="/metrics", tags=["monitoring"])
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    # En el propio loop: histograma de retraso y, con LOOP_WATCHDOG_ENABLED, pilas de bloqueos
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+
+@app.on_event("shutdown")
+async def stop_loop_monitor():
+    loop_monitor.stop()
+
+@app.on_event("startup")
+def start_sandbox_pool():
+    # Comprobación en segundo plano: si el sandbox no arranca solo fallan (503) las lecciones con casos de prueba
+    try:
+        sandbox_pool.start()
+    except Exception as e:
+        logger.error("❌ Could not start sandbox pool: %s", e)
+
+@app.on_event("startup")
+def start_submission_workers():
+    # Hilos que vacían la cola de envíos (SUBMISSION_ASYNC); también pueden ir aparte
+    if SUBMISSION_WORKERS:
+        worker_threads.start(SessionLocal, SUBMISSION_WORKERS)
+
+@app.on_event("startup")
+def start_attempt_buffer():
+    if ATTEMPT_BUFFER_ENABLED:
+        attempt_buffer.start()
+
+@app.on_event("startup")
+def start_revocation_sync():
+    # Carga las revocaciones vigentes (filtro de Bloom) y sigue las de otros procesos
+    revoked_tokens.start(SessionLocal)
+
+@app.on_event("shutdown")
+def stop_revocation_sync():
+    revoked_tokens.stop()
+
+@app.on_event("startup")
+def start_refresh_session_sweep():
+    # Borra por lotes las familias de refresh tokens caducadas
+    refresh_sessions.start(SessionLocal)
+
+@app.on_event("shutdown")
+def stop_refresh_session_sweep():
+    refresh_sessions.stop()
+
+@app.on_event("startup")
+def start_attempt_archiver():
+    # Archivado y retención periódicos; también a mano con python attempt_archive.py
+    if ATTEMPT_ARCHIVE_ENABLED:
+        archiver.start()
+
+@app.on_event("shutdown")
+def stop_attempt_archiver():
+    archiver.stop()
+
+@app.on_event("shutdown")
+def stop_submission_workers():
+    worker_threads.stop()
+
+@app.on_event("shutdown")
+def flush_attempt_buffer():
+    # Después de parar los workers de la cola, que también encolan intentos
+    if ATTEMPT_BUFFER_ENABLED:
+        attempt_buffer.stop()
+
+@app.on_event("shutdown")
+def shutdown_password_pool():
+    password_pool.shutdown()
+
+@app.on_event("shutdown")
+def shutdown_sandbox_pool():
+    sandbox_pool.shutdown()
+
+@app.on_event("shutdown")
+def flush_logs():
+    stop_logging()
 
 @app.get("/")
 async def root():
@@ -171,7 +264,7 @@ async def test_cors_auth(request):
 
 @app.post("/test-connection")
 async def test_connection(data: dict = None):
-    logger.info(f"Test connection received: {data}")
+    logger.debug("Test connection received: %s", data)
     return {
         "received": data,
         "port": 8001,  # ✅ Confirmar puerto
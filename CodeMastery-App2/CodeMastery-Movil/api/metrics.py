@@ -0,0 +1,79 @@
+# api/metrics.py - Métricas en proceso (histogramas y registro de fuentes)
+import bisect
+import threading
+
+# Límites por defecto en segundos (1 ms .. 10 s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Histograma acumulativo de buckets fijos, seguro entre hilos"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # último = +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+            if value > self._max:
+                self._max = value
+
+    def quantile(self, q: float) -> float:
+        """Cuantil aproximado (límite superior del bucket que lo contiene)"""
+        with self._lock:
+            if self._count == 0:
+                return 0.0
+            target = q * self._count
+            seen = 0
+            for index, count in enumerate(self._counts):
+                seen += count
+                if seen >= target:
+                    return self.buckets[index] if index < len(self.buckets) else self._max
+            return self._max
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, total_sum, maximum = self._count, self._sum, self._max
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = total
+        return {
+            "count": total,
+            "sum": total_sum,
+            "avg": (total_sum / total) if total else 0.0,
+            "max": maximum,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+# Registro de fuentes de métricas: nombre -> callable que devuelve un dict
+_sources = {}
+
+
+def register(name: str, source):
+    """Registrar una función sin argumentos que devuelve las métricas de un subsistema"""
+    _sources[name] = source
+
+
+def collect():
+    data = {}
+    for name, source in list(_sources.items()):
+        try:
+            data[name] = source()
+        except Exception as e:
+            data[name] = {"error": str(e)}
+    return data
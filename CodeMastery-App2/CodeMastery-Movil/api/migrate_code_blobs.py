@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Migración de exercise_attempts.code_submitted a code_blobs (deduplicado y comprimido).
+
+Recorre los intentos sin code_hash por lotes de id, guarda cada código distinto
+una sola vez y deja en el intento solo el hash. Cada lote es una transacción
+corta, así que puede ejecutarse con la API en marcha y reanudarse si se corta.
+
+Uso:
+    python migrate_code_blobs.py                       # DATABASE_URL de .env
+    python migrate_code_blobs.py --batch-size 2000 --sleep 0.1
+    python migrate_code_blobs.py --dry-run             # solo contar y estimar el ahorro
+"""
+import argparse
+import time
+
+from sqlalchemy import bindparam, delete, func, select, update
+
+from attempt_archive import archive_table, catalog
+from code_store import blob_row, code_store
+from database import engine
+from models import CodeBlob, ExerciseAttempt
+from schema_upgrades import ensure_columns
+
+
+def batch_query(last_id: int, batch_size: int):
+    return (
+        select(ExerciseAttempt.id, ExerciseAttempt.code_submitted)
+        .where(ExerciseAttempt.id > last_id, ExerciseAttempt.code_hash.is_(None))
+        .order_by(ExerciseAttempt.id)
+        .limit(batch_size)
+    )
+
+
+def migrate_batch(conn, rows):
+    """Guardar los blobs del lote y apuntar cada intento a su hash"""
+    hashes = code_store.put_many(conn, [code for _, code in rows])
+    conn.execute(
+        update(ExerciseAttempt.__table__)
+        .where(ExerciseAttempt.__table__.c.id == bindparam("attempt_id"))
+        .values(code_hash=bindparam("digest"), code_submitted=""),
+        [{"attempt_id": attempt_id, "digest": digest} for (attempt_id, _), digest in zip(rows, hashes)],
+    )
+
+
+def dry_run(batch_size: int):
+    last_id, attempts, raw_bytes, stored = 0, 0, 0, {}
+    with engine.connect() as conn:
+        while True:
+            rows = conn.execute(batch_query(last_id, batch_size)).all()
+            if not rows:
+                break
+            for _, code in rows:
+                raw_bytes += len(code.encode("utf-8"))
+                row = blob_row(code)
+                stored[row["hash"]] = len(row["data"])
+            attempts += len(rows)
+            last_id = rows[-1][0]
+    blob_bytes = sum(stored.values())
+    print(f"📊 {attempts} attempts to migrate, {len(stored)} distinct codes")
+    print(f"📦 {raw_bytes} bytes -> {blob_bytes} bytes ({blob_bytes / raw_bytes:.1%})" if raw_bytes else "📦 nothing to store")
+
+
+def prune_orphans():
+    """Borrar blobs sin intentos (p. ej. tras borrar intentos).
+
+    Con la API parada: un envío en curso guarda su blob antes que el intento.
+    """
+    with engine.begin() as conn:
+        statement = delete(CodeBlob).where(
+            CodeBlob.hash.not_in(select(ExerciseAttempt.code_hash).where(ExerciseAttempt.code_hash.is_not(None)))
+        )
+        # Los intentos archivados también referencian blobs
+        for period in catalog.refresh():
+            table = archive_table(period)
+            statement = statement.where(CodeBlob.hash.not_in(select(table.c.code_hash).where(table.c.code_hash.is_not(None))))
+        return conn.execute(statement).rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000, help="intentos por transacción")
+    parser.add_argument("--sleep", type=float, default=0.0, help="pausa entre lotes (segundos) para no saturar la base de datos")
+    parser.add_argument("--dry-run", action="store_true", help="no escribir nada, solo estimar")
+    parser.add_argument("--prune", action="store_true", help="borrar al final los blobs que ya no usa ningún intento (con la API parada)")
+    args = parser.parse_args()
+
+    ensure_columns(engine)
+    if args.dry_run:
+        dry_run(args.batch_size)
+        return
+
+    CodeBlob.__table__.create(bind=engine, checkfirst=True)
+    started = time.perf_counter()
+    last_id, migrated = 0, 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(batch_query(last_id, args.batch_size)).all()
+            if not rows:
+                break
+            migrate_batch(conn, rows)
+        migrated += len(rows)
+        last_id = rows[-1][0]
+        print(f"🔄 {migrated} attempts migrated (last id {last_id})")
+        if args.sleep:
+            time.sleep(args.sleep)
+
+    with engine.connect() as conn:
+        total_blobs = conn.execute(select(func.count()).select_from(CodeBlob)).scalar()
+    print(f"✅ {migrated} attempts migrated in {time.perf_counter() - started:.1f}s, {total_blobs} blobs stored")
+    if args.prune:
+        print(f"🧹 {prune_orphans()} orphan blobs deleted")
+
+
+if __name__ == "__main__":
+    main()
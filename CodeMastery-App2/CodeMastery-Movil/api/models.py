@@ -1,8 +1,16 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Float, ForeignKey, Index, LargeBinary, UniqueConstraint
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
 
+# SQLite guarda CURRENT_TIMESTAMP sin microsegundos y compara fechas como texto: los
+# parámetros deben tener el mismo formato para que el cursor (attempt_date, id) avance
+SecondsDateTime = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite",
+)
+
 class User(Base):
     __tablename__ = "users"
     
@@ -12,6 +20,8 @@ class User(Base):
     password = Column(String(255))
     google_id = Column(String(255))
     image = Column(String(255))
+    # Va en cada token (claim "ver"); incrementarlo invalida todos los tokens emitidos
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
@@ -31,7 +41,7 @@ class Course(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
-    modules = relationship("Module", back_populates="course")
+    modules = relationship("Module", back_populates="course", order_by="Module.position")
 
 class Module(Base):
     __tablename__ = "modules"
@@ -44,9 +54,14 @@ class Module(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
+    __table_args__ = (
+        # id cierra el orden (position, id) de la paginación por cursor; el PK es texto y SQLite no lo incluye solo
+        Index("ix_modules_course_position", "course_id", "position", "id"),
+    )
+    
     # Relationships
     course = relationship("Course", back_populates="modules")
-    lessons = relationship("Lesson", back_populates="module")
+    lessons = relationship("Lesson", back_populates="module", order_by="Lesson.position")
     progress = relationship("UserProgress", back_populates="module")
 
 class Lesson(Base):
@@ -63,9 +78,32 @@ class Lesson(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
+    __table_args__ = (
+        Index("ix_lessons_module_position", "module_id", "position"),
+    )
+    
     # Relationships
     module = relationship("Module", back_populates="lessons")
     attempts = relationship("ExerciseAttempt", back_populates="lesson")
+    test_cases = relationship("LessonTestCase", back_populates="lesson", order_by="LessonTestCase.position")
+
+class LessonTestCase(Base):
+    """Caso de prueba de una lección de Python: stdin -> stdout esperado"""
+    __tablename__ = "lesson_test_cases"
+    
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    lesson_id = Column(Integer, ForeignKey("lessons.id"), nullable=False)
+    position = Column(Integer, nullable=False, default=1)
+    stdin = Column(Text, nullable=False, default="")
+    expected_stdout = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_lesson_test_cases_lesson_position", "lesson_id", "position"),
+    )
+    
+    # Relationships
+    lesson = relationship("Lesson", back_populates="test_cases")
 
 class UserProgress(Base):
     __tablename__ = "user_progress"
@@ -78,20 +116,131 @@ class UserProgress(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
+    __table_args__ = (
+        UniqueConstraint("user_id", "module_id", name="uq_user_progress_user_module"),
+    )
+    
     # Relationships
     user = relationship("User", back_populates="progress")
     module = relationship("Module", back_populates="progress")
 
+class UserCourseProgress(Base):
+    """Contadores materializados de módulos completados por usuario y curso"""
+    __tablename__ = "user_course_progress"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    course_id = Column(String(20), ForeignKey("courses.id"), primary_key=True)
+    completed_modules = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class ExerciseAttempt(Base):
     __tablename__ = "exercise_attempts"
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     lesson_id = Column(Integer, ForeignKey("lessons.id"), nullable=False)
+    # '' cuando el código está en code_blobs (code_hash); ver code_store.py
     code_submitted = Column(Text, nullable=False)
+    code_hash = Column(String(64), ForeignKey("code_blobs.hash"))
     is_correct = Column(Boolean, nullable=False)
-    attempt_date = Column(DateTime(timezone=True), server_default=func.now())
+    # UTC puesto por la API (attempt_buffer.attempt_time), igual en el buffer y en la tabla
+    attempt_date = Column(SecondsDateTime, server_default=func.now())
+    
+    __table_args__ = (
+        # get_last_attempt: WHERE user_id, lesson_id ORDER BY attempt_date DESC
+        Index("ix_exercise_attempts_user_lesson_date", "user_id", "lesson_id", "attempt_date"),
+        # get_user_attempts: WHERE user_id ORDER BY attempt_date DESC
+        Index("ix_exercise_attempts_user_date", "user_id", "attempt_date"),
+        # Archivado por antigüedad (attempt_archive.py): WHERE attempt_date < horizonte
+        Index("ix_exercise_attempts_date", "attempt_date"),
+    )
     
     # Relationships
     user = relationship("User", back_populates="attempts")
     lesson = relationship("Lesson", back_populates="attempts")
+
+class CodeBlob(Base):
+    """Código enviado, una sola vez por contenido (sha256) y comprimido"""
+    __tablename__ = "code_blobs"
+    
+    hash = Column(String(64), primary_key=True)
+    codec = Column(String(8), nullable=False)  # zlib|zstd|raw
+    size = Column(Integer, nullable=False)  # caracteres sin comprimir
+    data = Column(LargeBinary(length=16777215), nullable=False)  # MEDIUMBLOB en MySQL
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class SubmissionJob(Base):
+    """Envío pendiente de corrección (modo asíncrono de /lessons/{id}/enviar)"""
+    __tablename__ = "submission_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    lesson_id = Column(Integer, ForeignKey("lessons.id"), nullable=False)
+    code_submitted = Column(Text, nullable=False)
+    status = Column(String(16), nullable=False, default="queued")  # queued|running|done|failed
+    worker = Column(String(100))
+    tries = Column(Integer, nullable=False, default=0)
+    result = Column(Text)  # JSON con el mismo cuerpo que el modo inline
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    
+    __table_args__ = (
+        # Reclamo de trabajos: WHERE status = 'queued' ORDER BY id
+        Index("ix_submission_jobs_status_id", "status", "id"),
+    )
+
+class GradingVerdict(Base):
+    """Veredicto persistido por (lección, versión de contenido, hash del código normalizado)"""
+    __tablename__ = "grading_verdicts"
+    
+    lesson_id = Column(Integer, ForeignKey("lessons.id"), primary_key=True)
+    code_hash = Column(String(32), primary_key=True)
+    lesson_version = Column(String(40), primary_key=True)
+    is_correct = Column(Boolean, nullable=False)
+    test_results = Column(Text)  # JSON
+    grade_seconds = Column(Float, nullable=False, default=0.0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class RevokedToken(Base):
+    """Token revocado (logout) por su jti; se borra al pasar su exp"""
+    __tablename__ = "revoked_tokens"
+    
+    jti = Column(String(64), primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    expires_at = Column(SecondsDateTime, nullable=False)
+    # UTC puesto por la API (RevocationStore.revoke); func.now() de MySQL es hora local del servidor
+    revoked_at = Column(SecondsDateTime, nullable=False, server_default=func.now())
+    
+    __table_args__ = (
+        # Sincronización entre procesos: WHERE revoked_at >= marca de agua
+        Index("ix_revoked_tokens_revoked_at", "revoked_at"),
+        # Limpieza: WHERE expires_at <= ahora
+        Index("ix_revoked_tokens_expires_at", "expires_at"),
+    )
+
+class RefreshSession(Base):
+    """Familia de refresh tokens (un login/dispositivo); se rota en cada /auth/refresh"""
+    __tablename__ = "refresh_sessions"
+
+    family_hash = Column(String(64), primary_key=True)  # sha256 del id de familia del token
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    generation = Column(Integer, nullable=False, default=0)
+    expires_at = Column(SecondsDateTime, nullable=False)
+    created_at = Column(SecondsDateTime, nullable=False, server_default=func.now())
+    last_used_at = Column(SecondsDateTime)
+
+    __table_args__ = (
+        # Límite de sesiones y logout global: WHERE user_id = ? ORDER BY created_at
+        Index("ix_refresh_sessions_user_created", "user_id", "created_at"),
+        # Barrido: WHERE expires_at <= ahora
+        Index("ix_refresh_sessions_expires_at", "expires_at"),
+    )
+
+class IdBlock(Base):
+    """Contador hi/lo: cada proceso reserva bloques de ids para insertar en lote"""
+    __tablename__ = "id_blocks"
+    
+    name = Column(String(50), primary_key=True)
+    next_hi = Column(Integer, nullable=False)
@@ -0,0 +1,126 @@
+# api/normalizers.py - Normalización de código por lenguaje para la corrección
+import ast
+import io
+import re
+import tokenize
+
+# Prefijo del id de curso -> lenguaje ("python-basics", "javascript-basics", ...)
+COURSE_LANGUAGE_PREFIXES = (
+    ("python", "python"),
+    ("py-", "python"),
+    ("javascript", "javascript"),
+    ("js-", "javascript"),
+)
+
+# Marcadores de estructura de Python (no pueden aparecer como tokens reales)
+PY_NEWLINE = "\n"
+PY_INDENT = "\t>"
+PY_DEDENT = "\t<"
+PY_SKIP = frozenset((
+    tokenize.COMMENT, tokenize.NL, tokenize.ENCODING, tokenize.ENDMARKER,
+))
+
+
+def language_for_course(course_id) -> str:
+    course_id = (course_id or "").lower()
+    for prefix, language in COURSE_LANGUAGE_PREFIXES:
+        if course_id.startswith(prefix):
+            return language
+    return "text"
+
+
+def normalize_text(code: str) -> str:
+    """Normalización original: espacios colapsados, sin distinguir mayúsculas"""
+    return " ".join(code.split()).lower()
+
+
+def _python_string(token: str) -> str:
+    """'a' y "a" iguales: literales simples se reescriben con repr()"""
+    prefix = token[:token.index(token[-1])].lower()
+    if "f" in prefix or "b" in prefix:
+        return token
+    try:
+        return repr(ast.literal_eval(token))
+    except (ValueError, SyntaxError):
+        return token
+
+
+def normalize_python(code: str) -> str:
+    """Tokens de Python sin comentarios ni espacios; la indentación se conserva"""
+    parts = []
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(code.strip()).readline):
+            kind = tok.type
+            if kind in PY_SKIP:
+                continue
+            if kind == tokenize.NEWLINE:
+                parts.append(PY_NEWLINE)
+            elif kind == tokenize.INDENT:
+                parts.append(PY_INDENT)
+            elif kind == tokenize.DEDENT:
+                parts.append(PY_DEDENT)
+            elif kind == tokenize.STRING:
+                parts.append(_python_string(tok.string))
+            else:
+                parts.append(tok.string)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        # Código incompleto (paréntesis o comillas sin cerrar): comparar como texto
+        return normalize_text(code)
+    return " ".join(parts).lower()
+
+
+JS_TOKEN = re.compile(
+    r"""
+    (?P<space>\s+)
+    | (?P<comment>//[^\n]*|/\*.*?\*/)
+    | (?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'|`(?:[^`\\]|\\.)*`)
+    | (?P<number>(?:\d[\d_]*\.?[\d_]*|\.\d[\d_]*)(?:[eE][+-]?\d+)?n?|0[xXoObB][\da-fA-F_]+n?)
+    | (?P<name>[A-Za-z_$][\w$]*)
+    | (?P<punct>>>>=|\.\.\.|===|!==|\*\*=|<<=|>>=|>>>|=>|[-+*/%&|^<>!=?]=|&&|\|\||\?\?|\?\.|\+\+|--|\*\*|<<|>>|.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+def _js_string(token: str) -> str:
+    """'a' y "a" iguales (las plantillas `...` se dejan tal cual)"""
+    if token[0] == "'" and '"' not in token:
+        return '"%s"' % token[1:-1].replace("\\'", "'")
+    return token
+
+
+def normalize_javascript(code: str) -> str:
+    """Tokens de JS sin comentarios, espacios ni ';' de fin de línea"""
+    tokens = []
+    line_break = False
+    pending_semicolon = False
+    for match in JS_TOKEN.finditer(code):
+        kind = match.lastgroup
+        value = match.group()
+        if kind == "space":
+            line_break = line_break or "\n" in value
+            continue
+        if kind == "comment":
+            line_break = line_break or "\n" in value
+            continue
+        if pending_semicolon and not (line_break or value == "}"):
+            tokens.append(";")
+        pending_semicolon = False
+        line_break = False
+        if value == ";":
+            # Se decide con el siguiente token: solo es opcional antes de salto, '}' o fin
+            pending_semicolon = True
+            continue
+        tokens.append(_js_string(value) if kind == "string" else value)
+    return " ".join(tokens).lower()
+
+
+NORMALIZERS = {
+    "python": normalize_python,
+    "javascript": normalize_javascript,
+    "text": normalize_text,
+}
+
+
+def normalizer_for(language: str):
+    return NORMALIZERS.get(language, normalize_text)
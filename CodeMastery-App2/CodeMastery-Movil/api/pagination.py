@@ -0,0 +1,95 @@
+# api/pagination.py - Paginación por cursor (keyset) con cursores opacos
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+# Cabecera con el cursor de la página siguiente (el cuerpo sigue siendo una lista)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 500
+
+
+class Page:
+    """Elementos de una página y cursor opaco de la siguiente (None = última)"""
+
+    def __init__(self, items, next_cursor: Optional[str] = None):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def headers(self):
+        return {NEXT_CURSOR_HEADER: self.next_cursor} if self.next_cursor else {}
+
+
+def clamp_limit(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(values) -> str:
+    payload = [
+        {"dt": value.isoformat()} if isinstance(value, datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int):
+    """Decodificar un cursor; 400 si está manipulado o no corresponde al endpoint"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list) or len(payload) != size:
+            raise ValueError("cursor size mismatch")
+        return tuple(
+            datetime.fromisoformat(value["dt"]) if isinstance(value, dict) else value
+            for value in payload
+        )
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def keyset_filter(columns, values, descending: bool = False):
+    """(c1, c2, ...) > (v1, v2, ...) expandido, para que el optimizador use el índice"""
+    clauses = []
+    for index, (column, value) in enumerate(zip(columns, values)):
+        comparison = column < value if descending else column > value
+        equal_prefix = [columns[i] == values[i] for i in range(index)]
+        clauses.append(and_(*equal_prefix, comparison) if equal_prefix else comparison)
+    return or_(*clauses)
+
+
+def keyset_order(columns, descending: bool = False):
+    return [column.desc() if descending else column.asc() for column in columns]
+
+
+def paginate(query_fn, columns, cursor: Optional[str], limit: int, descending: bool = False):
+    """Ejecutar una página: query_fn(filtro, orden, limit) -> filas (sync).
+
+    Se pide un elemento de más para saber si existe página siguiente.
+    """
+    limit = clamp_limit(limit)
+    condition = keyset_filter(columns, decode_cursor(cursor, len(columns)), descending) if cursor else None
+    rows = query_fn(condition, keyset_order(columns, descending), limit + 1)
+    return build_page(rows, columns, limit)
+
+
+async def paginate_async(query_fn, columns, cursor: Optional[str], limit: int, descending: bool = False):
+    """Igual que paginate() con un query_fn asíncrono"""
+    limit = clamp_limit(limit)
+    condition = keyset_filter(columns, decode_cursor(cursor, len(columns)), descending) if cursor else None
+    rows = await query_fn(condition, keyset_order(columns, descending), limit + 1)
+    return build_page(rows, columns, limit)
+
+
+def build_page(rows, columns, limit: int) -> Page:
+    rows = list(rows)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+    return Page(rows, next_cursor)
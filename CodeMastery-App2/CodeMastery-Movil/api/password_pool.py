@@ -0,0 +1,87 @@
+# api/password_pool.py - Pool acotado para bcrypt fuera del event loop
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+# Configuración (bcrypt libera el GIL, así que los hilos escalan con los núcleos)
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", str(os.cpu_count() or 2)))
+# Trabajos en cola + en ejecución antes de rechazar con 503
+PASSWORD_POOL_MAX_PENDING = int(os.getenv("PASSWORD_POOL_MAX_PENDING", str(PASSWORD_POOL_WORKERS * 8)))
+
+
+class PoolSaturated(Exception):
+    """El pool tiene PASSWORD_POOL_MAX_PENDING trabajos pendientes"""
+
+
+class PasswordHashPool:
+    """Executor de tamaño fijo con límite de cola y métricas"""
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait = metrics.Histogram()
+        self.duration = metrics.Histogram()
+
+    async def run(self, fn, *args):
+        """Ejecutar fn(*args) en el pool; PoolSaturated si la cola está llena"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PoolSaturated()
+            self._pending += 1
+        enqueued = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            self.queue_wait.observe(started - enqueued)
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(*args)
+            finally:
+                self.duration.observe(time.perf_counter() - started)
+                with self._lock:
+                    self._running -= 1
+                    self.completed += 1
+
+        try:
+            return await asyncio.wrap_future(self._executor.submit(task))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self):
+        with self._lock:
+            pending, running = self._pending, self._running
+            completed, rejected = self.completed, self.rejected
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "running": running,
+            "queued": pending - running,
+            "completed": completed,
+            "rejected": rejected,
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+            "duration_seconds": self.duration.snapshot(),
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_pool = PasswordHashPool(PASSWORD_POOL_WORKERS, PASSWORD_POOL_MAX_PENDING)
+metrics.register("password_pool", password_pool.stats)
@@ -0,0 +1,160 @@
+# api/principal_cache.py - Caché en proceso de usuarios autenticados
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuración
+PRINCIPAL_CACHE_ENABLED = os.getenv("PRINCIPAL_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+# Tiempo máximo que otro proceso puede seguir aceptando un token ya revocado (token_version)
+PRINCIPAL_CACHE_MAX_AGE = float(os.getenv("PRINCIPAL_CACHE_MAX_AGE", "30"))
+
+
+class Principal:
+    """Copia ligera (sin sesión) del usuario autenticado y jti del token con que se autenticó"""
+
+    __slots__ = ("id", "name", "email", "image", "created_at", "updated_at", "jti")
+
+    def __init__(self, id, name, email, image=None, created_at=None, updated_at=None, jti=None):
+        self.id = id
+        self.name = name
+        self.email = email
+        self.image = image
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.jti = jti
+
+    @classmethod
+    def from_user(cls, user, jti=None):
+        return cls(
+            id=user.id,
+            name=user.name,
+            email=user.email,
+            image=user.image,
+            created_at=user.created_at,
+            updated_at=user.updated_at,
+            jti=jti,
+        )
+
+    def __repr__(self):
+        return f"Principal(id={self.id}, email={self.email})"
+
+
+class PrincipalCache:
+    """LRU acotado de token -> Principal; cada entrada expira en el `exp` del token
+    o a los PRINCIPAL_CACHE_MAX_AGE segundos, lo que llegue antes.
+
+    exp es el claim numérico del JWT (hora Unix) y se compara con time.time();
+    max_age es un plazo de time.monotonic(), inmune a cambios del reloj.
+    """
+
+    def __init__(self, max_size: int = PRINCIPAL_CACHE_SIZE, max_age: float = PRINCIPAL_CACHE_MAX_AGE):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._entries = OrderedDict()  # token -> (principal, exp, fresh_until)
+        self._tokens_by_user = {}      # user_id -> set(token)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[Principal]:
+        now, monotonic_now = time.time(), time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            principal, exp, fresh_until = entry
+            if (exp is not None and now > exp) or monotonic_now > fresh_until:
+                self._remove(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return principal
+
+    def put(self, token: str, principal: Principal, exp: Optional[int]):
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (principal, exp, time.monotonic() + self.max_age)
+            self._tokens_by_user.setdefault(principal.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def invalidate_user(self, user_id: int):
+        """Eliminar todas las entradas de un usuario (update/delete)"""
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+
+    def invalidate_token(self, token: str):
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": PRINCIPAL_CACHE_ENABLED,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+    def _remove(self, token: str):
+        # Llamar con el lock tomado
+        principal = self._entries.pop(token)[0]
+        tokens = self._tokens_by_user.get(principal.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[principal.id]
+
+
+class TokenVersionCache:
+    """user_id -> token_version vigente, releído de la BD cada PRINCIPAL_CACHE_MAX_AGE segundos"""
+
+    def __init__(self, max_size: int = PRINCIPAL_CACHE_SIZE, max_age: float = PRINCIPAL_CACHE_MAX_AGE):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._entries = OrderedDict()  # user_id -> (version, fresh_until)
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or time.monotonic() > entry[1]:
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[0]
+
+    def put(self, user_id: int, version: int):
+        with self._lock:
+            self._entries[user_id] = (version, time.monotonic() + self.max_age)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache()
+token_versions = TokenVersionCache()
@@ -0,0 +1,162 @@
+# api/progress_counters.py - Contadores de progreso mantenidos de forma incremental
+import argparse
+import threading
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from models import Module, UserCourseProgress, UserProgress
+
+# Nº de módulos por curso: una única consulta agrupada
+MODULE_COUNTS_QUERY = select(Module.course_id, func.count(Module.id)).group_by(Module.course_id)
+
+
+class ModuleCountCache:
+    """Nº de módulos por curso en memoria; se invalida desde el CRUD de módulos"""
+
+    def __init__(self):
+        self._counts = None
+        self._lock = threading.Lock()
+
+    def get(self, db: Session):
+        counts = self._counts
+        if counts is None:
+            counts = dict(db.execute(MODULE_COUNTS_QUERY).all())
+            with self._lock:
+                self._counts = counts
+        return counts
+
+    async def get_async(self, db):
+        counts = self._counts
+        if counts is None:
+            counts = dict((await db.execute(MODULE_COUNTS_QUERY)).all())
+            with self._lock:
+                self._counts = counts
+        return counts
+
+    def invalidate(self):
+        with self._lock:
+            self._counts = None
+
+
+module_counts = ModuleCountCache()
+
+
+def progress_row_query(user_id: int, module_id: str):
+    """Fila de progreso bloqueada hasta el commit: dos peticiones que cambian el mismo
+    módulo leen `completed` una detrás de otra y el delta se aplica una sola vez"""
+    return (
+        select(UserProgress)
+        .where(UserProgress.user_id == user_id, UserProgress.module_id == module_id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+
+
+def counter_delta_statements(user_id: int, course_id: str, delta: int):
+    """(UPDATE incremental, INSERT si la fila aún no existe) para aplicar delta"""
+    increment = (
+        update(UserCourseProgress)
+        .where(UserCourseProgress.user_id == user_id, UserCourseProgress.course_id == course_id)
+        .values(completed_modules=UserCourseProgress.completed_modules + delta)
+    )
+    create = insert(UserCourseProgress).values(
+        user_id=user_id, course_id=course_id, completed_modules=max(delta, 0)
+    )
+    return increment, create
+
+
+def apply_completion_delta(db: Session, user_id: int, course_id: str, delta: int):
+    """Sumar/restar un módulo completado en la misma transacción que el progreso"""
+    if delta == 0:
+        return
+    increment, create = counter_delta_statements(user_id, course_id, delta)
+    if db.execute(increment).rowcount == 0:
+        db.execute(create)
+
+
+async def apply_completion_delta_async(db, user_id: int, course_id: str, delta: int):
+    if delta == 0:
+        return
+    increment, create = counter_delta_statements(user_id, course_id, delta)
+    if (await db.execute(increment)).rowcount == 0:
+        await db.execute(create)
+
+
+def counters_query(user_id: int):
+    """Lectura por prefijo de clave primaria (user_id, course_id)"""
+    return select(UserCourseProgress.course_id, UserCourseProgress.completed_modules).where(
+        UserCourseProgress.user_id == user_id
+    )
+
+
+def build_summary(user_id: int, counters, module_counts_by_course):
+    """Resumen global + desglose por curso a partir de los contadores"""
+    completed_by_course = dict(counters)
+    total_modules = sum(module_counts_by_course.values())
+    completed_modules = sum(completed_by_course.values())
+    courses = []
+    for course_id, total in sorted(module_counts_by_course.items()):
+        completed = completed_by_course.get(course_id, 0)
+        courses.append({
+            "course_id": course_id,
+            "total_modules": total,
+            "completed_modules": completed,
+            "completion_percentage": (completed / total * 100) if total > 0 else 0,
+        })
+    return {
+        "user_id": user_id,
+        "total_modules": total_modules,
+        "completed_modules": completed_modules,
+        "completion_percentage": (completed_modules / total_modules * 100) if total_modules > 0 else 0,
+        "courses": courses,
+    }
+
+
+def rebuild_counters(db: Session):
+    """Recalcular todos los contadores desde user_progress (migración/reparación)"""
+    rows = db.execute(
+        select(UserProgress.user_id, Module.course_id, func.count(UserProgress.id))
+        .join(Module, Module.id == UserProgress.module_id)
+        .where(UserProgress.completed == True)
+        .group_by(UserProgress.user_id, Module.course_id)
+    ).all()
+    db.execute(delete(UserCourseProgress))
+    if rows:
+        db.execute(
+            insert(UserCourseProgress),
+            [
+                {"user_id": user_id, "course_id": course_id, "completed_modules": count}
+                for user_id, course_id, count in rows
+            ],
+        )
+    db.commit()
+    return len(rows)
+
+
+def ensure_counters(db: Session):
+    """Poblar los contadores si la tabla está vacía pero ya existe progreso"""
+    has_counters = db.execute(select(UserCourseProgress.user_id).limit(1)).first()
+    has_progress = db.execute(
+        select(UserProgress.id).where(UserProgress.completed == True).limit(1)
+    ).first()
+    if has_progress and not has_counters:
+        return rebuild_counters(db)
+    return 0
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Mantenimiento de contadores de progreso")
+    parser.add_argument("--rebuild", action="store_true", help="recalcular todos los contadores")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.rebuild:
+            print(f"✅ Contadores recalculados: {rebuild_counters(db)} filas")
+        else:
+            print(f"✅ Contadores verificados: {ensure_counters(db)} filas creadas")
+    finally:
+        db.close()
@@ -0,0 +1,72 @@
+# api/queries.py - Consultas calientes de routers/ y routers_async/ (las mismas que verifica check_query_plans)
+from sqlalchemy import select
+
+from models import Course, ExerciseAttempt, Lesson, Module, User, UserProgress
+
+# Claves de la paginación keyset de cada listado (cada tupla tiene un índice que la cubre)
+COURSE_PAGE_KEYS = (Course.id,)
+USER_PAGE_KEYS = (User.id,)
+MODULE_PAGE_KEYS = (Module.position, Module.id)
+LESSON_PAGE_KEYS = (Lesson.position, Lesson.id)
+ATTEMPT_PAGE_KEYS = (ExerciseAttempt.attempt_date, ExerciseAttempt.id)
+
+
+def page_query(statement, condition, order_by, page_size: int, skip: int = 0):
+    """Página de un listado: filtro keyset (o skip en la primera página), orden por las claves y límite"""
+    if condition is not None:
+        statement = statement.where(condition)
+    elif skip:
+        # Compatibilidad: skip solo aplica a la primera página
+        statement = statement.offset(skip)
+    # order_by(None): el orden del listado completo se sustituye por el de las claves
+    return statement.order_by(None).order_by(*order_by).limit(page_size)
+
+
+def courses_query():
+    return select(Course)
+
+
+def course_query(course_id: str):
+    return select(Course).where(Course.id == course_id).limit(1)
+
+
+def course_modules_query(course_id: str):
+    return select(Module).where(Module.course_id == course_id).order_by(Module.position)
+
+
+def module_query(module_id: str):
+    return select(Module).where(Module.id == module_id).limit(1)
+
+
+def module_lessons_query(module_id: str):
+    return select(Lesson).where(Lesson.module_id == module_id).order_by(Lesson.position)
+
+
+def lesson_query(lesson_id: int):
+    return select(Lesson).where(Lesson.id == lesson_id).limit(1)
+
+
+def users_query():
+    return select(User)
+
+
+def user_attempts_query(user_id: int):
+    """Intentos del usuario en la tabla caliente, del más reciente al más antiguo"""
+    return (
+        select(ExerciseAttempt)
+        .where(ExerciseAttempt.user_id == user_id)
+        .order_by(ExerciseAttempt.attempt_date.desc())
+    )
+
+
+def last_attempt_query(user_id: int, lesson_id: int):
+    return (
+        select(ExerciseAttempt)
+        .where(ExerciseAttempt.lesson_id == lesson_id, ExerciseAttempt.user_id == user_id)
+        .order_by(ExerciseAttempt.attempt_date.desc())
+        .limit(1)
+    )
+
+
+def user_progress_query(user_id: int):
+    return select(UserProgress).where(UserProgress.user_id == user_id)
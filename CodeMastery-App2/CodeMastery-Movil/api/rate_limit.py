@@ -0,0 +1,165 @@
+# api/rate_limit.py - Límite de intentos de login: token buckets por email y por IP
+import logging
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+import metrics
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # dependencia opcional (RATE_LIMIT_BACKEND=redis)
+    redis_asyncio = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuración
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+# local: buckets en memoria de cada proceso; redis: compartidos entre workers/nodos
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "local").lower()
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+# Cada cuánto se descartan los buckets locales que ya se han rellenado
+RATE_LIMIT_SWEEP_SECONDS = float(os.getenv("RATE_LIMIT_SWEEP_SECONDS", "60"))
+# Ráfaga permitida y recarga (intentos por minuto)
+LOGIN_EMAIL_BURST = int(os.getenv("LOGIN_EMAIL_BURST", "5"))
+LOGIN_EMAIL_PER_MINUTE = float(os.getenv("LOGIN_EMAIL_PER_MINUTE", "2"))
+# Más generoso: aulas y redes móviles comparten IP
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "60"))
+LOGIN_IP_PER_MINUTE = float(os.getenv("LOGIN_IP_PER_MINUTE", "30"))
+
+
+class LocalBackend:
+    """Buckets en un dict del proceso, un float por clave y actualización O(1).
+
+    Cada bucket se guarda como el instante en que volverá a estar lleno (GCRA,
+    equivalente a un token bucket): se permite si ese instante no supera
+    'ahora + (ráfaga - 1) * intervalo'. Un bucket ya lleno es igual que uno
+    inexistente, así que el barrido periódico (dentro de take, sin hilo propio)
+    los descarta.
+    """
+
+    name = "local"
+
+    def __init__(self, sweep_seconds: float = RATE_LIMIT_SWEEP_SECONDS, clock=time.monotonic):
+        self.sweep_seconds = sweep_seconds
+        self._clock = clock
+        self._full_at = {}
+        self._lock = threading.Lock()
+        self._next_sweep = clock() + sweep_seconds
+        self.evicted = 0
+
+    async def take(self, key: str, burst: int, per_second: float) -> float:
+        """Consumir un token; 0 si se permite, si no los segundos hasta el siguiente"""
+        interval = 1 / per_second
+        now = self._clock()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep_locked(now)
+            full_at = max(self._full_at.get(key, now), now)
+            retry_after = full_at - (burst - 1) * interval - now
+            if retry_after > 0:
+                return retry_after
+            self._full_at[key] = full_at + interval
+            return 0.0
+
+    def _sweep_locked(self, now: float):
+        full = [key for key, full_at in self._full_at.items() if full_at <= now]
+        for key in full:
+            del self._full_at[key]
+        self.evicted += len(full)
+        self._next_sweep = now + self.sweep_seconds
+
+    def stats(self):
+        with self._lock:
+            return {"buckets": len(self._full_at), "evicted": self.evicted}
+
+
+# Mismo algoritmo que LocalBackend, atómico en Redis; la clave caduca cuando el bucket se llena
+GCRA_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local interval = tonumber(ARGV[2])
+local full_at = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now)
+local retry_after = full_at - (tonumber(ARGV[1]) - 1) * interval - now
+if retry_after > 0 then
+    return retry_after
+end
+redis.call('SET', KEYS[1], full_at + interval, 'PX', full_at + interval - now)
+return 0
+"""
+
+
+class RedisBackend:
+    """Buckets compartidos por todos los workers en Redis (script Lua, un viaje por intento)"""
+
+    name = "redis"
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL, prefix: str = "rl:"):
+        self.prefix = prefix
+        self._client = redis_asyncio.from_url(url)
+        self._script = self._client.register_script(GCRA_SCRIPT)
+        self.errors = 0
+
+    async def take(self, key: str, burst: int, per_second: float) -> float:
+        try:
+            retry_after_ms = await self._script(keys=[self.prefix + key], args=[burst, int(1000 / per_second)])
+        except Exception as e:
+            # Sin Redis no se bloquean los logins: el pool de bcrypt sigue acotando la carga
+            self.errors += 1
+            logger.warning("⚠️ Rate limit backend unavailable, allowing request: %s", e)
+            return 0.0
+        return int(retry_after_ms) / 1000
+
+    def stats(self):
+        return {"errors": self.errors}
+
+
+def create_backend(name: str = RATE_LIMIT_BACKEND):
+    if name == "redis":
+        if redis_asyncio is not None:
+            return RedisBackend()
+        logger.error("❌ RATE_LIMIT_BACKEND=redis requires 'pip install redis'; using per-process buckets")
+    return LocalBackend()
+
+
+class LoginRateLimiter:
+    """Intentos de /auth/login por IP y por email, comprobados antes de buscar al usuario y de bcrypt"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.allowed = 0
+        self.rejected_ip = 0
+        self.rejected_email = 0
+
+    async def check(self, client_ip, email: str) -> float:
+        """0 si el intento puede seguir, si no los segundos a esperar (Retry-After)"""
+        # Primero la IP: un atacante limitado por IP no gasta los intentos del email de la víctima
+        if client_ip:
+            retry_after = await self.backend.take(f"ip:{client_ip}", LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE / 60)
+            if retry_after:
+                self.rejected_ip += 1
+                return retry_after
+        retry_after = await self.backend.take(f"email:{email}", LOGIN_EMAIL_BURST, LOGIN_EMAIL_PER_MINUTE / 60)
+        if retry_after:
+            self.rejected_email += 1
+            return retry_after
+        self.allowed += 1
+        return 0.0
+
+    def stats(self):
+        return {
+            "enabled": RATE_LIMIT_ENABLED,
+            "backend": self.backend.name,
+            "allowed": self.allowed,
+            "rejected_ip": self.rejected_ip,
+            "rejected_email": self.rejected_email,
+            **self.backend.stats(),
+        }
+
+
+login_limiter = LoginRateLimiter(create_backend())
+metrics.register("login_rate_limit", login_limiter.stats)
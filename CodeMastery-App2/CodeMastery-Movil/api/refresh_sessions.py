@@ -0,0 +1,238 @@
+# api/refresh_sessions.py - Familias de refresh tokens con rotación y detección de reutilización
+import hashlib
+import logging
+import os
+import secrets
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, select, update
+
+import metrics
+from models import RefreshSession
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuración
+REFRESH_SESSION_DAYS = int(os.getenv("REFRESH_SESSION_DAYS", "7"))
+# Sesiones (dispositivos) simultáneas por usuario; al pasarse se cierra la más antigua
+REFRESH_MAX_SESSIONS = int(os.getenv("REFRESH_MAX_SESSIONS", "10"))
+REFRESH_CACHE_SIZE = int(os.getenv("REFRESH_CACHE_SIZE", "10000"))
+REFRESH_SWEEP_SECONDS = float(os.getenv("REFRESH_SWEEP_SECONDS", "600"))
+REFRESH_SWEEP_BATCH = int(os.getenv("REFRESH_SWEEP_BATCH", "1000"))
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def family_hash(family: str) -> str:
+    """La tabla guarda solo el hash del id de familia que viaja en el token"""
+    return hashlib.sha256(family.encode("utf-8")).hexdigest()
+
+
+def family_query(digest: str):
+    return select(RefreshSession.generation, RefreshSession.expires_at).where(RefreshSession.family_hash == digest)
+
+
+def user_sessions_query(user_id: int):
+    """Familias del usuario, de la más reciente a la más antigua"""
+    return (
+        select(RefreshSession.family_hash)
+        .where(RefreshSession.user_id == user_id)
+        .order_by(RefreshSession.created_at.desc())
+    )
+
+
+def expired_query(batch_size: int):
+    return select(RefreshSession.family_hash).where(RefreshSession.expires_at <= _utcnow()).limit(batch_size)
+
+
+class RefreshRejected(Exception):
+    """Refresh token no aceptado; reused=True si era una generación ya rotada (posible robo)"""
+
+    def __init__(self, reason: str, reused: bool = False):
+        super().__init__(reason)
+        self.reused = reused
+
+
+class SessionStore:
+    """Una fila por familia (hash, usuario, caducidad, generación) con LRU delante.
+
+    Cada /auth/refresh rota la familia: la generación del token debe coincidir
+    con la guardada y se incrementa con un UPDATE condicionado, así que una
+    generación antigua presentada de nuevo se detecta como reutilización y
+    cierra la familia entera (el ladrón y el usuario legítimo deben volver a entrar).
+    """
+
+    def __init__(self, cache_size: int = REFRESH_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # hash -> (user_id, generation, expires_at)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._session_factory = None
+        self.created = 0
+        self.rotations = 0
+        self.reuse_detected = 0
+        self.evicted = 0
+        self.swept = 0
+        self.cache_hits = 0
+
+    def _cache_put(self, digest, user_id, generation, expires_at):
+        with self._lock:
+            self._cache[digest] = (user_id, generation, expires_at)
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _cache_get(self, digest):
+        with self._lock:
+            entry = self._cache.get(digest)
+            if entry is not None:
+                self._cache.move_to_end(digest)
+                self.cache_hits += 1
+            return entry
+
+    def _cache_drop(self, digests):
+        with self._lock:
+            for digest in digests:
+                self._cache.pop(digest, None)
+
+    def create(self, db, user_id: int) -> str:
+        """Abrir una familia nueva (login); devuelve su id en claro para el token. Sin commit."""
+        family = secrets.token_urlsafe(16)
+        digest = family_hash(family)
+        expires_at = _utcnow() + timedelta(days=REFRESH_SESSION_DAYS)
+        db.add(RefreshSession(family_hash=digest, user_id=user_id, generation=0, expires_at=expires_at))
+        db.flush()
+        self._enforce_cap(db, user_id, digest)
+        self._cache_put(digest, user_id, 0, expires_at)
+        self.created += 1
+        return family
+
+    def _enforce_cap(self, db, user_id: int, keep: str):
+        # Más de REFRESH_MAX_SESSIONS familias: cerrar las más antiguas (nunca la recién creada,
+        # created_at tiene resolución de segundos)
+        stale = db.execute(
+            user_sessions_query(user_id)
+            .where(RefreshSession.family_hash != keep)
+            .offset(max(REFRESH_MAX_SESSIONS - 1, 0))
+        ).scalars().all()
+        if stale:
+            db.execute(delete(RefreshSession).where(RefreshSession.family_hash.in_(stale)))
+            self._cache_drop(stale)
+            self.evicted += len(stale)
+
+    def rotate(self, db, family: str, generation: int, user_id: int) -> int:
+        """Aceptar la generación presentada y pasar a la siguiente (sin commit); RefreshRejected si no"""
+        digest = family_hash(family)
+        now = _utcnow()
+        cached = self._cache_get(digest)
+        if cached is not None and cached[1] > generation:
+            # Generación ya rotada según la caché: reutilización sin ir a la BD
+            self._reused(db, digest, user_id)
+        expires_at = now + timedelta(days=REFRESH_SESSION_DAYS)
+        rotated = db.execute(
+            update(RefreshSession)
+            .where(
+                RefreshSession.family_hash == digest,
+                RefreshSession.user_id == user_id,
+                RefreshSession.generation == generation,
+                RefreshSession.expires_at > now,
+            )
+            .values(generation=generation + 1, expires_at=expires_at, last_used_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if rotated:
+            self._cache_put(digest, user_id, generation + 1, expires_at)
+            self.rotations += 1
+            return generation + 1
+        # Sin fila que rotar: familia cerrada/caducada, o generación antigua (reutilización)
+        current = db.execute(family_query(digest)).first()
+        if current is not None and current.generation > generation:
+            self._reused(db, digest, user_id)
+        self._cache_drop([digest])
+        raise RefreshRejected("session closed or expired")
+
+    def _reused(self, db, digest: str, user_id: int):
+        self.reuse_detected += 1
+        logger.warning("🚨 Refresh token reuse detected for user %s, closing session family", user_id)
+        db.execute(delete(RefreshSession).where(RefreshSession.family_hash == digest))
+        db.commit()
+        self._cache_drop([digest])
+        raise RefreshRejected("refresh token reuse detected", reused=True)
+
+    def revoke(self, db, family: str):
+        """Cerrar una familia (logout de un dispositivo). Sin commit."""
+        digest = family_hash(family)
+        db.execute(delete(RefreshSession).where(RefreshSession.family_hash == digest))
+        self._cache_drop([digest])
+
+    def revoke_user(self, db, user_id: int):
+        """Cerrar todas las familias del usuario (logout global, cambio de contraseña). Sin commit."""
+        digests = db.execute(user_sessions_query(user_id)).scalars().all()
+        if digests:
+            db.execute(delete(RefreshSession).where(RefreshSession.user_id == user_id))
+            self._cache_drop(digests)
+        return len(digests)
+
+    def sweep(self, db, batch_size: int = REFRESH_SWEEP_BATCH) -> int:
+        """Borrar familias caducadas por lotes (transacciones cortas)"""
+        total = 0
+        while not self._stop.is_set():
+            expired = db.execute(expired_query(batch_size)).scalars().all()
+            if not expired:
+                db.rollback()
+                break
+            db.execute(delete(RefreshSession).where(RefreshSession.family_hash.in_(expired)))
+            db.commit()
+            self._cache_drop(expired)
+            total += len(expired)
+        self.swept += total
+        return total
+
+    def start(self, session_factory):
+        if self._thread is not None:
+            return
+        self._session_factory = session_factory
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="refresh-sweep", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(REFRESH_SWEEP_SECONDS):
+            try:
+                with self._session_factory() as db:
+                    swept = self.sweep(db)
+                if swept:
+                    logger.info("🧹 %s expired refresh sessions deleted", swept)
+            except Exception as e:
+                logger.error("❌ Refresh session sweep failed: %s", e)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "cached_families": len(self._cache),
+                "created": self.created,
+                "rotations": self.rotations,
+                "reuse_detected": self.reuse_detected,
+                "evicted_over_cap": self.evicted,
+                "swept": self.swept,
+                "cache_hits": self.cache_hits,
+                "max_sessions_per_user": REFRESH_MAX_SESSIONS,
+            }
+
+
+refresh_sessions = SessionStore()
+metrics.register("refresh_sessions", refresh_sessions.stats)
@@ -0,0 +1,232 @@
+# api/revocation.py - Tokens revocados por jti: filtro de Bloom en memoria + tabla revoked_tokens
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+import metrics
+from models import RevokedToken
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuración
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+# Cada cuánto se leen las revocaciones hechas por otros procesos
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "2"))
+REVOCATION_PRUNE_SECONDS = float(os.getenv("REVOCATION_PRUNE_SECONDS", "600"))
+# Solape de la marca de agua de sincronización (commits que llegan tarde, relojes con segundos).
+# revoked_at y la marca de agua salen del mismo reloj (_utcnow, UTC), nunca de la hora del servidor de BD
+SYNC_OVERLAP = timedelta(seconds=10)
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class BloomFilter:
+    """Filtro de Bloom de tamaño fijo: sin falsos negativos, falsos positivos ~error_rate"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, capacity)
+        self.size = max(64, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    @staticmethod
+    def _seeds(key: str):
+        # Los jti son uuid4 en hexadecimal (aleatorios y firmados): sus bits ya sirven de hash.
+        # Cualquier otra clave pasa por blake2b. Doble hash (Kirsch-Mitzenmacher) sobre 128 bits.
+        try:
+            value = int(key, 16)
+        except ValueError:
+            value = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest(), "little")
+        return value & 0xFFFFFFFFFFFFFFFF, (value >> 64) | 1
+
+    def add(self, key: str):
+        first, second = self._seeds(key)
+        for index in range(self.hashes):
+            position = (first + index * second) % self.size
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        # Sale en el primer bit a cero: una clave ausente suele costar una o dos sondas
+        first, second = self._seeds(key)
+        bits, size = self._bits, self.size
+        for index in range(self.hashes):
+            position = (first + index * second) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+def revoked_since_query(since: datetime):
+    return select(RevokedToken.jti, RevokedToken.expires_at).where(RevokedToken.revoked_at >= since)
+
+
+class RevocationStore:
+    """Revocaciones vigentes en memoria (respaldadas en revoked_tokens) con Bloom delante.
+
+    El caso habitual (token no revocado) se resuelve con el filtro, sin tocar
+    el diccionario ni la base de datos; un positivo se confirma en memoria.
+    """
+
+    def __init__(self, capacity: int = REVOCATION_BLOOM_CAPACITY, error_rate: float = REVOCATION_BLOOM_ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._revoked = {}  # jti -> expires_at
+        self._lock = threading.Lock()
+        self._watermark = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._session_factory = None
+        self.checks = 0
+        self.bloom_positives = 0
+        self.false_positives = 0
+        self.rebuilds = 0
+        self.rebuild_seconds = 0.0
+
+    def is_revoked(self, jti) -> bool:
+        if not jti:
+            return False
+        self.checks += 1
+        if jti not in self._bloom:
+            return False
+        self.bloom_positives += 1
+        expires_at = self._revoked.get(jti)
+        if expires_at is None:
+            self.false_positives += 1
+            return False
+        return True
+
+    def _remember(self, jti: str, expires_at: datetime):
+        with self._lock:
+            if jti in self._revoked:
+                return
+            self._revoked[jti] = expires_at
+            if self._bloom.count >= self._bloom.capacity:
+                # Filtro lleno: rehacerlo más grande antes de que suba la tasa de falsos positivos
+                self._rebuild_locked()
+            self._bloom.add(jti)
+
+    def _rebuild_locked(self):
+        started = time.perf_counter()
+        bloom = BloomFilter(max(self.capacity, len(self._revoked) * 2), self.error_rate)
+        for jti in self._revoked:
+            bloom.add(jti)
+        self._bloom = bloom
+        self.rebuilds += 1
+        self.rebuild_seconds = time.perf_counter() - started
+
+    def revoke(self, db, jti: str, user_id: int, expires_at: datetime):
+        """Revocar un token hasta su exp (hace commit); visible al instante en este proceso"""
+        if not jti:
+            return
+        try:
+            with db.begin_nested():
+                db.add(RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at, revoked_at=_utcnow()))
+        except IntegrityError:
+            logger.debug("Token %s already revoked", jti)
+        db.commit()
+        self._remember(jti, expires_at)
+
+    def load(self, db):
+        """Cargar las revocaciones vigentes (arranque) y rehacer el filtro"""
+        now = _utcnow()
+        rows = db.execute(
+            select(RevokedToken.jti, RevokedToken.expires_at).where(RevokedToken.expires_at > now)
+        ).all()
+        with self._lock:
+            self._revoked = {jti: expires_at for jti, expires_at in rows}
+            self._rebuild_locked()
+        # Lo revocado después de 'now' entra en la siguiente sync
+        self._watermark = now
+        db.rollback()
+        logger.info("🚫 %s revoked tokens loaded in %.1f ms", len(rows), self.rebuild_seconds * 1000)
+        return len(rows)
+
+    def sync(self, db):
+        """Incorporar las revocaciones hechas por otros procesos desde la última lectura"""
+        # Marca de agua = hora de esta lectura, no el max(revoked_at) leído: un reloj adelantado
+        # en otro proceso no puede saltarse las revocaciones de los demás
+        started = _utcnow()
+        since = (self._watermark or started) - SYNC_OVERLAP
+        rows = db.execute(revoked_since_query(since)).all()
+        db.rollback()
+        now = _utcnow()
+        for jti, expires_at in rows:
+            if expires_at > now:
+                self._remember(jti, expires_at)
+        self._watermark = started
+        return len(rows)
+
+    def prune(self, db):
+        """Borrar revocaciones de tokens ya caducados (BD y memoria) y rehacer el filtro"""
+        now = _utcnow()
+        deleted = db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now)).rowcount
+        db.commit()
+        with self._lock:
+            expired = [jti for jti, expires_at in self._revoked.items() if expires_at <= now]
+            for jti in expired:
+                del self._revoked[jti]
+            if expired:
+                # Un filtro de Bloom no admite borrados: se rehace con las vigentes
+                self._rebuild_locked()
+        return deleted
+
+    def start(self, session_factory):
+        if self._thread is not None:
+            return
+        self._session_factory = session_factory
+        with session_factory() as db:
+            self.load(db)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="revocation-sync", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        last_prune = time.monotonic()
+        while not self._stop.wait(REVOCATION_SYNC_SECONDS):
+            try:
+                with self._session_factory() as db:
+                    self.sync(db)
+                    if time.monotonic() - last_prune > REVOCATION_PRUNE_SECONDS:
+                        self.prune(db)
+                        last_prune = time.monotonic()
+            except Exception as e:
+                logger.error("❌ Revocation sync failed: %s", e)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "revoked": len(self._revoked),
+                "bloom_bits": self._bloom.size,
+                "bloom_hashes": self._bloom.hashes,
+                "checks": self.checks,
+                "bloom_positives": self.bloom_positives,
+                "false_positives": self.false_positives,
+                "rebuilds": self.rebuilds,
+                "last_rebuild_ms": round(self.rebuild_seconds * 1000, 3),
+            }
+
+
+revoked_tokens = RevocationStore()
+metrics.register("revoked_tokens", revoked_tokens.stats)
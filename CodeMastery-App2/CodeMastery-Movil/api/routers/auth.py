@@ -1,18 +1,28 @@
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi.security import HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from database import get_db
 from models import User
-from schemas import UserCreate, UserLogin, TokenResponse, User as UserSchema  # ✅ NUEVO: TokenResponse
+from schemas import UserCreate, UserLogin, PasswordChange, TokenResponse, User as UserSchema  # ✅ NUEVO: TokenResponse
 from auth import (
-    authenticate_user, 
-    create_token_pair,  # ✅ NUEVO
-    get_password_hash, 
+    authenticate_user_async,
+    get_password_hash_async,
     get_current_user,
     get_current_user_from_refresh_token,  # ✅ NUEVO
+    open_session,
+    require_token_data,
+    revoke_token,
+    revoke_user_tokens,
+    rotate_refresh_token,
+    run_db,
+    security,
+    verify_password_async,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from rate_limit import RATE_LIMIT_ENABLED, login_limiter
 import logging
+import math
 from typing import Optional
 
 logger = logging.getLogger(__name__)
@@ -22,15 +32,14 @@ router = APIRouter()
 @router.post("/register", response_model=UserSchema)
 async def register(user: UserCreate, request: Request, db: Session = Depends(get_db)):
     """Registro de nuevo usuario con logging detallado"""
-    logger.info(f"Register attempt for email: {user.email}")
-    logger.info(f"Request headers: {dict(request.headers)}")
-    logger.info(f"User data received: name={user.name}, email={user.email}")
+    logger.info("Register attempt for email: %s", user.email)
+    logger.debug("Request headers: %s", request.headers)
     
     try:
         # Verificar si el usuario ya existe
         db_user = db.query(User).filter(User.email == user.email.lower().strip()).first()
         if db_user:
-            logger.warning(f"Registration failed: Email {user.email} already registered")
+            logger.warning("Registration failed: Email %s already registered", user.email)
             raise HTTPException(
                 status_code=400,
                 detail="Email already registered"
@@ -38,21 +47,21 @@ async def register(user: UserCreate, request: Request, db: Session = Depends(get
         
         # Validaciones adicionales
         if len(user.password) < 6:
-            logger.warning(f"Registration failed: Password too short for {user.email}")
+            logger.warning("Registration failed: Password too short for %s", user.email)
             raise HTTPException(
                 status_code=400,
                 detail="Password must be at least 6 characters"
             )
         
         if len(user.name.strip()) < 2:
-            logger.warning(f"Registration failed: Name too short for {user.email}")
+            logger.warning("Registration failed: Name too short for %s", user.email)
             raise HTTPException(
                 status_code=400,
                 detail="Name must be at least 2 characters"
             )
         
         # Crear nuevo usuario
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await get_password_hash_async(user.password)
         db_user = User(
             name=user.name.strip(),
             email=user.email.lower().strip(),
@@ -63,14 +72,14 @@ async def register(user: UserCreate, request: Request, db: Session = Depends(get
         db.commit()
         db.refresh(db_user)
         
-        logger.info(f"User successfully registered: {db_user.email} with ID: {db_user.id}")
+        logger.info("User successfully registered: %s with ID: %s", db_user.email, db_user.id)
         
         return db_user
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Unexpected error during registration: {str(e)}")
+        logger.error("Unexpected error during registration: %s", e)
         db.rollback()
         raise HTTPException(
             status_code=500,
@@ -80,30 +89,42 @@ async def register(user: UserCreate, request: Request, db: Session = Depends(get
 @router.post("/login", response_model=TokenResponse)  # ✅ CAMBIO: Nuevo response model
 async def login(user_credentials: UserLogin, request: Request, db: Session = Depends(get_db)):
     """Login con tokens de acceso y refresh"""
-    logger.info(f"Login attempt for email: {user_credentials.email}")
-    logger.info(f"Request headers: {dict(request.headers)}")
+    logger.debug("Login attempt for email: %s", user_credentials.email)
+    logger.debug("Request headers: %s", request.headers)
+    
+    email = user_credentials.email.lower().strip()
+    if RATE_LIMIT_ENABLED:
+        # Antes de consultar al usuario y de bcrypt: una ráfaga contra un email no gasta CPU
+        retry_after = await login_limiter.check(request.client.host if request.client else None, email)
+        if retry_after:
+            logger.warning("Login throttled for email: %s from %s", email, request.client.host if request.client else "unknown")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts, please retry later",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
     
     try:
-        user = authenticate_user(db, user_credentials.email.lower().strip(), user_credentials.password)
+        user = await authenticate_user_async(db, email, user_credentials.password)
         if not user:
-            logger.warning(f"Login failed for email: {user_credentials.email}")
+            logger.warning("Login failed for email: %s", user_credentials.email)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password",
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        # ✅ NUEVO: Crear par de tokens
-        tokens = create_token_pair(user.email)
+        # ✅ NUEVO: Crear par de tokens (nueva sesión / familia de refresh)
+        tokens = await run_db(open_session, db, user)
         
-        logger.info(f"Login successful for user: {user.email}")
+        logger.debug("Login successful for user: %s", user.email)
         
         return tokens
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Unexpected error during login: {str(e)}")
+        logger.error("Unexpected error during login: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
@@ -112,22 +133,25 @@ async def login(user_credentials: UserLogin, request: Request, db: Session = Dep
 @router.post("/refresh", response_model=TokenResponse)  # ✅ NUEVO: Endpoint de refresh
 async def refresh_token(
     request: Request, 
+    credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user_from_refresh_token)
 ):
-    """Refrescar token de acceso usando refresh token"""
-    logger.info(f"Token refresh for user: {current_user.email}")
+    """Refrescar token de acceso usando refresh token (rota el refresh: el anterior deja de valer)"""
+    logger.debug("Token refresh for user: %s", current_user.email)
     
     try:
-        # Crear nuevo par de tokens
-        tokens = create_token_pair(current_user.email)
+        # Rotar la familia del refresh y crear el par siguiente
+        tokens = await run_db(rotate_refresh_token, db, current_user, require_token_data(credentials.credentials, "refresh"))
         
-        logger.info(f"Token refresh successful for user: {current_user.email}")
+        logger.debug("Token refresh successful for user: %s", current_user.email)
         
         return tokens
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Unexpected error during token refresh: {str(e)}")
+        logger.error("Unexpected error during token refresh: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
@@ -135,21 +159,50 @@ async def refresh_token(
 
 @router.get("/me", response_model=UserSchema)
 async def read_users_me(current_user: User = Depends(get_current_user)):
-    logger.info(f"User info requested for: {current_user.email}")
+    logger.debug("User info requested for: %s", current_user.email)
     return current_user
 
 @router.post("/logout")  # ✅ NUEVO: Endpoint de logout
-async def logout(request: Request, current_user: User = Depends(get_current_user)):
-    """Logout del usuario (invalidar tokens del lado del cliente)"""
-    logger.info(f"Logout for user: {current_user.email}")
+async def logout(
+    request: Request,
+    all_sessions: bool = False,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Logout: revoca este token y su refresh (lista de revocados por jti) y cierra su sesión;
+    ?all_sessions=true invalida todos los tokens del usuario (token_version)"""
+    logger.info("Logout for user: %s", current_user.email)
     
-    # Nota: En una implementación completa, aquí podrías:
-    # 1. Agregar el token a una blacklist
-    # 2. Guardar en Redis o base de datos
-    # 3. Invalidar todos los tokens del usuario
+    token_data = require_token_data(credentials.credentials, "access")
+    if all_sessions or token_data.jti is None:
+        # Tokens antiguos sin jti solo se pueden invalidar todos a la vez
+        await run_db(revoke_user_tokens, db, current_user.id)
+    else:
+        await run_db(revoke_token, db, credentials.credentials, token_data)
     
     return {"message": "Logout successful"}
 
+@router.post("/change-password", response_model=TokenResponse)
+async def change_password(
+    data: PasswordChange,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Cambiar la contraseña; revoca todos los tokens y sesiones y devuelve un par nuevo en una sesión nueva"""
+    user = await run_db(db.get, User, current_user.id)
+    if user is None or not await verify_password_async(data.current_password, user.password):
+        logger.warning("Password change failed for user: %s", current_user.email)
+        raise HTTPException(status_code=400, detail="Current password is incorrect")
+    
+    user.password = await get_password_hash_async(data.new_password)
+    # El commit de revoke_user_tokens guarda también la nueva contraseña
+    await run_db(revoke_user_tokens, db, user.id)
+    await run_db(db.refresh, user)
+    
+    logger.info("Password changed for user: %s", user.email)
+    return await run_db(open_session, db, user)
+
 # Endpoint de prueba para verificar que el auth router funciona
 @router.get("/test")
 async def test_auth():
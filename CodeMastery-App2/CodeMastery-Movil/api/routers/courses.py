@@ -1,33 +1,82 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from database import get_db
-from models import Course, User
-from schemas import Course as CourseSchema, CourseCreate, CourseUpdate
+from models import Course, Module, User
+from schemas import Course as CourseSchema, CourseCreate, CourseUpdate, CourseTree, Module as ModuleSchema
 from auth import get_current_user
+from course_tree import course_tree_query, parse_lesson_fields, serialize_course_tree
+from catalog_cache import catalog_cache
+from pagination import paginate
+from queries import COURSE_PAGE_KEYS, MODULE_PAGE_KEYS, course_modules_query, course_query, courses_query, page_query
 
 router = APIRouter()
 
 @router.get("/", response_model=List[CourseSchema])
 def get_courses(
+    request: Request,
     skip: int = 0, 
     limit: int = 100, 
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    courses = db.query(Course).offset(skip).limit(limit).all()
-    return courses
+    """Cursos ordenados por id; la página siguiente se pide con ?cursor=<X-Next-Cursor>"""
+    def query(condition, order_by, page_size):
+        return db.execute(page_query(courses_query(), condition, order_by, page_size, skip)).scalars().all()
+    
+    def load():
+        page = paginate(query, COURSE_PAGE_KEYS, cursor, limit)
+        page.items = [CourseSchema.model_validate(course) for course in page.items]
+        return page
+    return catalog_cache.respond(request, ("courses", skip, limit, cursor), load)
+
+@router.get("/tree", response_model=List[CourseTree], response_model_exclude_unset=True)
+def get_catalog_tree(
+    request: Request,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Catálogo completo (cursos -> módulos -> lecciones) en 3 consultas"""
+    lesson_fields = parse_lesson_fields(fields)
+    
+    def load():
+        courses = db.execute(course_tree_query(lesson_fields)).scalars().all()
+        return [serialize_course_tree(course, lesson_fields) for course in courses]
+    return catalog_cache.respond(request, ("catalog_tree", lesson_fields), load)
+
+@router.get("/{course_id}/tree", response_model=CourseTree, response_model_exclude_unset=True)
+def get_course_tree(
+    request: Request,
+    course_id: str,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Curso con sus módulos y resúmenes de lecciones (?fields= para el cuerpo)"""
+    lesson_fields = parse_lesson_fields(fields)
+    
+    def load():
+        course = db.execute(course_tree_query(lesson_fields, course_id)).scalars().first()
+        if course is None:
+            raise HTTPException(status_code=404, detail="Course not found")
+        return serialize_course_tree(course, lesson_fields)
+    return catalog_cache.respond(request, ("course_tree", course_id, lesson_fields), load)
 
 @router.get("/{course_id}", response_model=CourseSchema)
 def get_course(
+    request: Request,
     course_id: str, 
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    course = db.query(Course).filter(Course.id == course_id).first()
-    if course is None:
-        raise HTTPException(status_code=404, detail="Course not found")
-    return course
+    def load():
+        course = db.execute(course_query(course_id)).scalars().first()
+        if course is None:
+            raise HTTPException(status_code=404, detail="Course not found")
+        return CourseSchema.model_validate(course)
+    return catalog_cache.respond(request, ("course", course_id), load)
 
 @router.post("/", response_model=CourseSchema)
 def create_course(
@@ -43,6 +92,7 @@ def create_course(
     db_course = Course(**course.dict())
     db.add(db_course)
     db.commit()
+    catalog_cache.bump()
     db.refresh(db_course)
     return db_course
 
@@ -62,6 +112,7 @@ def update_course(
         setattr(db_course, field, value)
     
     db.commit()
+    catalog_cache.bump()
     db.refresh(db_course)
     return db_course
 
@@ -77,14 +128,27 @@ def delete_course(
     
     db.delete(db_course)
     db.commit()
+    catalog_cache.bump()
     return {"message": "Course deleted successfully"}
 
 @router.get("/{course_id}/modules")
 def get_course_modules(
+    request: Request,
     course_id: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    from models import Module
-    modules = db.query(Module).filter(Module.course_id == course_id).order_by(Module.position).all()
-    return modules
+    """Módulos por (position, id); sin limit devuelve todos como antes"""
+    def query(condition, order_by, page_size):
+        return db.execute(page_query(course_modules_query(course_id), condition, order_by, page_size)).scalars().all()
+    
+    def load():
+        if limit is None and cursor is None:
+            modules = db.execute(course_modules_query(course_id)).scalars().all()
+            return [ModuleSchema.model_validate(module) for module in modules]
+        page = paginate(query, MODULE_PAGE_KEYS, cursor, limit or 100)
+        page.items = [ModuleSchema.model_validate(module) for module in page.items]
+        return page
+    return catalog_cache.respond(request, ("course_modules", course_id, limit, cursor), load)
@@ -1,6 +1,8 @@
 # api/routers/lessons.py - CORREGIDO
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from database import get_db
 from models import Lesson, ExerciseAttempt, User
@@ -12,21 +14,105 @@ from schemas import (
     ExerciseAttempt as ExerciseAttemptSchema
 )
 from auth import get_current_user
+from catalog_cache import catalog_cache
+from attempt_buffer import flush_pending_attempts, merge_pending, pending_attempts, record_attempt
+from attempt_archive import archived_attempts, archived_last_attempt, delete_archived_attempt
+from code_store import resolve_code
+from grading import grade, matchers, submission_result
+from submission_jobs import (
+    FINISHED, SUBMISSION_ASYNC, SUBMISSION_POLL_SECONDS, clamp_wait, enqueued, job_query, job_status, new_job
+)
+from pagination import decode_cursor, paginate
+from queries import ATTEMPT_PAGE_KEYS, last_attempt_query, lesson_query, page_query, user_attempts_query
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# ✅ CORREGIDO: Endpoint mejorado para obtener intentos del usuario
+# (declarado antes de /{lesson_id} para que "intentos" no se tome como id)
+@router.get("/intentos", response_model=List[ExerciseAttemptSchema])
+def get_user_attempts(
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    limit: int = 50,
+    cursor: Optional[str] = None
+):
+    """Intentos del usuario autenticado, paginados por (attempt_date, id) descendente"""
+    logger.debug("Fetching attempts for user %s (ID: %s)", current_user.email, current_user.id)
+    
+    # Leído antes de la consulta: una fila insertada entre medias se descarta por id
+    pending = pending_attempts(current_user.id)
+    cursor_values = decode_cursor(cursor, len(ATTEMPT_PAGE_KEYS)) if cursor else None
+    
+    def query(condition, order_by, page_size):
+        statement = page_query(user_attempts_query(current_user.id), condition, order_by, page_size)
+        rows = list(db.execute(statement).scalars().all())
+        # Tabla caliente agotada: seguir por los meses archivados (siempre más antiguos)
+        if len(rows) < page_size:
+            rows += archived_attempts(db, current_user.id, cursor, page_size - len(rows))
+        # Intentos aún en el buffer, en su sitio del orden keyset (el corte a page_size decide el cursor)
+        return merge_pending(rows, pending, cursor_values, page_size)
+    
+    try:
+        page = paginate(query, ATTEMPT_PAGE_KEYS, cursor, limit, descending=True)
+        response.headers.update(page.headers)
+        # Código guardado en code_blobs: una consulta para toda la página
+        resolve_code(db, page.items)
+        return page.items
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching user attempts: %s", e)
+        return []
+
+@router.get("/jobs/{job_id}")
+async def get_submission_job(
+    job_id: int,
+    wait: float = 0,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Estado de un envío en cola; ?wait=N espera hasta N s a que termine.
+
+    async aunque la sesión sea síncrona: la espera es un asyncio.sleep y solo
+    cada lectura ocupa un hilo del threadpool, no la espera entera.
+    """
+    deadline = time.monotonic() + clamp_wait(wait)
+
+    def poll():
+        job = db.execute(job_query(job_id, current_user.id)).scalars().first()
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job.status in FINISHED or time.monotonic() >= deadline:
+            return job_status(job)
+        # Cerrar la transacción para ver el commit del worker y liberar la conexión
+        db.rollback()
+        return None
+
+    while True:
+        result = await run_in_threadpool(poll)
+        if result is not None:
+            return result
+        await asyncio.sleep(SUBMISSION_POLL_SECONDS)
+
 @router.get("/{lesson_id}", response_model=LessonSchema)
 def get_lesson(
+    request: Request,
     lesson_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    lesson = db.query(Lesson).filter(Lesson.id == lesson_id).first()
-    if lesson is None:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-    return lesson
+    def load():
+        lesson = db.execute(lesson_query(lesson_id)).scalars().first()
+        if lesson is None:
+            raise HTTPException(status_code=404, detail="Lesson not found")
+        return LessonSchema.model_validate(lesson)
+    return catalog_cache.respond(request, ("lesson", lesson_id), load)
 
 @router.post("/{lesson_id}/enviar")
 def submit_code(
@@ -35,106 +121,83 @@ def submit_code(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    logger.info(f"Code submission for lesson {lesson_id} by user {current_user.email}")
+    logger.debug("Code submission for lesson %s by user %s", lesson_id, current_user.email)
     
-    # Obtener la lección
-    lesson = db.query(Lesson).filter(Lesson.id == lesson_id).first()
-    if lesson is None:
+    # Solución ya normalizada en caché: sin cargar la lección en cada envío
+    matcher = matchers.get(db, lesson_id)
+    if matcher is None:
         raise HTTPException(status_code=404, detail="Lesson not found")
     
-    # ✅ MEJORADA: Lógica de validación más robusta
-    submitted_code = submission.code_submitted.strip()
-    expected_code = lesson.practice_solution.strip()
-    
-    # Normalizar espacios en blanco y saltos de línea
-    submitted_normalized = ' '.join(submitted_code.split())
-    expected_normalized = ' '.join(expected_code.split())
-    
-    is_correct = submitted_normalized.lower() == expected_normalized.lower()
+    if SUBMISSION_ASYNC:
+        # Modo cola: guardar el envío y devolver 202; un worker lo corrige después
+        job = new_job(current_user.id, lesson_id, submission.code_submitted)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return JSONResponse(status_code=202, content=enqueued(job))
     
-    logger.info(f"Code validation - Expected: '{expected_normalized}', Submitted: '{submitted_normalized}', Correct: {is_correct}")
+    submitted_code = submission.code_submitted.strip()
+    is_correct, test_results = grade(matcher, submitted_code, db)
     
-    # Crear el intento
-    attempt = ExerciseAttempt(
-        user_id=current_user.id,
-        lesson_id=lesson_id,
-        code_submitted=submission.code_submitted,
-        is_correct=is_correct
-    )
+    logger.debug("Code validation for lesson %s: correct=%s", lesson_id, is_correct)
     
     try:
-        db.add(attempt)
+        attempt_id = record_attempt(
+            db, current_user.id, lesson_id, submission.code_submitted, is_correct
+        )
         db.commit()
-        db.refresh(attempt)
         
-        logger.info(f"Exercise attempt saved with ID: {attempt.id}")
+        logger.debug("Exercise attempt saved with ID: %s", attempt_id)
         
-        return {
-            "is_correct": is_correct,
-            "message": "¡Código correcto! 🎉" if is_correct else "Código incorrecto, revisa e intenta de nuevo. 💭",
-            "attempt_id": attempt.id,
-            "submitted_code": submitted_code,
-            "expected_code": expected_code if not is_correct else None
-        }
+        return submission_result(matcher, submitted_code, is_correct, attempt_id, test_results)
     except Exception as e:
         logger.error(f"Error saving attempt: {str(e)}")
         db.rollback()
         raise HTTPException(status_code=500, detail="Error al guardar el intento")
 
-@router.get("/{lesson_id}/ultimo-intento")
+@router.get("/{lesson_id}/ultimo-intento", response_model=ExerciseAttemptSchema)
 def get_last_attempt(
     lesson_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    attempt = db.query(ExerciseAttempt).filter(
-        ExerciseAttempt.lesson_id == lesson_id,
-        ExerciseAttempt.user_id == current_user.id
-    ).order_by(ExerciseAttempt.attempt_date.desc()).first()
+    # Un intento aún en el buffer es más reciente que cualquiera de la tabla
+    pending = pending_attempts(current_user.id, lesson_id)
+    if pending:
+        return pending[0]
+    
+    attempt = db.execute(last_attempt_query(current_user.id, lesson_id)).scalars().first()
+    if attempt is None:
+        # Sin intentos recientes: buscar en los meses archivados
+        attempt = archived_last_attempt(db, current_user.id, lesson_id)
     
     if attempt is None:
         raise HTTPException(status_code=404, detail="No attempts found")
     
+    resolve_code(db, [attempt])
     return attempt
 
-# ✅ CORREGIDO: Endpoint mejorado para obtener intentos del usuario
-@router.get("/intentos", response_model=List[ExerciseAttemptSchema])
-def get_user_attempts(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
-    limit: int = 50
-):
-    """Obtener todos los intentos del usuario autenticado"""
-    logger.info(f"Fetching attempts for user {current_user.email} (ID: {current_user.id})")
-    
-    try:
-        attempts = db.query(ExerciseAttempt).filter(
-            ExerciseAttempt.user_id == current_user.id
-        ).order_by(
-            ExerciseAttempt.attempt_date.desc()
-        ).limit(limit).all()
-        
-        logger.info(f"Found {len(attempts)} attempts for user {current_user.id}")
-        
-        if not attempts:
-            logger.info(f"No attempts found for user {current_user.id}")
-            return []
-            
-        return attempts
-        
-    except Exception as e:
-        logger.error(f"Error fetching user attempts: {str(e)}")
-        return []
-
 @router.delete("/intentos/{attempt_id}")
 def delete_attempt(
     attempt_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    # Un intento recién enviado puede seguir en el buffer: solo entonces se vacía
+    if any(row["id"] == attempt_id for row in pending_attempts(current_user.id)):
+        flush_pending_attempts()
+    
     attempt = db.query(ExerciseAttempt).filter(ExerciseAttempt.id == attempt_id).first()
     if attempt is None:
-        raise HTTPException(status_code=404, detail="Attempt not found")
+        # Intento antiguo: puede estar en una tabla mensual del archivo
+        archived = delete_archived_attempt(db, current_user.id, attempt_id)
+        if archived is None:
+            raise HTTPException(status_code=404, detail="Attempt not found")
+        if archived is False:
+            raise HTTPException(status_code=403, detail="Not authorized to delete this attempt")
+        db.commit()
+        logger.info(f"Archived attempt {attempt_id} deleted by user {current_user.email}")
+        return {"message": "Attempt deleted successfully"}
     
     if attempt.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this attempt")
@@ -1,35 +1,52 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from database import get_db
-from models import Module, User
-from schemas import Module as ModuleSchema, ModuleCreate, ModuleUpdate
+from models import Module, Lesson, User
+from schemas import Module as ModuleSchema, ModuleCreate, ModuleUpdate, Lesson as LessonSchema
 from auth import get_current_user
+from catalog_cache import catalog_cache
+from progress_counters import module_counts
+from pagination import paginate
+from queries import LESSON_PAGE_KEYS, module_lessons_query, module_query, page_query
 
 router = APIRouter()
 
 @router.get("/{module_id}", response_model=ModuleSchema)
 def get_module(
+    request: Request,
     module_id: str,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    module = db.query(Module).filter(Module.id == module_id).first()
-    if module is None:
-        raise HTTPException(status_code=404, detail="Module not found")
-    return module
+    def load():
+        module = db.execute(module_query(module_id)).scalars().first()
+        if module is None:
+            raise HTTPException(status_code=404, detail="Module not found")
+        return ModuleSchema.model_validate(module)
+    return catalog_cache.respond(request, ("module", module_id), load)
 
 @router.get("/{module_id}/lessons")
 def get_module_lessons(
+    request: Request,
     module_id: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    from models import Lesson
-    lessons = db.query(Lesson).filter(
-        Lesson.module_id == module_id
-    ).order_by(Lesson.position).all()
-    return lessons
+    """Lecciones por (position, id); sin limit devuelve todas como antes"""
+    def query(condition, order_by, page_size):
+        return db.execute(page_query(module_lessons_query(module_id), condition, order_by, page_size)).scalars().all()
+    
+    def load():
+        if limit is None and cursor is None:
+            lessons = db.execute(module_lessons_query(module_id)).scalars().all()
+            return [LessonSchema.model_validate(lesson) for lesson in lessons]
+        page = paginate(query, LESSON_PAGE_KEYS, cursor, limit or 100)
+        page.items = [LessonSchema.model_validate(lesson) for lesson in page.items]
+        return page
+    return catalog_cache.respond(request, ("module_lessons", module_id, limit, cursor), load)
 
 @router.post("/", response_model=ModuleSchema)
 def create_module(
@@ -40,6 +57,8 @@ def create_module(
     db_module = Module(**module.dict())
     db.add(db_module)
     db.commit()
+    catalog_cache.bump()
+    module_counts.invalidate()
     db.refresh(db_module)
     return db_module
 
@@ -59,6 +78,8 @@ def update_module(
         setattr(db_module, field, value)
     
     db.commit()
+    catalog_cache.bump()
+    module_counts.invalidate()
     db.refresh(db_module)
     return db_module
 
@@ -74,4 +95,6 @@ def delete_module(
     
     db.delete(db_module)
     db.commit()
+    catalog_cache.bump()
+    module_counts.invalidate()
     return {"message": "Module deleted successfully"}
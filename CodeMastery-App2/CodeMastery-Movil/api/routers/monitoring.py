@@ -0,0 +1,60 @@
+# api/routers/monitoring.py - /metrics solo para redes permitidas o con METRICS_TOKEN
+import hmac
+import ipaddress
+import logging
+import os
+
+from dotenv import load_dotenv
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+
+import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuración: IPs o redes (CIDR) que leen /metrics sin token; por defecto solo la máquina local
+METRICS_ALLOWED_IPS = os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1")
+# Scrapers remotos: Authorization: Bearer <METRICS_TOKEN> (vacío = sin acceso por token)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+
+def parse_networks(value: str):
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in value.split(",") if item.strip()]
+
+
+ALLOWED_NETWORKS = parse_networks(METRICS_ALLOWED_IPS)
+
+router = APIRouter()
+
+
+def client_allowed(host) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except (TypeError, ValueError):
+        return False
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return any(address in network for network in ALLOWED_NETWORKS)
+
+
+def token_valid(authorization) -> bool:
+    if not METRICS_TOKEN or not authorization:
+        return False
+    scheme, _, token = authorization.partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), METRICS_TOKEN.encode())
+
+
+async def require_metrics_access(request: Request):
+    """Las métricas exponen pools, sandbox, revocaciones y archivo: no son públicas"""
+    host = request.client.host if request.client else None
+    if token_valid(request.headers.get("authorization")) or client_allowed(host):
+        return
+    logger.warning("⚠️ /metrics denied for %s", host or "unknown")
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Metrics access denied")
+
+
+@router.get("/", dependencies=[Depends(require_metrics_access)])
+async def get_metrics():
+    """Métricas en proceso de todos los subsistemas registrados"""
+    return metrics.collect()
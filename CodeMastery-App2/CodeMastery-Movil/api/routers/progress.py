@@ -2,10 +2,13 @@ from typing import List
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from database import get_db
 from models import UserProgress, User, Module
 from schemas import UserProgress as UserProgressSchema, UserProgressCreate, UserProgressUpdate
-from auth import get_current_user
+from auth import get_current_user_id
+from progress_counters import apply_completion_delta, build_summary, counters_query, module_counts, progress_row_query
+from queries import user_progress_query
 
 router = APIRouter()
 
@@ -13,9 +16,9 @@ router = APIRouter()
 def get_user_progress(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user_id: int = Depends(get_current_user_id)
 ):
-    progress = db.query(UserProgress).filter(UserProgress.user_id == user_id).all()
+    progress = db.execute(user_progress_query(user_id)).scalars().all()
     return progress
 
 @router.put("/")
@@ -24,32 +27,32 @@ def update_progress(
     module_id: str,
     progress: UserProgressUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user_id: int = Depends(get_current_user_id)
 ):
     # Verificar que el usuario solo puede actualizar su propio progreso
-    if current_user.id != user_id:
+    if current_user_id != user_id:
         raise HTTPException(status_code=403, detail="Cannot update other user's progress")
-    # Buscar progreso existente
-    db_progress = db.query(UserProgress).filter(
-        UserProgress.user_id == user_id,
-        UserProgress.module_id == module_id
-    ).first()
-    
+    module = db.get(Module, module_id)
+    if module is None:
+        raise HTTPException(status_code=404, detail="Module not found")
+    # Buscar progreso existente (bloqueado: was_completed no cambia hasta el commit)
+    db_progress = db.execute(progress_row_query(user_id, module_id)).scalars().first()
     if db_progress is None:
-        # Crear nuevo progreso
-        db_progress = UserProgress(
-            user_id=user_id,
-            module_id=module_id,
-            completed=progress.completed or False,
-            completion_date=progress.completion_date
-        )
-        db.add(db_progress)
-    else:
-        # Actualizar progreso existente
-        update_data = progress.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_progress, field, value)
+        # Crear la fila sin completar; si otra petición la crea a la vez, se usa la suya
+        try:
+            with db.begin_nested():
+                db.add(UserProgress(user_id=user_id, module_id=module_id, completed=False))
+        except IntegrityError:
+            pass
+        db_progress = db.execute(progress_row_query(user_id, module_id)).scalars().first()
+    was_completed = bool(db_progress.completed)
+    
+    update_data = progress.dict(exclude_unset=True)
+    for field, value in update_data.items():
+        setattr(db_progress, field, value)
     
+    # ✅ Mantener los contadores materializados en la misma transacción
+    apply_completion_delta(db, user_id, module.course_id, int(bool(db_progress.completed)) - int(was_completed))
     db.commit()
     db.refresh(db_progress)
     return db_progress
@@ -58,23 +61,8 @@ def update_progress(
 def get_user_summary(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user_id: int = Depends(get_current_user_id)
 ):
-    # Contar módulos totales
-    total_modules = db.query(Module).count()
-    
-    # Contar módulos completados por el usuario
-    completed_modules = db.query(UserProgress).filter(
-        UserProgress.user_id == user_id,
-        UserProgress.completed == True
-    ).count()
-    
-    # Calcular porcentaje
-    completion_percentage = (completed_modules / total_modules * 100) if total_modules > 0 else 0
-    
-    return {
-        "user_id": user_id,
-        "total_modules": total_modules,
-        "completed_modules": completed_modules,
-        "completion_percentage": completion_percentage
-    }
+    # Contadores materializados (lectura por clave primaria) + nº de módulos en caché
+    counters = db.execute(counters_query(user_id)).all()
+    return build_summary(user_id, counters, module_counts.get(db))
@@ -1,22 +1,32 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from database import get_db
 from models import User
 from schemas import User as UserSchema, UserUpdate
 from auth import get_current_user
+from principal_cache import principal_cache
+from pagination import paginate
+from queries import USER_PAGE_KEYS, page_query, users_query
 
 router = APIRouter()
 
 @router.get("/", response_model=List[UserSchema])
 def get_users(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    users = db.query(User).offset(skip).limit(limit).all()
-    return users
+    """Usuarios por id; la página siguiente se pide con ?cursor=<X-Next-Cursor>"""
+    def query(condition, order_by, page_size):
+        return db.execute(page_query(users_query(), condition, order_by, page_size, skip)).scalars().all()
+    
+    page = paginate(query, USER_PAGE_KEYS, cursor, limit)
+    response.headers.update(page.headers)
+    return page.items
 
 @router.get("/{user_id}", response_model=UserSchema)
 def get_user(
@@ -46,6 +56,7 @@ def update_user(
     
     db.commit()
     db.refresh(db_user)
+    principal_cache.invalidate_user(user_id)
     return db_user
 
 @router.delete("/{user_id}")
@@ -60,4 +71,5 @@ def delete_user(
     
     db.delete(db_user)
     db.commit()
+    principal_cache.invalidate_user(user_id)
     return {"message": "User deleted successfully"}
@@ -0,0 +1 @@
+# Versiones asíncronas (AsyncSession) de los routers, activas con DB_ASYNC=true
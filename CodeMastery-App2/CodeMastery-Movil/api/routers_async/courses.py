@@ -0,0 +1,157 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from models import Course, Module, User
+from schemas import Course as CourseSchema, CourseCreate, CourseUpdate, CourseTree, Module as ModuleSchema
+from auth import get_current_user
+from course_tree import course_tree_query, parse_lesson_fields, serialize_course_tree
+from catalog_cache import catalog_cache
+from pagination import paginate_async
+from queries import COURSE_PAGE_KEYS, MODULE_PAGE_KEYS, course_modules_query, courses_query, page_query
+
+router = APIRouter()
+
+@router.get("/", response_model=List[CourseSchema])
+async def get_courses(
+    request: Request,
+    skip: int = 0, 
+    limit: int = 100, 
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Cursos ordenados por id; la página siguiente se pide con ?cursor=<X-Next-Cursor>"""
+    async def query(condition, order_by, page_size):
+        statement = page_query(courses_query(), condition, order_by, page_size, skip)
+        return (await db.execute(statement)).scalars().all()
+    
+    async def load():
+        page = await paginate_async(query, COURSE_PAGE_KEYS, cursor, limit)
+        page.items = [CourseSchema.model_validate(course) for course in page.items]
+        return page
+    return await catalog_cache.respond_async(request, ("courses", skip, limit, cursor), load)
+
+@router.get("/tree", response_model=List[CourseTree], response_model_exclude_unset=True)
+async def get_catalog_tree(
+    request: Request,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Catálogo completo (cursos -> módulos -> lecciones) en 3 consultas"""
+    lesson_fields = parse_lesson_fields(fields)
+    
+    async def load():
+        result = await db.execute(course_tree_query(lesson_fields))
+        return [serialize_course_tree(course, lesson_fields) for course in result.scalars().all()]
+    return await catalog_cache.respond_async(request, ("catalog_tree", lesson_fields), load)
+
+@router.get("/{course_id}/tree", response_model=CourseTree, response_model_exclude_unset=True)
+async def get_course_tree(
+    request: Request,
+    course_id: str,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Curso con sus módulos y resúmenes de lecciones (?fields= para el cuerpo)"""
+    lesson_fields = parse_lesson_fields(fields)
+    
+    async def load():
+        result = await db.execute(course_tree_query(lesson_fields, course_id))
+        course = result.scalars().first()
+        if course is None:
+            raise HTTPException(status_code=404, detail="Course not found")
+        return serialize_course_tree(course, lesson_fields)
+    return await catalog_cache.respond_async(request, ("course_tree", course_id, lesson_fields), load)
+
+@router.get("/{course_id}", response_model=CourseSchema)
+async def get_course(
+    request: Request,
+    course_id: str, 
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    async def load():
+        course = await db.get(Course, course_id)
+        if course is None:
+            raise HTTPException(status_code=404, detail="Course not found")
+        return CourseSchema.model_validate(course)
+    return await catalog_cache.respond_async(request, ("course", course_id), load)
+
+@router.post("/", response_model=CourseSchema)
+async def create_course(
+    course: CourseCreate, 
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Verificar si el curso ya existe
+    db_course = await db.get(Course, course.id)
+    if db_course:
+        raise HTTPException(status_code=400, detail="Course already exists")
+    
+    db_course = Course(**course.dict())
+    db.add(db_course)
+    await db.commit()
+    catalog_cache.bump()
+    await db.refresh(db_course)
+    return db_course
+
+@router.put("/{course_id}", response_model=CourseSchema)
+async def update_course(
+    course_id: str,
+    course: CourseUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    db_course = await db.get(Course, course_id)
+    if db_course is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+    
+    update_data = course.dict(exclude_unset=True)
+    for field, value in update_data.items():
+        setattr(db_course, field, value)
+    
+    await db.commit()
+    catalog_cache.bump()
+    await db.refresh(db_course)
+    return db_course
+
+@router.delete("/{course_id}")
+async def delete_course(
+    course_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    db_course = await db.get(Course, course_id)
+    if db_course is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+    
+    await db.delete(db_course)
+    await db.commit()
+    catalog_cache.bump()
+    return {"message": "Course deleted successfully"}
+
+@router.get("/{course_id}/modules")
+async def get_course_modules(
+    request: Request,
+    course_id: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Módulos por (position, id); sin limit devuelve todos como antes"""
+    async def query(condition, order_by, page_size):
+        statement = page_query(course_modules_query(course_id), condition, order_by, page_size)
+        return (await db.execute(statement)).scalars().all()
+    
+    async def load():
+        if limit is None and cursor is None:
+            result = await db.execute(course_modules_query(course_id))
+            return [ModuleSchema.model_validate(module) for module in result.scalars().all()]
+        page = await paginate_async(query, MODULE_PAGE_KEYS, cursor, limit or 100)
+        page.items = [ModuleSchema.model_validate(module) for module in page.items]
+        return page
+    return await catalog_cache.respond_async(request, ("course_modules", course_id, limit, cursor), load)
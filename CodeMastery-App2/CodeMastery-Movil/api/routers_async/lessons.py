@@ -0,0 +1,198 @@
+# api/routers_async/lessons.py - Versión asíncrona de routers/lessons.py
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from models import Lesson, ExerciseAttempt, User
+from schemas import (
+    Lesson as LessonSchema, 
+    ExerciseSubmission,
+    ExerciseAttempt as ExerciseAttemptSchema
+)
+from auth import get_current_user
+from catalog_cache import catalog_cache
+from attempt_buffer import flush_pending_attempts, merge_pending, pending_attempts, record_attempt_async
+from attempt_archive import archived_attempts_async, archived_last_attempt_async, delete_archived_attempt_async
+from code_store import resolve_code_async
+from grading import grade_async, matchers, submission_result
+from submission_jobs import (
+    FINISHED, SUBMISSION_ASYNC, SUBMISSION_POLL_SECONDS, clamp_wait, enqueued, job_query, job_status, new_job
+)
+from pagination import decode_cursor, paginate_async
+from queries import ATTEMPT_PAGE_KEYS, last_attempt_query, page_query, user_attempts_query
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+# (declarado antes de /{lesson_id} para que "intentos" no se tome como id)
+@router.get("/intentos", response_model=List[ExerciseAttemptSchema])
+async def get_user_attempts(
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+    limit: int = 50,
+    cursor: Optional[str] = None
+):
+    """Intentos del usuario autenticado, paginados por (attempt_date, id) descendente"""
+    logger.debug("Fetching attempts for user %s (ID: %s)", current_user.email, current_user.id)
+    
+    # Leído antes de la consulta: una fila insertada entre medias se descarta por id
+    pending = pending_attempts(current_user.id)
+    cursor_values = decode_cursor(cursor, len(ATTEMPT_PAGE_KEYS)) if cursor else None
+    
+    async def query(condition, order_by, page_size):
+        statement = page_query(user_attempts_query(current_user.id), condition, order_by, page_size)
+        rows = list((await db.execute(statement)).scalars().all())
+        # Tabla caliente agotada: seguir por los meses archivados (siempre más antiguos)
+        if len(rows) < page_size:
+            rows += await archived_attempts_async(db, current_user.id, cursor, page_size - len(rows))
+        # Intentos aún en el buffer, en su sitio del orden keyset (el corte a page_size decide el cursor)
+        return merge_pending(rows, pending, cursor_values, page_size)
+    
+    try:
+        page = await paginate_async(query, ATTEMPT_PAGE_KEYS, cursor, limit, descending=True)
+        response.headers.update(page.headers)
+        # Código guardado en code_blobs: una consulta para toda la página
+        await resolve_code_async(db, page.items)
+        return page.items
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching user attempts: %s", e)
+        return []
+
+@router.get("/jobs/{job_id}")
+async def get_submission_job(
+    job_id: int,
+    wait: float = 0,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Estado de un envío en cola; ?wait=N espera hasta N s a que termine"""
+    deadline = time.monotonic() + clamp_wait(wait)
+    while True:
+        job = (await db.execute(job_query(job_id, current_user.id))).scalars().first()
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job.status in FINISHED or time.monotonic() >= deadline:
+            return job_status(job)
+        # Cerrar la transacción para ver el commit del worker y liberar la conexión
+        await db.rollback()
+        await asyncio.sleep(SUBMISSION_POLL_SECONDS)
+
+@router.get("/{lesson_id}", response_model=LessonSchema)
+async def get_lesson(
+    request: Request,
+    lesson_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    async def load():
+        lesson = await db.get(Lesson, lesson_id)
+        if lesson is None:
+            raise HTTPException(status_code=404, detail="Lesson not found")
+        return LessonSchema.model_validate(lesson)
+    return await catalog_cache.respond_async(request, ("lesson", lesson_id), load)
+
+@router.post("/{lesson_id}/enviar")
+async def submit_code(
+    lesson_id: int,
+    submission: ExerciseSubmission,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    logger.debug("Code submission for lesson %s by user %s", lesson_id, current_user.email)
+    
+    # Solución ya normalizada en caché: sin cargar la lección en cada envío
+    matcher = await matchers.get_async(db, lesson_id)
+    if matcher is None:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+    
+    if SUBMISSION_ASYNC:
+        # Modo cola: guardar el envío y devolver 202; un worker lo corrige después
+        job = new_job(current_user.id, lesson_id, submission.code_submitted)
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        return JSONResponse(status_code=202, content=enqueued(job))
+    
+    submitted_code = submission.code_submitted.strip()
+    is_correct, test_results = await grade_async(matcher, submitted_code, db)
+    
+    logger.debug("Code validation for lesson %s: correct=%s", lesson_id, is_correct)
+    
+    try:
+        attempt_id = await record_attempt_async(
+            db, current_user.id, lesson_id, submission.code_submitted, is_correct
+        )
+        await db.commit()
+        
+        logger.debug("Exercise attempt saved with ID: %s", attempt_id)
+        
+        return submission_result(matcher, submitted_code, is_correct, attempt_id, test_results)
+    except Exception as e:
+        logger.error(f"Error saving attempt: {str(e)}")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Error al guardar el intento")
+
+@router.get("/{lesson_id}/ultimo-intento", response_model=ExerciseAttemptSchema)
+async def get_last_attempt(
+    lesson_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Un intento aún en el buffer es más reciente que cualquiera de la tabla
+    pending = pending_attempts(current_user.id, lesson_id)
+    if pending:
+        return pending[0]
+    
+    attempt = (await db.execute(last_attempt_query(current_user.id, lesson_id))).scalars().first()
+    if attempt is None:
+        # Sin intentos recientes: buscar en los meses archivados
+        attempt = await archived_last_attempt_async(db, current_user.id, lesson_id)
+    
+    if attempt is None:
+        raise HTTPException(status_code=404, detail="No attempts found")
+    
+    await resolve_code_async(db, [attempt])
+    return attempt
+
+@router.delete("/intentos/{attempt_id}")
+async def delete_attempt(
+    attempt_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Un intento recién enviado puede seguir en el buffer: solo entonces se vacía
+    if any(row["id"] == attempt_id for row in pending_attempts(current_user.id)):
+        await asyncio.to_thread(flush_pending_attempts)
+    
+    attempt = await db.get(ExerciseAttempt, attempt_id)
+    if attempt is None:
+        # Intento antiguo: puede estar en una tabla mensual del archivo
+        archived = await delete_archived_attempt_async(db, current_user.id, attempt_id)
+        if archived is None:
+            raise HTTPException(status_code=404, detail="Attempt not found")
+        if archived is False:
+            raise HTTPException(status_code=403, detail="Not authorized to delete this attempt")
+        await db.commit()
+        logger.info(f"Archived attempt {attempt_id} deleted by user {current_user.email}")
+        return {"message": "Attempt deleted successfully"}
+    
+    if attempt.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to delete this attempt")
+    
+    try:
+        await db.delete(attempt)
+        await db.commit()
+        logger.info(f"Attempt {attempt_id} deleted by user {current_user.email}")
+        return {"message": "Attempt deleted successfully"}
+    except Exception as e:
+        logger.error(f"Error deleting attempt {attempt_id}: {str(e)}")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Error al eliminar el intento")
@@ -0,0 +1,101 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from models import Module, Lesson, User
+from schemas import Module as ModuleSchema, ModuleCreate, ModuleUpdate, Lesson as LessonSchema
+from auth import get_current_user
+from catalog_cache import catalog_cache
+from progress_counters import module_counts
+from pagination import paginate_async
+from queries import LESSON_PAGE_KEYS, module_lessons_query, page_query
+
+router = APIRouter()
+
+@router.get("/{module_id}", response_model=ModuleSchema)
+async def get_module(
+    request: Request,
+    module_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    async def load():
+        module = await db.get(Module, module_id)
+        if module is None:
+            raise HTTPException(status_code=404, detail="Module not found")
+        return ModuleSchema.model_validate(module)
+    return await catalog_cache.respond_async(request, ("module", module_id), load)
+
+@router.get("/{module_id}/lessons")
+async def get_module_lessons(
+    request: Request,
+    module_id: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Lecciones por (position, id); sin limit devuelve todas como antes"""
+    async def query(condition, order_by, page_size):
+        statement = page_query(module_lessons_query(module_id), condition, order_by, page_size)
+        return (await db.execute(statement)).scalars().all()
+    
+    async def load():
+        if limit is None and cursor is None:
+            result = await db.execute(module_lessons_query(module_id))
+            return [LessonSchema.model_validate(lesson) for lesson in result.scalars().all()]
+        page = await paginate_async(query, LESSON_PAGE_KEYS, cursor, limit or 100)
+        page.items = [LessonSchema.model_validate(lesson) for lesson in page.items]
+        return page
+    return await catalog_cache.respond_async(request, ("module_lessons", module_id, limit, cursor), load)
+
+@router.post("/", response_model=ModuleSchema)
+async def create_module(
+    module: ModuleCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    db_module = Module(**module.dict())
+    db.add(db_module)
+    await db.commit()
+    catalog_cache.bump()
+    module_counts.invalidate()
+    await db.refresh(db_module)
+    return db_module
+
+@router.put("/{module_id}", response_model=ModuleSchema)
+async def update_module(
+    module_id: str,
+    module: ModuleUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    db_module = await db.get(Module, module_id)
+    if db_module is None:
+        raise HTTPException(status_code=404, detail="Module not found")
+    
+    update_data = module.dict(exclude_unset=True)
+    for field, value in update_data.items():
+        setattr(db_module, field, value)
+    
+    await db.commit()
+    catalog_cache.bump()
+    module_counts.invalidate()
+    await db.refresh(db_module)
+    return db_module
+
+@router.delete("/{module_id}")
+async def delete_module(
+    module_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    db_module = await db.get(Module, module_id)
+    if db_module is None:
+        raise HTTPException(status_code=404, detail="Module not found")
+    
+    await db.delete(db_module)
+    await db.commit()
+    catalog_cache.bump()
+    module_counts.invalidate()
+    return {"message": "Module deleted successfully"}
@@ -0,0 +1,72 @@
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from models import UserProgress, User, Module
+from schemas import UserProgress as UserProgressSchema, UserProgressCreate, UserProgressUpdate
+from auth import get_current_user_id
+from progress_counters import (
+    apply_completion_delta_async, build_summary, counters_query, module_counts, progress_row_query
+)
+from queries import user_progress_query
+
+router = APIRouter()
+
+@router.get("/{user_id}", response_model=List[UserProgressSchema])
+async def get_user_progress(
+    user_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: int = Depends(get_current_user_id)
+):
+    result = await db.execute(user_progress_query(user_id))
+    return result.scalars().all()
+
+@router.put("/")
+async def update_progress(
+    user_id: int,
+    module_id: str,
+    progress: UserProgressUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: int = Depends(get_current_user_id)
+):
+    # Verificar que el usuario solo puede actualizar su propio progreso
+    if current_user_id != user_id:
+        raise HTTPException(status_code=403, detail="Cannot update other user's progress")
+    module = await db.get(Module, module_id)
+    if module is None:
+        raise HTTPException(status_code=404, detail="Module not found")
+    # Buscar progreso existente (bloqueado: was_completed no cambia hasta el commit)
+    db_progress = (await db.execute(progress_row_query(user_id, module_id))).scalars().first()
+    if db_progress is None:
+        # Crear la fila sin completar; si otra petición la crea a la vez, se usa la suya
+        try:
+            async with db.begin_nested():
+                db.add(UserProgress(user_id=user_id, module_id=module_id, completed=False))
+        except IntegrityError:
+            pass
+        db_progress = (await db.execute(progress_row_query(user_id, module_id))).scalars().first()
+    was_completed = bool(db_progress.completed)
+    
+    update_data = progress.dict(exclude_unset=True)
+    for field, value in update_data.items():
+        setattr(db_progress, field, value)
+    
+    # ✅ Mantener los contadores materializados en la misma transacción
+    await apply_completion_delta_async(
+        db, user_id, module.course_id, int(bool(db_progress.completed)) - int(was_completed)
+    )
+    await db.commit()
+    await db.refresh(db_progress)
+    return db_progress
+
+@router.get("/resumen/{user_id}")
+async def get_user_summary(
+    user_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: int = Depends(get_current_user_id)
+):
+    # Contadores materializados (lectura por clave primaria) + nº de módulos en caché
+    counters = (await db.execute(counters_query(user_id))).all()
+    return build_summary(user_id, counters, await module_counts.get_async(db))
@@ -0,0 +1,76 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from models import User
+from schemas import User as UserSchema, UserUpdate
+from auth import get_current_user
+from principal_cache import principal_cache
+from pagination import paginate_async
+from queries import USER_PAGE_KEYS, page_query, users_query
+
+router = APIRouter()
+
+@router.get("/", response_model=List[UserSchema])
+async def get_users(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Usuarios por id; la página siguiente se pide con ?cursor=<X-Next-Cursor>"""
+    async def query(condition, order_by, page_size):
+        statement = page_query(users_query(), condition, order_by, page_size, skip)
+        return (await db.execute(statement)).scalars().all()
+    
+    page = await paginate_async(query, USER_PAGE_KEYS, cursor, limit)
+    response.headers.update(page.headers)
+    return page.items
+
+@router.get("/{user_id}", response_model=UserSchema)
+async def get_user(
+    user_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    user = await db.get(User, user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+@router.put("/{user_id}", response_model=UserSchema)
+async def update_user(
+    user_id: int,
+    user: UserUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    db_user = await db.get(User, user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    update_data = user.dict(exclude_unset=True)
+    for field, value in update_data.items():
+        setattr(db_user, field, value)
+    
+    await db.commit()
+    await db.refresh(db_user)
+    principal_cache.invalidate_user(user_id)
+    return db_user
+
+@router.delete("/{user_id}")
+async def delete_user(
+    user_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    db_user = await db.get(User, user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    await db.delete(db_user)
+    await db.commit()
+    principal_cache.invalidate_user(user_id)
+    return {"message": "User deleted successfully"}
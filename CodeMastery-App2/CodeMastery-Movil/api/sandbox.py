@@ -0,0 +1,577 @@
+# api/sandbox.py - Ejecución de envíos de Python contra casos de prueba en procesos aislados
+import asyncio
+import builtins
+import io
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import select
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+
+import metrics
+from sandbox_isolation import confine, die_with_parent, scrub_environment
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuración
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", str(os.cpu_count() or 2)))
+SANDBOX_MAX_PENDING = int(os.getenv("SANDBOX_MAX_PENDING", str(SANDBOX_WORKERS * 4)))
+SANDBOX_CPU_SECONDS = float(os.getenv("SANDBOX_CPU_SECONDS", "2"))
+SANDBOX_WALL_SECONDS = float(os.getenv("SANDBOX_WALL_SECONDS", "10"))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "256"))
+SANDBOX_OUTPUT_LIMIT = int(os.getenv("SANDBOX_OUTPUT_LIMIT", "65536"))
+# Sin seccomp (otro SO o arquitectura) el sandbox no ejecuta código; false solo para desarrollo local
+SANDBOX_REQUIRE_ISOLATION = os.getenv("SANDBOX_REQUIRE_ISOLATION", "true").lower() in ("1", "true", "yes")
+# Reintento de la comprobación de arranque mientras el sandbox no esté disponible
+SANDBOX_PROBE_RETRY_SECONDS = float(os.getenv("SANDBOX_PROBE_RETRY_SECONDS", "30"))
+# Trabajos de cada worker antes de sustituirlo por uno nuevo (cada envío ya corre en su propio hijo)
+SANDBOX_MAX_JOBS_PER_WORKER = int(os.getenv("SANDBOX_MAX_JOBS_PER_WORKER", "500"))
+
+
+class SandboxSaturated(Exception):
+    """El pool tiene SANDBOX_MAX_PENDING trabajos pendientes"""
+
+
+class SandboxUnavailable(Exception):
+    """Los procesos del sandbox no arrancan o no se pueden aislar en este host"""
+
+
+class CpuTimeExceeded(BaseException):
+    """BaseException para que un `except Exception` del envío no la absorba"""
+
+
+class OutputLimitExceeded(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Lado del hijo (un proceso por envío, el único que ejecuta código enviado)
+# ---------------------------------------------------------------------------
+
+# Un mensaje de error por caso como mucho (el JSON del hijo tiene tamaño acotado)
+ERROR_LIMIT = 2000
+
+try:
+    _MAXFD = os.sysconf("SC_OPEN_MAX")
+except (AttributeError, ValueError):
+    _MAXFD = 256
+
+
+def _on_cpu_limit(signum, frame):
+    raise CpuTimeExceeded()
+
+
+def _confine_child(result_fd, wall_seconds, memory_mb, require_isolation):
+    """Límites y aislamiento del hijo antes de ejecutar el envío.
+
+    Solo conserva el pipe de resultados: ni la conexión del worker con la API
+    (pickle) ni ningún otro descriptor heredado llegan al código enviado. El
+    aislamiento lo impone el kernel (sandbox_isolation) y el envío no puede
+    deshacerlo aunque importe sys o ctypes.
+    """
+    import resource
+
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    os.closerange(3, result_fd)
+    os.closerange(result_fd + 1, _MAXFD)
+    die_with_parent()
+
+    memory = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    # Ningún fichero regular puede crecer: escrituras a disco fallan a nivel de kernel
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    # Respaldo si un envío desactiva el temporizador: el kernel mata el proceso
+    cpu_budget = int(wall_seconds) + 1
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_budget, cpu_budget))
+    signal.signal(signal.SIGPROF, _on_cpu_limit)
+    sys.dont_write_bytecode = True
+    os.chdir("/")
+    scrub_environment()
+    return confine(require=require_isolation)
+
+
+class _LimitedOutput(io.StringIO):
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+
+    def write(self, text):
+        if self.tell() + len(text) > self.limit:
+            raise OutputLimitExceeded()
+        return super().write(text)
+
+
+def _run_case(program, stdin, cpu_seconds, output_limit):
+    stdout = _LimitedOutput(output_limit)
+    saved = sys.stdin, sys.stdout, sys.stderr
+    sys.stdin, sys.stdout, sys.stderr = io.StringIO(stdin), stdout, io.StringIO()
+    error = None
+    signal.setitimer(signal.ITIMER_PROF, cpu_seconds)
+    try:
+        exec(program, {"__name__": "__main__", "__builtins__": dict(vars(builtins))})
+    except SystemExit:
+        pass
+    except CpuTimeExceeded:
+        error = "Tiempo de CPU excedido"
+    except MemoryError:
+        error = "Memoria excedida"
+    except OutputLimitExceeded:
+        error = "Salida demasiado grande"
+    except PermissionError as e:
+        error = f"Operación no permitida: {e}"
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        sys.stdin, sys.stdout, sys.stderr = saved
+    return {"stdout": stdout.getvalue(), "error": error if error is None else error[:ERROR_LIMIT]}
+
+
+def run_tests(code, stdins, cpu_seconds, output_limit):
+    """Compilar una vez y ejecutar con cada stdin; corre en el hijo.
+
+    Devuelve la salida de cada caso: la salida esperada nunca sale de la API
+    y la comparación se hace allí (grade_outcome).
+    """
+    try:
+        program = compile(code, "<submission>", "exec")
+    except (SyntaxError, ValueError) as e:
+        return [{"stdout": "", "error": f"{type(e).__name__}: {e}"[:ERROR_LIMIT]} for _ in stdins]
+    return [_run_case(program, stdin, cpu_seconds, output_limit) for stdin in stdins]
+
+
+def _run_child(result_fd, code, stdins, cpu_seconds, wall_seconds, memory_mb, output_limit, require_isolation):
+    try:
+        isolation = _confine_child(result_fd, wall_seconds, memory_mb, require_isolation)
+    except Exception as e:
+        payload = {"unavailable": f"{type(e).__name__}: {e}"}
+    else:
+        payload = {"results": run_tests(code, stdins, cpu_seconds, output_limit), "isolation": isolation}
+    data = json.dumps(payload).encode()
+    while data:
+        data = data[os.write(result_fd, data):]
+
+
+# ---------------------------------------------------------------------------
+# Lado del worker (procesos precargados; nunca ejecutan código enviado)
+# ---------------------------------------------------------------------------
+
+def result_limit(cases, output_limit):
+    """Bytes máximos del JSON de un hijo (\\uXXXX ocupa 6 bytes por carácter)"""
+    return cases * 6 * (output_limit + ERROR_LIMIT + 64) + 4096
+
+
+def _collect(fd, deadline, limit):
+    chunks, size = [], 0
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+            return "timeout", None
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            return "ok", b"".join(chunks)
+        size += len(chunk)
+        if size > limit:
+            return "oversized", None
+        chunks.append(chunk)
+
+
+def _run_isolated(code, stdins, cpu_seconds, wall_seconds, memory_mb, output_limit, require_isolation):
+    """Ejecutar un envío en un hijo nuevo; devuelve (estado, bytes JSON del hijo sin interpretar).
+
+    fork desde el worker no arranca otro intérprete: el hijo comparte (copia
+    en escritura) el que ya está cargado. El tiempo de pared cuenta desde el
+    fork, y al vencer solo se mata a este hijo.
+    """
+    read_fd, write_fd = os.pipe()
+    deadline = time.monotonic() + wall_seconds
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            os.close(read_fd)
+            _run_child(write_fd, code, stdins, cpu_seconds, wall_seconds, memory_mb, output_limit, require_isolation)
+            status = 0
+        finally:
+            os._exit(status)
+    os.close(write_fd)
+    try:
+        return _collect(read_fd, deadline, result_limit(len(stdins), output_limit))
+    finally:
+        os.close(read_fd)
+        # Con el resultado leído (o fuera de tiempo/tamaño) el hijo ya no tiene nada que hacer
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        os.waitpid(pid, 0)
+
+
+def _worker_main(conn, cpu_seconds, wall_seconds, memory_mb, output_limit, require_isolation):
+    """Bucle del worker: un trabajo (código, stdins) por mensaje hasta recibir None"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C lo gestiona la API
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        code, stdins = job
+        conn.send(_run_isolated(code, stdins, cpu_seconds, wall_seconds, memory_mb, output_limit, require_isolation))
+
+
+# ---------------------------------------------------------------------------
+# Lado de la API
+# ---------------------------------------------------------------------------
+
+# Margen sobre SANDBOX_WALL_SECONDS antes de dar por colgado a un worker (no a su hijo)
+WORKER_GRACE_SECONDS = 5
+
+
+def normalize_output(text):
+    return [line.rstrip() for line in text.rstrip().splitlines()]
+
+
+def decode_results(data, count):
+    """JSON de un hijo validado con json.loads; None si no tiene la forma esperada.
+
+    El hijo ha ejecutado código no confiable: su salida solo se interpreta
+    como datos (nunca pickle) y se descarta si no es la lista de casos.
+    """
+    try:
+        payload = json.loads(data)
+    except (ValueError, RecursionError):
+        return None
+    if not isinstance(payload, dict):
+        return None
+    if isinstance(payload.get("unavailable"), str):
+        return {"unavailable": payload["unavailable"]}
+    results = payload.get("results")
+    if not isinstance(results, list) or len(results) != count:
+        return None
+    clean = []
+    for result in results:
+        if not isinstance(result, dict) or not isinstance(result.get("stdout"), str):
+            return None
+        if result.get("error") is not None and not isinstance(result["error"], str):
+            return None
+        clean.append({"stdout": result["stdout"], "error": result.get("error")})
+    isolation = payload.get("isolation")
+    return {"results": clean, "isolation": isolation if isinstance(isolation, dict) else None}
+
+
+def grade_outcome(results, test_cases):
+    """Comparar en la API la salida de cada caso con la esperada"""
+    results = [
+        {
+            "passed": result["error"] is None and normalize_output(result["stdout"]) == normalize_output(expected_stdout),
+            "error": result["error"],
+        }
+        for result, (_, expected_stdout) in zip(results, test_cases)
+    ]
+    return {"passed": bool(results) and all(result["passed"] for result in results), "results": results}
+
+
+def _mp_context():
+    # forkserver: los workers nacen de un proceso limpio, no de la API con sus hilos y conexiones.
+    # Ojo: multiprocessing reimporta el script __main__ en cada worker; arrancar con
+    # `uvicorn main:app` (Dockerfile, start.sh) para que ese script sea el de uvicorn.
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    context = multiprocessing.get_context(method)
+    if method == "forkserver":
+        context.set_forkserver_preload(["sandbox"])
+    return context
+
+
+class SandboxPool:
+    """Workers precargados con cola acotada y métricas.
+
+    Cada worker es un intérprete ya cargado que nunca ejecuta código enviado:
+    por cada trabajo hace fork de un hijo aislado por el kernel, sin más
+    descriptor que un pipe por el que devuelve JSON de tamaño acotado. Un
+    hilo de la API por worker le pasa los trabajos de la cola y lo recicla
+    cada max_jobs_per_worker trabajos (o lo sustituye si deja de responder).
+    """
+
+    def __init__(self, workers, max_pending, cpu_seconds, wall_seconds, memory_mb, output_limit,
+                 require_isolation=SANDBOX_REQUIRE_ISOLATION, max_jobs_per_worker=SANDBOX_MAX_JOBS_PER_WORKER):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.require_isolation = require_isolation
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.cpu_seconds = cpu_seconds
+        self.wall_seconds = wall_seconds
+        self.memory_mb = memory_mb
+        self.output_limit = output_limit
+        self._jobs = None
+        self._processes = {}
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.crashes = 0
+        self.recycled = 0
+        self.restarts = 0
+        self.queue_wait = metrics.Histogram()
+        self.duration = metrics.Histogram()
+        # None = sin comprobar todavía; el texto del error mientras no esté disponible
+        self.unavailable = None
+        self.isolation = None
+        self._stop = threading.Event()
+        self._prober = None
+
+    # -- workers ------------------------------------------------------------
+
+    def _queue(self):
+        """Cola de trabajos; la primera vez arranca un hilo (y su worker) por slot"""
+        with self._lock:
+            if self._jobs is None:
+                self._jobs = queue.Queue()
+                for slot in range(self.workers):
+                    threading.Thread(
+                        target=self._dispatch, args=(self._jobs, slot), name=f"sandbox-{slot}", daemon=True
+                    ).start()
+            return self._jobs
+
+    def _spawn(self, slot):
+        context = _mp_context()
+        conn, worker_conn = context.Pipe()
+        process = context.Process(
+            target=_worker_main,
+            args=(worker_conn, self.cpu_seconds, self.wall_seconds, self.memory_mb, self.output_limit,
+                  self.require_isolation),
+            name=f"sandbox-worker-{slot}",
+            daemon=True,
+        )
+        process.start()
+        worker_conn.close()
+        with self._lock:
+            self._processes[slot] = process
+        return process, conn
+
+    def _spawn_logged(self, slot):
+        try:
+            return self._spawn(slot)
+        except Exception as e:
+            logger.error("❌ Could not start sandbox worker %d: %s", slot, e)
+            return None
+
+    def _retire(self, slot, worker, kill=False):
+        process, conn = worker
+        if not kill:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            process.join(1)
+        conn.close()
+        if process.is_alive():
+            process.kill()
+            process.join(1)
+        with self._lock:
+            if self._processes.get(slot) is process:
+                del self._processes[slot]
+
+    def _execute(self, worker, code, stdins):
+        process, conn = worker
+        conn.send((code, stdins))
+        # El worker limita el tiempo de su hijo desde que empieza el trabajo; esto solo cubre un worker colgado
+        if not conn.poll(self.wall_seconds + WORKER_GRACE_SECONDS):
+            raise TimeoutError("sandbox worker not responding")
+        return conn.recv()
+
+    def _dispatch(self, jobs, slot):
+        """Hilo de un slot: trabajos de la cola a su worker, de uno en uno"""
+        worker, done = self._spawn_logged(slot), 0
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            code, stdins, future, enqueued_at = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            if worker is None:
+                worker, done = self._spawn_logged(slot), 0
+                if worker is None:
+                    future.set_exception(SandboxUnavailable("sandbox worker could not start"))
+                    continue
+            started_at = time.monotonic()
+            try:
+                status, data = self._execute(worker, code, stdins)
+            except (OSError, EOFError) as e:
+                # Worker muerto o colgado: se sustituye solo este, los demás trabajos siguen
+                logger.warning("⚠️ Sandbox worker %d failed, replacing it: %s", slot, e)
+                self._retire(slot, worker, kill=True)
+                with self._lock:
+                    self.restarts += 1
+                worker, done = self._spawn_logged(slot), 0
+                status, data = ("timeout" if isinstance(e, TimeoutError) else "crashed"), None
+            future.set_result((status, data, enqueued_at, started_at))
+            done += 1
+            if worker is not None and done >= self.max_jobs_per_worker:
+                self._retire(slot, worker)
+                with self._lock:
+                    self.recycled += 1
+                worker, done = self._spawn_logged(slot), 0
+        if worker is not None:
+            self._retire(slot, worker)
+
+    def _enqueue(self, code, stdins):
+        future = Future()
+        self._queue().put((code, stdins, future, time.monotonic()))
+        return future
+
+    # -- disponibilidad -----------------------------------------------------
+
+    def start(self):
+        """Arrancar los workers y comprobar en segundo plano que se aíslan (no retrasa el arranque de la API)"""
+        self._queue()
+        if self._prober is None:
+            self._stop.clear()
+            self._prober = threading.Thread(target=self._probe_until_available, name="sandbox-probe", daemon=True)
+            self._prober.start()
+
+    def probe(self) -> bool:
+        """Ejecutar un trabajo vacío; si falla, los envíos con casos de prueba reciben 503"""
+        try:
+            future = self._enqueue("", [])
+            status, data, _, _ = future.result(timeout=max(self.wall_seconds, 30) + WORKER_GRACE_SECONDS)
+            payload = decode_results(data, 0) if status == "ok" else None
+            if payload is None:
+                raise SandboxUnavailable(f"probe job {status}")
+            if "unavailable" in payload:
+                raise SandboxUnavailable(payload["unavailable"])
+        except Exception as e:
+            self.unavailable = f"{type(e).__name__}: {e}"
+            logger.error("❌ Sandbox unavailable, lessons with test cases will return 503: %s", self.unavailable)
+            return False
+        self.isolation = payload["isolation"]
+        self.unavailable = None
+        if not (self.isolation or {}).get("landlock_abi"):
+            logger.warning("⚠️ Landlock not available: sandbox processes can read files outside Python's install")
+        logger.info("🧪 Sandbox ready: %s", self.isolation)
+        return True
+
+    def _probe_until_available(self):
+        while not self.probe() and not self._stop.wait(SANDBOX_PROBE_RETRY_SECONDS):
+            pass
+
+    # -- trabajos -----------------------------------------------------------
+
+    def _acquire(self):
+        if self.unavailable is not None:
+            raise SandboxUnavailable(self.unavailable)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise SandboxSaturated()
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _failure(self, message, test_cases):
+        # transient: depende de la carga del servidor, no del código (no cachear el veredicto)
+        return {
+            "passed": False,
+            "results": [{"passed": False, "error": message} for _ in test_cases],
+            "transient": True,
+        }
+
+    def _finish(self, job_result, test_cases):
+        status, data, enqueued_at, started_at = job_result
+        self.queue_wait.observe(max(started_at - enqueued_at, 0.0))
+        self.duration.observe(time.monotonic() - enqueued_at)
+        payload = decode_results(data, len(test_cases)) if status == "ok" else None
+        if payload is not None and "unavailable" in payload:
+            raise SandboxUnavailable(payload["unavailable"])
+        with self._lock:
+            if status == "timeout":
+                self.timeouts += 1
+            elif payload is None:
+                self.crashes += 1
+            else:
+                self.completed += 1
+        if status == "timeout":
+            return self._failure("Tiempo de ejecución excedido", test_cases)
+        if status == "oversized":
+            return self._failure("Salida demasiado grande", test_cases)
+        if payload is None:
+            # Límite de CPU/memoria del kernel o salida manipulada por el envío
+            return self._failure("El programa terminó de forma inesperada", test_cases)
+        return grade_outcome(payload["results"], test_cases)
+
+    def run_sync(self, code, test_cases):
+        """Corregir desde un handler síncrono (bloquea el hilo del threadpool)"""
+        self._acquire()
+        try:
+            future = self._enqueue(code, [stdin for stdin, _ in test_cases])
+            return self._finish(future.result(), test_cases)
+        finally:
+            self._release()
+
+    async def run(self, code, test_cases):
+        """Corregir sin bloquear el event loop; SandboxSaturated si la cola está llena"""
+        self._acquire()
+        try:
+            future = self._enqueue(code, [stdin for stdin, _ in test_cases])
+            return self._finish(await asyncio.wrap_future(future), test_cases)
+        finally:
+            self._release()
+
+    def stats(self):
+        with self._lock:
+            alive = sum(1 for process in self._processes.values() if process.is_alive())
+            pending, completed = self._pending, self.completed
+            rejected, timeouts, crashes = self.rejected, self.timeouts, self.crashes
+            recycled, restarts = self.recycled, self.restarts
+        return {
+            "workers": self.workers,
+            "alive_workers": alive,
+            "max_pending": self.max_pending,
+            "max_jobs_per_worker": self.max_jobs_per_worker,
+            "available": self.unavailable is None,
+            "unavailable_reason": self.unavailable,
+            "isolation": self.isolation,
+            "queued": max(pending - self.workers, 0),
+            "pending": pending,
+            "completed": completed,
+            "rejected": rejected,
+            "timeouts": timeouts,
+            "crashes": crashes,
+            "recycled": recycled,
+            "restarts": restarts,
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+            "duration_seconds": self.duration.snapshot(),
+        }
+
+    def shutdown(self):
+        """Cada hilo termina los trabajos ya encolados y retira su worker"""
+        self._stop.set()
+        with self._lock:
+            jobs, self._jobs = self._jobs, None
+        if jobs is not None:
+            for _ in range(self.workers):
+                jobs.put(None)
+
+
+sandbox_pool = SandboxPool(
+    SANDBOX_WORKERS, SANDBOX_MAX_PENDING, SANDBOX_CPU_SECONDS, SANDBOX_WALL_SECONDS,
+    SANDBOX_MEMORY_MB, SANDBOX_OUTPUT_LIMIT,
+)
+metrics.register("sandbox", sandbox_pool.stats)
@@ -0,0 +1,242 @@
+# api/sandbox_isolation.py - Aislamiento a nivel de kernel de los procesos del sandbox (seccomp + Landlock)
+"""
+Se aplica en cada proceso del sandbox antes de ejecutar código enviado y no
+se puede deshacer desde Python: el kernel filtra las llamadas al sistema.
+
+- seccomp: sin red (socket/connect...), sin procesos nuevos (fork/clone/exec),
+  sin señales a otros procesos, sin abrir ficheros para escribir ni borrar,
+  renombrar o crear entradas en el sistema de ficheros. Responde EPERM.
+- Landlock (Linux >= 5.13, sin privilegios): solo lectura y solo bajo los
+  directorios de la instalación de Python; nada de .env, /proc ni el código
+  de la API.
+"""
+import ctypes
+import errno
+import os
+import platform
+import signal
+import struct
+import sys
+
+# Constantes de <linux/seccomp.h>, <linux/filter.h>, <linux/audit.h>, <linux/prctl.h>
+PR_SET_PDEATHSIG = 1
+PR_SET_NO_NEW_PRIVS = 38
+PR_SET_SECCOMP = 22
+SECCOMP_MODE_FILTER = 2
+SECCOMP_RET_KILL_PROCESS = 0x80000000
+SECCOMP_RET_ERRNO = 0x00050000
+SECCOMP_RET_ALLOW = 0x7FFF0000
+BPF_LD_W_ABS = 0x20
+BPF_JEQ_K = 0x15
+BPF_JGE_K = 0x35
+BPF_JSET_K = 0x45
+BPF_RET_K = 0x06
+# Desplazamientos en struct seccomp_data
+DATA_NR, DATA_ARCH, DATA_ARGS = 0, 4, 16
+
+OPEN_WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_CREAT | os.O_TRUNC | os.O_APPEND
+
+# (arquitectura de auditoría, llamadas prohibidas, {llamada open*: (nr, índice del argumento flags)})
+SYSCALLS = {
+    "x86_64": (
+        0xC000003E,
+        {
+            # red
+            "socket": 41, "connect": 42, "accept": 43, "sendto": 44, "bind": 49, "listen": 50,
+            "socketpair": 53, "accept4": 288,
+            # procesos y señales
+            "clone": 56, "fork": 57, "vfork": 58, "execve": 59, "kill": 62, "ptrace": 101,
+            "tkill": 200, "tgkill": 234, "execveat": 322, "pidfd_send_signal": 424, "clone3": 435,
+            "process_vm_readv": 310, "process_vm_writev": 311,
+            # sistema de ficheros
+            "creat": 85, "truncate": 76, "rename": 82, "mkdir": 83, "rmdir": 84, "link": 86, "unlink": 87,
+            "symlink": 88, "chmod": 90, "fchmod": 91, "chown": 92, "fchown": 93, "lchown": 94,
+            "unlinkat": 263, "renameat": 264, "linkat": 265, "symlinkat": 266, "fchmodat": 268,
+            "fchownat": 260, "mkdirat": 258, "renameat2": 316, "openat2": 437,
+            # escapes del propio aislamiento
+            "setrlimit": 160, "prlimit64": 302, "mount": 165, "umount2": 166, "unshare": 272,
+            "setns": 308, "bpf": 321, "personality": 135, "io_uring_setup": 425,
+        },
+        {"open": (2, 1), "openat": (257, 2)},
+    ),
+    "aarch64": (
+        0xC00000B7,
+        {
+            "socket": 198, "socketpair": 199, "bind": 200, "listen": 201, "accept": 202, "connect": 203,
+            "sendto": 206, "accept4": 242,
+            "clone": 220, "execve": 221, "kill": 129, "tkill": 130, "tgkill": 131, "ptrace": 117,
+            "execveat": 281, "pidfd_send_signal": 424, "clone3": 435,
+            "process_vm_readv": 270, "process_vm_writev": 271,
+            "truncate": 45, "unlinkat": 35, "renameat": 38, "linkat": 37, "symlinkat": 36, "fchmod": 52,
+            "fchmodat": 53, "fchown": 55, "fchownat": 54, "mkdirat": 34, "renameat2": 276, "openat2": 437,
+            "setrlimit": 164, "prlimit64": 261, "mount": 40, "umount2": 39, "unshare": 97,
+            "setns": 268, "bpf": 280, "personality": 92, "io_uring_setup": 425,
+        },
+        {"openat": (56, 2)},
+    ),
+}
+
+# Landlock (<linux/landlock.h>): mismos números en x86_64 y aarch64
+SYS_LANDLOCK_CREATE_RULESET = 444
+SYS_LANDLOCK_ADD_RULE = 445
+SYS_LANDLOCK_RESTRICT_SELF = 446
+LANDLOCK_CREATE_RULESET_VERSION = 1
+LANDLOCK_RULE_PATH_BENEATH = 1
+LANDLOCK_ACCESS_FS_READ_FILE = 1 << 2
+LANDLOCK_ACCESS_FS_READ_DIR = 1 << 3
+LANDLOCK_ACCESS_FS_V1 = (1 << 13) - 1
+LANDLOCK_ACCESS_FS_REFER = 1 << 13
+LANDLOCK_ACCESS_FS_TRUNCATE = 1 << 14
+
+
+class IsolationError(RuntimeError):
+    """El kernel no permite aislar el proceso (el sandbox no debe ejecutar código)"""
+
+
+def _libc():
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.syscall.restype = ctypes.c_long
+    libc.prctl.argtypes = [ctypes.c_int, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_ulong]
+    return libc
+
+
+def _check(result, what):
+    if result < 0:
+        code = ctypes.get_errno()
+        raise IsolationError(f"{what}: {os.strerror(code)}")
+    return result
+
+
+def seccomp_program(machine: str = None):
+    """Programa BPF (lista de (code, jt, jf, k)) para la arquitectura de este proceso"""
+    machine = machine or platform.machine()
+    if machine not in SYSCALLS:
+        raise IsolationError(f"seccomp filter not available for {machine}")
+    audit_arch, blocked, opens = SYSCALLS[machine]
+    deny = SECCOMP_RET_ERRNO | errno.EPERM
+    program = [
+        (BPF_LD_W_ABS, 0, 0, DATA_ARCH),
+        (BPF_JEQ_K, 1, 0, audit_arch),
+        (BPF_RET_K, 0, 0, SECCOMP_RET_KILL_PROCESS),
+        (BPF_LD_W_ABS, 0, 0, DATA_NR),
+    ]
+    if machine == "x86_64":
+        # ABI x32 (nr con el bit 30): mismas llamadas con otros números
+        program += [(BPF_JGE_K, 0, 1, 0x40000000), (BPF_RET_K, 0, 0, deny)]
+    for number in sorted(set(blocked.values())):
+        program += [(BPF_JEQ_K, 0, 1, number), (BPF_RET_K, 0, 0, deny)]
+    for number, flags_arg in opens.values():
+        # open/openat solo de lectura
+        program += [
+            (BPF_JEQ_K, 0, 4, number),
+            (BPF_LD_W_ABS, 0, 0, DATA_ARGS + 8 * flags_arg),
+            (BPF_JSET_K, 0, 1, OPEN_WRITE_FLAGS),
+            (BPF_RET_K, 0, 0, deny),
+            (BPF_RET_K, 0, 0, SECCOMP_RET_ALLOW),
+        ]
+    program.append((BPF_RET_K, 0, 0, SECCOMP_RET_ALLOW))
+    return program
+
+
+def install_seccomp(libc=None):
+    libc = libc or _libc()
+    program = seccomp_program()
+    raw = b"".join(struct.pack("HBBI", *instruction) for instruction in program)
+    buffer = ctypes.create_string_buffer(raw, len(raw))
+
+    class SockFprog(ctypes.Structure):
+        _fields_ = [("len", ctypes.c_ushort), ("filter", ctypes.c_void_p)]
+
+    fprog = SockFprog(len(program), ctypes.cast(buffer, ctypes.c_void_p))
+    _check(libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0), "PR_SET_NO_NEW_PRIVS")
+    _check(libc.prctl(PR_SET_SECCOMP, SECCOMP_MODE_FILTER, ctypes.addressof(fprog), 0, 0), "seccomp")
+
+
+def readable_roots():
+    """Directorios de la instalación de Python (biblioteca estándar y paquetes), sin el de la API"""
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    roots = {sys.prefix, sys.base_prefix, sys.exec_prefix, sys.base_exec_prefix}
+    roots.update(path for path in sys.path if path and os.path.isdir(path))
+    # Un directorio que contenga el de la API (o sea él) daría acceso a .env
+    return sorted(
+        root for root in {os.path.realpath(root) for root in roots}
+        if root != app_dir and not app_dir.startswith(root.rstrip(os.sep) + os.sep)
+    )
+
+
+def install_landlock(roots, libc=None) -> int:
+    """Restringir el sistema de ficheros a lectura bajo roots; devuelve la versión de ABI (0 = no disponible)"""
+    libc = libc or _libc()
+    abi = libc.syscall(SYS_LANDLOCK_CREATE_RULESET, None, ctypes.c_size_t(0), LANDLOCK_CREATE_RULESET_VERSION)
+    if abi < 0:
+        return 0
+    handled = LANDLOCK_ACCESS_FS_V1
+    if abi >= 2:
+        handled |= LANDLOCK_ACCESS_FS_REFER
+    if abi >= 3:
+        handled |= LANDLOCK_ACCESS_FS_TRUNCATE
+    attr = ctypes.create_string_buffer(struct.pack("Q", handled), 8)
+    ruleset = _check(libc.syscall(SYS_LANDLOCK_CREATE_RULESET, attr, ctypes.c_size_t(8), 0), "landlock ruleset")
+    try:
+        for root in roots:
+            try:
+                fd = os.open(root, os.O_PATH | os.O_CLOEXEC)
+            except OSError:
+                continue
+            try:
+                rule = ctypes.create_string_buffer(
+                    struct.pack("=Qi", LANDLOCK_ACCESS_FS_READ_FILE | LANDLOCK_ACCESS_FS_READ_DIR, fd), 12
+                )
+                _check(libc.syscall(SYS_LANDLOCK_ADD_RULE, ruleset, LANDLOCK_RULE_PATH_BENEATH, rule, 0),
+                       f"landlock rule {root}")
+            finally:
+                os.close(fd)
+        _check(libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0), "PR_SET_NO_NEW_PRIVS")
+        _check(libc.syscall(SYS_LANDLOCK_RESTRICT_SELF, ruleset, 0), "landlock restrict")
+    finally:
+        os.close(ruleset)
+    return abi
+
+
+def die_with_parent(libc=None):
+    """SIGKILL a este proceso si muere el que lo creó (un worker sustituido no deja hijos huérfanos)"""
+    if sys.platform == "linux":
+        libc = libc or _libc()
+        _check(libc.prctl(PR_SET_PDEATHSIG, signal.SIGKILL, 0, 0, 0), "PR_SET_PDEATHSIG")
+
+
+def scrub_environment(libc=None):
+    """Borrar las variables de entorno heredadas (SECRET_KEY, DB_PASSWORD...) también de la memoria de libc"""
+    import posix
+
+    libc = libc or _libc()
+    libc.getenv.restype = ctypes.c_void_p
+    for key, value in list(os.environb.items()):
+        pointer = libc.getenv(key)
+        if pointer:
+            ctypes.memset(pointer, 0, len(value))
+    os.environ.clear()
+    posix.environ.clear()
+
+
+def confine(require: bool = True):
+    """Aislar este proceso; IsolationError si seccomp no está disponible y require=True.
+
+    Landlock va primero porque sus reglas abren los directorios permitidos.
+    Sin Landlock (kernel < 5.13) se sigue con seccomp y el entorno ya borrado.
+    Devuelve {"seccomp": bool, "landlock_abi": int}.
+    """
+    status = {"seccomp": False, "landlock_abi": 0}
+    if sys.platform != "linux":
+        if require:
+            raise IsolationError(f"kernel isolation not available on {sys.platform}")
+        return status
+    libc = _libc()
+    status["landlock_abi"] = install_landlock(readable_roots(), libc)
+    try:
+        install_seccomp(libc)
+        status["seccomp"] = True
+    except IsolationError:
+        if require:
+            raise
+    return status
@@ -0,0 +1,86 @@
+# api/schema_upgrades.py - Ajustes de esquema que create_all no aplica a tablas existentes
+import logging
+
+from sqlalchemy import Index, UniqueConstraint, inspect, text
+
+from database import Base
+
+logger = logging.getLogger(__name__)
+
+
+def _existing_index_names(inspector, table_name):
+    names = {index["name"] for index in inspector.get_indexes(table_name)}
+    names |= {constraint["name"] for constraint in inspector.get_unique_constraints(table_name)}
+    return names
+
+
+def ensure_indexes(engine):
+    """Crear los índices/únicos declarados en models.py que falten en tablas ya existentes"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = _existing_index_names(inspector, table.name)
+        wanted = [index for index in table.indexes if index.name]
+        # Los UniqueConstraint se crean como índice único en tablas existentes
+        for constraint in list(table.constraints):
+            if isinstance(constraint, UniqueConstraint) and constraint.name:
+                unique_index = Index(constraint.name, *constraint.columns, unique=True)
+                # Index() se adjunta a la tabla; quitarlo para no duplicarlo en create_all
+                table.indexes.discard(unique_index)
+                wanted.append(unique_index)
+        for index in wanted:
+            if index.name in existing:
+                continue
+            try:
+                index.create(bind=engine)
+                created.append(index.name)
+                logger.info("🗂️ Index created: %s", index.name)
+            except Exception as e:
+                # p. ej. duplicados que impiden un índice único
+                logger.error("❌ Could not create index %s: %s", index.name, e)
+    return created
+
+
+def _default_sql(column, dialect):
+    """DEFAULT de la columna para ALTER TABLE (server_default de models.py)"""
+    default = column.server_default.arg
+    if isinstance(default, str):
+        return "'" + default.replace("'", "''") + "'"
+    return str(default.compile(dialect=dialect))
+
+
+def ensure_columns(engine):
+    """Añadir las columnas declaradas en models.py que falten en tablas ya existentes"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    preparer = engine.dialect.identifier_preparer
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            statement = (
+                f"ALTER TABLE {preparer.format_table(table)} "
+                f"ADD COLUMN {preparer.format_column(column)} {column_type}"
+            )
+            if not column.nullable:
+                # Una columna NOT NULL necesita server_default para rellenar las filas existentes
+                if column.server_default is None:
+                    logger.error("❌ Cannot add NOT NULL column without server_default: %s.%s", table.name, column.name)
+                    continue
+                statement += f" NOT NULL DEFAULT {_default_sql(column, engine.dialect)}"
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(statement))
+                added.append(f"{table.name}.{column.name}")
+                logger.info("🗂️ Column added: %s.%s", table.name, column.name)
+            except Exception as e:
+                logger.error("❌ Could not add column %s.%s: %s", table.name, column.name, e)
+    return added
@@ -56,6 +56,24 @@ class RefreshTokenRequest(BaseModel):  # ✅ NUEVO: Para solicitudes de refresh
 
 class TokenData(BaseModel):
     email: Optional[str] = None
+    exp: Optional[int] = None
+    user_id: Optional[int] = None  # claim "uid" (None en tokens emitidos antes de incluirlo)
+    version: int = 0               # claim "ver"
+    jti: Optional[str] = None          # id del token (lista de revocados)
+    refresh_jti: Optional[str] = None  # claim "rjti": jti del refresh emitido con este access
+    iat: Optional[int] = None
+    family: Optional[str] = None   # claim "fam": familia de refresh tokens (sesión)
+    generation: int = 0            # claim "gen": rotación del refresh dentro de su familia
+
+class PasswordChange(BaseModel):
+    current_password: str
+    new_password: str
+    
+    @validator('new_password')
+    def validate_new_password(cls, v):
+        if len(v) < 6:
+            raise ValueError('Password must be at least 6 characters long')
+        return v
 
 # Course schemas
 class CourseBase(BaseModel):
@@ -134,6 +152,24 @@ class Lesson(LessonBase):
     class Config:
         from_attributes = True
 
+# Course tree schemas (curso -> módulos -> resúmenes de lecciones)
+class LessonSummary(BaseModel):
+    id: int
+    module_id: str
+    title: str
+    position: int
+    # Cuerpo opcional, solo presente si se pide con ?fields=
+    theory: Optional[str] = None
+    practice_instructions: Optional[str] = None
+    practice_initial_code: Optional[str] = None
+    practice_solution: Optional[str] = None
+
+class ModuleTree(Module):
+    lessons: List[LessonSummary] = []
+
+class CourseTree(Course):
+    modules: List[ModuleTree] = []
+
 # Progress schemas
 class UserProgressBase(BaseModel):
     user_id: int
@@ -0,0 +1,264 @@
+# api/submission_jobs.py - Cola de corrección en base de datos (modo asíncrono de /enviar)
+import argparse
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+import metrics
+from attempt_buffer import record_attempt
+from grading import grade, matchers, submission_result
+from models import SubmissionJob
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuración
+SUBMISSION_ASYNC = os.getenv("SUBMISSION_ASYNC", "false").lower() in ("1", "true", "yes")
+# Hilos de corrección dentro de la API (0 = solo workers externos: python submission_jobs.py)
+SUBMISSION_WORKERS = int(os.getenv("SUBMISSION_WORKERS", "1" if SUBMISSION_ASYNC else "0"))
+SUBMISSION_BATCH_SIZE = int(os.getenv("SUBMISSION_BATCH_SIZE", "8"))
+SUBMISSION_POLL_SECONDS = float(os.getenv("SUBMISSION_POLL_SECONDS", "0.5"))
+# Un trabajo 'running' más antiguo que esto se considera huérfano (worker caído) y se reencola
+SUBMISSION_JOB_TIMEOUT = float(os.getenv("SUBMISSION_JOB_TIMEOUT", "120"))
+SUBMISSION_MAX_TRIES = int(os.getenv("SUBMISSION_MAX_TRIES", "3"))
+# Espera máxima de GET /lessons/jobs/{id}?wait=N
+SUBMISSION_MAX_WAIT = float(os.getenv("SUBMISSION_MAX_WAIT", "30"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+queue_latency = metrics.Histogram()
+grading_latency = metrics.Histogram()
+# Despierta a los hilos de este proceso en cuanto se encola algo (los demás nodos sondean)
+_wakeup = threading.Event()
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def new_job(user_id: int, lesson_id: int, code_submitted: str) -> SubmissionJob:
+    return SubmissionJob(user_id=user_id, lesson_id=lesson_id, code_submitted=code_submitted, status=QUEUED)
+
+
+def enqueued(job: SubmissionJob):
+    """Avisar a los workers locales tras el commit del trabajo"""
+    _wakeup.set()
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/lessons/jobs/{job.id}",
+    }
+
+
+def job_status(job: SubmissionJob):
+    body = {"job_id": job.id, "lesson_id": job.lesson_id, "status": job.status}
+    if job.status == DONE:
+        body.update(json.loads(job.result))
+    elif job.status == FAILED:
+        body["error"] = job.error
+    return body
+
+
+def job_query(job_id: int, user_id: int):
+    # populate_existing: cada sondeo del long-poll relee la fila aunque ya esté en la sesión
+    return (
+        select(SubmissionJob)
+        .where(SubmissionJob.id == job_id, SubmissionJob.user_id == user_id)
+        .execution_options(populate_existing=True)
+    )
+
+
+def clamp_wait(wait: float) -> float:
+    return max(0.0, min(wait, SUBMISSION_MAX_WAIT))
+
+
+def claim_query(limit: int):
+    return (
+        select(SubmissionJob.id)
+        .where(SubmissionJob.status == QUEUED)
+        .order_by(SubmissionJob.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def claim_jobs(db: Session, worker: str, limit: int = SUBMISSION_BATCH_SIZE):
+    """Reclamar hasta `limit` trabajos en cola.
+
+    FOR UPDATE SKIP LOCKED deja que varios workers (procesos o nodos) reclamen
+    en paralelo sin bloquearse; el UPDATE condicionado a status='queued' cubre
+    los motores que lo ignoran (SQLite).
+    """
+    ids = db.execute(claim_query(limit)).scalars().all()
+    if not ids:
+        db.rollback()
+        return []
+    db.execute(
+        update(SubmissionJob)
+        .where(SubmissionJob.id.in_(ids), SubmissionJob.status == QUEUED)
+        .values(status=RUNNING, worker=worker, started_at=_utcnow(), tries=SubmissionJob.tries + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return db.execute(
+        select(SubmissionJob).where(
+            SubmissionJob.id.in_(ids), SubmissionJob.status == RUNNING, SubmissionJob.worker == worker
+        ).order_by(SubmissionJob.id)
+    ).scalars().all()
+
+
+def requeue_stale(db: Session):
+    """Devolver a la cola los trabajos de workers caídos (o marcarlos fallidos tras N intentos)"""
+    cutoff = _utcnow() - timedelta(seconds=SUBMISSION_JOB_TIMEOUT)
+    stale = (SubmissionJob.status == RUNNING, SubmissionJob.started_at < cutoff)
+    failed = db.execute(
+        update(SubmissionJob)
+        .where(*stale, SubmissionJob.tries >= SUBMISSION_MAX_TRIES)
+        .values(status=FAILED, error="Grading timed out", finished_at=_utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    requeued = db.execute(
+        update(SubmissionJob)
+        .where(*stale)
+        .values(status=QUEUED, worker=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    if failed or requeued:
+        logger.warning("⚠️ Stale submission jobs: %s requeued, %s failed", requeued, failed)
+    return requeued
+
+
+def process_job(db: Session, job: SubmissionJob):
+    """Corregir un trabajo y guardar intento + veredicto en la misma transacción"""
+    started = time.perf_counter()
+    if job.created_at is not None:
+        queue_latency.observe(max((_utcnow() - job.created_at.replace(tzinfo=None)).total_seconds(), 0.0))
+    try:
+        matcher = matchers.get(db, job.lesson_id)
+        if matcher is None:
+            job.status, job.error = FAILED, "Lesson not found"
+        else:
+            submitted_code = job.code_submitted.strip()
+            is_correct, test_results = grade(matcher, submitted_code, db)
+            attempt_id = record_attempt(db, job.user_id, job.lesson_id, job.code_submitted, is_correct)
+            job.status = DONE
+            job.result = json.dumps(
+                submission_result(matcher, submitted_code, is_correct, attempt_id, test_results),
+                ensure_ascii=False,
+            )
+        job.finished_at = _utcnow()
+        db.commit()
+    except Exception as e:
+        logger.error("Error grading submission job %s: %s", job.id, e)
+        db.rollback()
+        # Sin veredicto: vuelve a la cola hasta SUBMISSION_MAX_TRIES
+        db.execute(
+            update(SubmissionJob)
+            .where(SubmissionJob.id == job.id)
+            .values(
+                status=FAILED if job.tries >= SUBMISSION_MAX_TRIES else QUEUED,
+                error=str(e),
+                worker=None,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    finally:
+        grading_latency.observe(time.perf_counter() - started)
+
+
+def run_worker(session_factory, stop: threading.Event, worker: str = None):
+    """Bucle de un worker: reclamar lote, corregir, y esperar si la cola está vacía"""
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    last_sweep = 0.0
+    logger.info("🧵 Submission worker %s started", worker)
+    while not stop.is_set():
+        try:
+            with session_factory() as db:
+                if time.monotonic() - last_sweep > SUBMISSION_JOB_TIMEOUT / 2:
+                    requeue_stale(db)
+                    last_sweep = time.monotonic()
+                jobs = claim_jobs(db, worker)
+                for job in jobs:
+                    process_job(db, job)
+        except Exception as e:
+            logger.error("Submission worker %s error: %s", worker, e)
+            jobs = []
+        if not jobs:
+            _wakeup.wait(SUBMISSION_POLL_SECONDS)
+            _wakeup.clear()
+
+
+class WorkerThreads:
+    """Hilos de corrección dentro del proceso de la API"""
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self, session_factory, count: int = SUBMISSION_WORKERS):
+        for index in range(count):
+            thread = threading.Thread(
+                target=run_worker, args=(session_factory, self._stop),
+                name=f"submission-worker-{index}", daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        _wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+
+def queue_stats():
+    return {
+        "async_mode": SUBMISSION_ASYNC,
+        "in_process_workers": len(worker_threads._threads),
+        "queue_wait_seconds": queue_latency.snapshot(),
+        "grading_seconds": grading_latency.snapshot(),
+    }
+
+
+worker_threads = WorkerThreads()
+metrics.register("submission_jobs", queue_stats)
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    from logging_config import setup_logging, stop_logging
+    from attempt_buffer import ATTEMPT_BUFFER_ENABLED, attempt_buffer
+    from sandbox import sandbox_pool
+
+    parser = argparse.ArgumentParser(description="Worker de corrección de envíos")
+    parser.add_argument("--threads", type=int, default=1, help="hilos de corrección en este proceso")
+    args = parser.parse_args()
+
+    setup_logging()
+    if ATTEMPT_BUFFER_ENABLED:
+        attempt_buffer.start()
+    worker_threads.start(SessionLocal, args.threads)
+    print(f"🧵 {args.threads} submission workers running, Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker_threads.stop()
+        attempt_buffer.stop()
+        sandbox_pool.shutdown()
+        stop_logging()
@@ -0,0 +1,34 @@
+# api/tests/conftest.py - Entorno de las pruebas: módulos de api/ importables y SQLite temporal
+import os
+import sys
+import tempfile
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+# Antes de importar database/main: load_dotenv() no sobrescribe variables ya definidas
+_tmp = tempfile.mkdtemp(prefix="codemastery-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/tests.db"
+os.environ["DB_ASYNC"] = "false"
+os.environ["LOG_DIR"] = _tmp
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def db_engine():
+    """Engine de database.py con todas las tablas creadas en la SQLite temporal"""
+    import models
+    from database import engine
+
+    models.Base.metadata.create_all(bind=engine)
+    return engine
+
+
+@pytest.fixture
+def session_factory(db_engine):
+    from database import SessionLocal
+
+    return SessionLocal
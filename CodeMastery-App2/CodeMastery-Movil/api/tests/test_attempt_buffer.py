@@ -0,0 +1,175 @@
+# api/tests/test_attempt_buffer.py - Flush con filas inválidas, fallos transitorios y tope de pendientes
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+import attempt_buffer
+from attempt_buffer import AttemptBuffer
+from models import ExerciseAttempt
+
+
+@pytest.fixture
+def buffer(db_engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(attempt_buffer, "LOG_DIR", str(tmp_path))
+    return AttemptBuffer(max_rows=1000, max_delay=60, max_pending=50)
+
+
+def stored(engine, ids):
+    with engine.connect() as conn:
+        return conn.execute(
+            select(func.count()).select_from(ExerciseAttempt).where(ExerciseAttempt.id.in_(ids))
+        ).scalar()
+
+
+def test_rejected_rows_are_dead_lettered_and_the_rest_inserted(buffer, db_engine, tmp_path):
+    ids = [buffer.add(1, 1, f"print({n})", True) for n in range(10)]
+    # Id duplicado: la base de datos nunca aceptará esta fila
+    buffer._rows.append(dict(buffer._rows[4]))
+
+    assert buffer.flush() == 10
+    assert stored(db_engine, ids) == 10
+    assert buffer.dead_letters == 1
+    [path] = tmp_path.glob("attempt_dead_letters_*.log")
+    [entry] = [json.loads(line) for line in path.read_text().splitlines()]
+    assert entry["row"]["id"] == ids[4]
+
+    # Los lotes siguientes ya no arrastran la fila
+    later = buffer.add(1, 1, "print('later')", False)
+    assert buffer.flush() == 1
+    assert stored(db_engine, [later]) == 1
+
+
+def test_transient_failure_keeps_rows_for_retry(buffer, db_engine, monkeypatch):
+    ids = [buffer.add(1, 1, "x", False) for _ in range(5)]
+
+    def connection_lost(rows):
+        raise OperationalError("INSERT", {}, Exception("server has gone away"))
+
+    monkeypatch.setattr(buffer, "_insert", connection_lost)
+    assert buffer.flush() == 0
+    assert buffer.failed_flushes == 1
+    assert buffer.dead_letters == 0
+    assert len(buffer._rows) == 5
+
+    monkeypatch.undo()
+    assert buffer.flush() == 5
+    assert stored(db_engine, ids) == 5
+
+
+def test_stop_dead_letters_what_the_database_never_accepted(buffer, tmp_path, monkeypatch):
+    ids = [buffer.add(1, 1, "x", False) for _ in range(3)]
+
+    def connection_lost(rows):
+        raise OperationalError("INSERT", {}, Exception("server has gone away"))
+
+    monkeypatch.setattr(buffer, "_insert", connection_lost)
+    monkeypatch.setattr(attempt_buffer.time, "sleep", lambda seconds: None)
+    buffer.stop()
+
+    assert buffer._rows == []
+    assert buffer.failed_flushes == attempt_buffer.ATTEMPT_BUFFER_SHUTDOWN_RETRIES + 1
+    assert buffer.dead_letters == 3
+    [path] = tmp_path.glob("attempt_dead_letters_*.log")
+    assert [json.loads(line)["row"]["id"] for line in path.read_text().splitlines()] == ids
+
+
+def test_full_buffer_falls_back_to_an_insert_in_the_request(buffer, session_factory, monkeypatch):
+    buffer.max_pending = 2
+    assert buffer.add(1, 1, "a", True) is not None
+    assert buffer.add(1, 1, "b", True) is not None
+    assert buffer.add(1, 1, "c", True) is None
+    assert buffer.overflows == 1
+
+    monkeypatch.setattr(attempt_buffer, "ATTEMPT_BUFFER_ENABLED", True)
+    monkeypatch.setattr(attempt_buffer, "attempt_buffer", buffer)
+    with session_factory() as db:
+        attempt_id = attempt_buffer.record_attempt(db, 1, 1, "d", True)
+        db.commit()
+        assert db.get(ExerciseAttempt, attempt_id) is not None
+    assert len(buffer._rows) == 2
+
+
+def test_block_reservation_does_not_hold_the_id_lock(db_engine, monkeypatch):
+    ids = attempt_buffer.HiLoAllocator("test_attempts", ExerciseAttempt.id, block_size=2)
+    reserving, release = threading.Event(), threading.Event()
+    reserve_block = ids._reserve_block
+
+    def slow_reserve():
+        reserving.set()
+        release.wait(5)
+        return reserve_block()
+
+    monkeypatch.setattr(ids, "_reserve_block", slow_reserve)
+    first = threading.Thread(target=ids.next_id)
+    first.start()
+    assert reserving.wait(5)
+    # Lo que hace next_id_async en el event loop mientras otro hilo reserva
+    assert ids._lock.acquire(timeout=0.5)
+    ids._lock.release()
+    release.set()
+    first.join(5)
+
+    monkeypatch.setattr(ids, "_reserve_block", reserve_block)
+    with ThreadPoolExecutor(8) as threads:
+        allocated = list(threads.map(lambda _: ids.next_id(), range(40)))
+    assert len(set(allocated)) == 40
+
+
+def test_pending_attempts_are_merged_into_the_keyset_page():
+    from datetime import datetime, timedelta
+
+    from pagination import decode_cursor, paginate
+    from queries import ATTEMPT_PAGE_KEYS
+
+    base = datetime(2026, 10, 1, 12, 0, 0)
+    stored = [
+        attempt_buffer.PendingAttempt(n, 1, 1, "", True, base + timedelta(seconds=n)) for n in range(10, 0, -1)
+    ]
+    pending = [
+        {"id": 12, "user_id": 1, "lesson_id": 1, "code_submitted": "", "is_correct": True,
+         "attempt_date": base + timedelta(seconds=12)},
+        {"id": 11, "user_id": 1, "lesson_id": 1, "code_submitted": "", "is_correct": True,
+         "attempt_date": base + timedelta(seconds=11)},
+        # Ya insertado: llega también desde la tabla
+        {"id": 10, "user_id": 1, "lesson_id": 1, "code_submitted": "", "is_correct": True,
+         "attempt_date": base + timedelta(seconds=10)},
+        # Más antiguo que la primera página: debe salir en la segunda
+        {"id": 13, "user_id": 1, "lesson_id": 1, "code_submitted": "", "is_correct": False,
+         "attempt_date": base + timedelta(seconds=5)},
+    ]
+
+    def page(cursor):
+        cursor_values = decode_cursor(cursor, 2) if cursor else None
+
+        def query(condition, order_by, page_size):
+            rows = [row for row in stored if cursor_values is None or (row.attempt_date, row.id) < cursor_values]
+            return attempt_buffer.merge_pending(rows[:page_size], pending, cursor_values, page_size)
+
+        return paginate(query, ATTEMPT_PAGE_KEYS, cursor, 4, descending=True)
+
+    first = page(None)
+    assert [attempt.id for attempt in first.items] == [12, 11, 10, 9]
+    second = page(first.next_cursor)
+    assert [attempt.id for attempt in second.items] == [8, 7, 6, 13]
+    third = page(second.next_cursor)
+    assert [attempt.id for attempt in third.items] == [5, 4, 3, 2]
+
+
+def test_buffered_and_direct_attempts_use_the_same_clock(buffer, session_factory, monkeypatch):
+    monkeypatch.setattr(attempt_buffer, "ATTEMPT_BUFFER_ENABLED", False)
+    with session_factory() as db:
+        attempt_id = attempt_buffer.record_attempt(db, 1, 1, "direct", True)
+        db.commit()
+        direct = db.get(ExerciseAttempt, attempt_id).attempt_date
+    buffered_id = buffer.add(1, 1, "buffered", True)
+    queued = buffer.pending(1)[0]["attempt_date"]
+    buffer.flush()
+    with session_factory() as db:
+        stored = db.get(ExerciseAttempt, buffered_id).attempt_date
+    assert stored == queued
+    assert abs(direct - attempt_buffer._utcnow()).total_seconds() < 5
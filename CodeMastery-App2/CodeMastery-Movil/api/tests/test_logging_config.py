@@ -0,0 +1,34 @@
+# api/tests/test_logging_config.py - Los registros encolados no dependen de objetos que cambien después
+import logging
+import queue
+
+from logging_config import JsonFormatter, LazyQueueHandler
+
+
+class Attempt:
+    def __init__(self, status):
+        self.status = status
+
+    def __repr__(self):
+        return f"<Attempt {self.status}>"
+
+
+def test_message_is_interpolated_before_it_is_queued():
+    records = queue.SimpleQueue()
+    logger = logging.getLogger("tests.lazy_queue")
+    logger.propagate = False
+    handler = LazyQueueHandler(records)
+    logger.addHandler(handler)
+    try:
+        attempt = Attempt("pending")
+        logger.warning("Saving %r", attempt, extra={"attempt": attempt, "status": 201})
+        attempt.status = "committed"
+    finally:
+        logger.removeHandler(handler)
+
+    record = records.get_nowait()
+    assert record.getMessage() == "Saving <Attempt pending>"
+    assert record.args is None
+    assert record.attempt == "<Attempt pending>"
+    assert record.status == 201
+    assert '"status": 201' in JsonFormatter().format(record)
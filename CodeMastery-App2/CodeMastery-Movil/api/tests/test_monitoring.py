@@ -0,0 +1,45 @@
+# api/tests/test_monitoring.py - /metrics solo desde redes permitidas o con METRICS_TOKEN
+import asyncio
+
+import httpx
+import pytest
+
+import routers.monitoring as monitoring
+
+
+def get_metrics(client_ip, headers=None):
+    from main import app
+
+    async def request():
+        transport = httpx.ASGITransport(app=app, client=(client_ip, 40000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/metrics/", headers=headers or {})
+
+    return asyncio.run(request()).status_code
+
+
+@pytest.fixture
+def token(monkeypatch):
+    monkeypatch.setattr(monitoring, "METRICS_TOKEN", "scrape-secret")
+    return "scrape-secret"
+
+
+def test_local_clients_are_allowed():
+    assert get_metrics("127.0.0.1") == 200
+    assert get_metrics("::ffff:127.0.0.1") == 200
+
+
+def test_remote_clients_need_the_token(token):
+    assert get_metrics("203.0.113.7") == 403
+    assert get_metrics("203.0.113.7", {"Authorization": "Bearer wrong"}) == 403
+    assert get_metrics("203.0.113.7", {"Authorization": f"Bearer {token}"}) == 200
+
+
+def test_allowlist_accepts_networks(monkeypatch):
+    monkeypatch.setattr(monitoring, "ALLOWED_NETWORKS", monitoring.parse_networks("10.0.0.0/8"))
+    assert get_metrics("10.1.2.3") == 200
+    assert get_metrics("127.0.0.1") == 403
+
+
+def test_no_token_configured_never_matches():
+    assert get_metrics("203.0.113.7", {"Authorization": "Bearer "}) == 403
@@ -0,0 +1,44 @@
+# api/tests/test_principal_cache.py - exp como hora Unix real y caducidad por max_age
+import time
+
+import pytest
+
+import auth
+import principal_cache
+from principal_cache import Principal, PrincipalCache
+
+
+@pytest.fixture
+def timezone_ahead_of_utc(monkeypatch):
+    monkeypatch.setenv("TZ", "Asia/Tokyo")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_token_exp_is_unix_time_on_hosts_ahead_of_utc(timezone_ahead_of_utc):
+    token = auth.create_access_token({"sub": "ana@example.com", "uid": 1})
+    token_data = auth.verify_token(token)
+    assert token_data is not None
+    assert abs(token_data.exp - (time.time() + auth.ACCESS_TOKEN_EXPIRE_MINUTES * 60)) < 5
+
+
+def test_cache_hits_until_exp():
+    cache = PrincipalCache(max_size=10, max_age=30)
+    principal = Principal(id=1, name="Ana", email="ana@example.com")
+    cache.put("live", principal, int(time.time()) + 60)
+    cache.put("expired", principal, int(time.time()) - 1)
+    assert cache.get("live") is principal
+    assert cache.get("expired") is None
+
+
+def test_max_age_uses_the_monotonic_clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(principal_cache.time, "monotonic", lambda: now[0])
+    cache = PrincipalCache(max_size=10, max_age=30)
+    cache.put("token", Principal(id=1, name="Ana", email="ana@example.com"), int(time.time()) + 3600)
+    now[0] += 29
+    assert cache.get("token") is not None
+    now[0] += 2
+    assert cache.get("token") is None
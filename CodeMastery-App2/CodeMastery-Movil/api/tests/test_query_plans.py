@@ -0,0 +1,21 @@
+# api/tests/test_query_plans.py - Las consultas calientes de los routers usan índices (check_query_plans)
+import pytest
+from sqlalchemy import create_engine
+
+from check_query_plans import create_schema, explain, hot_queries, plan_problems
+
+HOT_QUERIES = hot_queries()
+
+
+@pytest.fixture(scope="module")
+def conn():
+    engine = create_engine("sqlite://")
+    create_schema(engine)
+    with engine.connect() as connection:
+        yield connection
+    engine.dispose()
+
+
+@pytest.mark.parametrize("name, statement", HOT_QUERIES, ids=[name for name, _ in HOT_QUERIES])
+def test_hot_query_uses_an_index(conn, name, statement):
+    assert plan_problems(conn.dialect.name, explain(conn, statement)) == []
@@ -0,0 +1,159 @@
+# api/tests/test_rate_limit.py - GCRA de LocalBackend, orden IP/email y Retry-After de /auth/login
+import asyncio
+
+import httpx
+import pytest
+
+import rate_limit
+from rate_limit import LocalBackend, LoginRateLimiter
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def backend(clock):
+    return LocalBackend(sweep_seconds=60, clock=clock)
+
+
+def take(backend, key="k", burst=3, per_second=1.0):
+    return asyncio.run(backend.take(key, burst, per_second))
+
+
+def test_burst_is_allowed_then_rejected(backend):
+    assert [take(backend) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert take(backend) == pytest.approx(1.0)
+
+
+def test_refills_one_token_per_interval(backend, clock):
+    for _ in range(3):
+        take(backend)
+    clock.advance(1.0)
+    assert take(backend) == 0.0
+    assert take(backend) == pytest.approx(1.0)
+
+
+def test_retry_after_counts_down(backend, clock):
+    for _ in range(3):
+        take(backend)
+    clock.advance(0.25)
+    assert take(backend) == pytest.approx(0.75)
+
+
+def test_rejected_attempts_do_not_consume_tokens(backend, clock):
+    for _ in range(3):
+        take(backend)
+    for _ in range(10):
+        assert take(backend) > 0
+    clock.advance(1.0)
+    assert take(backend) == 0.0
+
+
+def test_idle_bucket_refills_to_burst_only(backend, clock):
+    for _ in range(3):
+        take(backend)
+    clock.advance(3600)
+    assert [take(backend) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert take(backend) > 0
+
+
+def test_keys_are_independent(backend):
+    for _ in range(3):
+        take(backend, "a")
+    assert take(backend, "a") > 0
+    assert take(backend, "b") == 0.0
+
+
+def test_sweep_drops_full_buckets(clock):
+    backend = LocalBackend(sweep_seconds=5, clock=clock)
+    take(backend, "a")
+    clock.advance(10)
+    take(backend, "b")
+    assert backend.stats() == {"buckets": 1, "evicted": 1}
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """IP: ráfaga 2; email: ráfaga 3; ambos recargan 1 intento/min"""
+    monkeypatch.setattr(rate_limit, "LOGIN_IP_BURST", 2)
+    monkeypatch.setattr(rate_limit, "LOGIN_IP_PER_MINUTE", 1)
+    monkeypatch.setattr(rate_limit, "LOGIN_EMAIL_BURST", 3)
+    monkeypatch.setattr(rate_limit, "LOGIN_EMAIL_PER_MINUTE", 1)
+
+
+def check(limiter, ip, email="victim@example.com"):
+    return asyncio.run(limiter.check(ip, email))
+
+
+def test_ip_rejection_does_not_spend_email_tokens(backend, limits):
+    limiter = LoginRateLimiter(backend)
+    assert check(limiter, "10.0.0.1") == 0.0
+    assert check(limiter, "10.0.0.1") == 0.0
+    for _ in range(5):
+        assert check(limiter, "10.0.0.1") > 0
+    assert limiter.rejected_ip == 5
+    # El email gastó 2 de 3: su dueño desde otra IP aún entra una vez
+    assert check(limiter, "10.0.0.2") == 0.0
+    assert check(limiter, "10.0.0.3") > 0
+    assert limiter.rejected_email == 1
+
+
+def test_email_is_limited_across_ips(backend, limits):
+    limiter = LoginRateLimiter(backend)
+    assert [check(limiter, f"10.0.1.{n}") for n in range(3)] == [0.0, 0.0, 0.0]
+    assert check(limiter, "10.0.1.9") == pytest.approx(60.0)
+    assert (limiter.allowed, limiter.rejected_ip, limiter.rejected_email) == (3, 0, 1)
+
+
+def test_missing_client_ip_checks_email_only(backend, limits):
+    limiter = LoginRateLimiter(backend)
+    assert [check(limiter, None) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert check(limiter, None) > 0
+    assert limiter.rejected_ip == 0
+
+
+def test_login_returns_429_with_retry_after_before_bcrypt(monkeypatch, clock):
+    import routers.auth
+    from main import app
+
+    monkeypatch.setattr(rate_limit, "LOGIN_IP_BURST", 100)
+    monkeypatch.setattr(rate_limit, "LOGIN_EMAIL_BURST", 1)
+    monkeypatch.setattr(rate_limit, "LOGIN_EMAIL_PER_MINUTE", 2)
+    monkeypatch.setattr(routers.auth, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(routers.auth, "login_limiter", LoginRateLimiter(LocalBackend(clock=clock)))
+    authenticated = []
+
+    async def fake_authenticate(db, email, password):
+        authenticated.append(email)
+        return False
+
+    monkeypatch.setattr(routers.auth, "authenticate_user_async", fake_authenticate)
+
+    async def attempts():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            body = {"email": "Nobody@Example.com", "password": "wrong-password"}
+            first = await client.post("/auth/login", json=body)
+            clock.advance(10)
+            second = await client.post("/auth/login", json=body)
+            return first, second
+
+    first, second = asyncio.run(attempts())
+    assert first.status_code == 401
+    assert second.status_code == 429
+    # 2 intentos/min = uno cada 30 s; ya pasaron 10
+    assert second.headers["Retry-After"] == "20"
+    assert authenticated == ["nobody@example.com"]
@@ -0,0 +1,70 @@
+# api/tests/test_revocation.py - Revocaciones visibles para otros procesos con el reloj UTC de la API
+from datetime import timedelta
+
+from models import RevokedToken
+from revocation import RevocationStore, _utcnow
+
+
+def test_revocation_reaches_other_processes(session_factory):
+    revoking, other = RevocationStore(), RevocationStore()
+    with session_factory() as db:
+        revoking.load(db)
+        other.load(db)
+
+    jti = "ab" * 16
+    with session_factory() as db:
+        revoking.revoke(db, jti, 1, _utcnow() + timedelta(hours=1))
+        revoked_at = db.get(RevokedToken, jti).revoked_at
+    assert abs(revoked_at - _utcnow()) < timedelta(seconds=5)
+
+    with session_factory() as db:
+        other.sync(db)
+    assert other.is_revoked(jti)
+    assert not other.is_revoked("cd" * 16)
+
+
+def test_logout_with_a_token_that_expired_after_the_dependency_is_401(monkeypatch):
+    import asyncio
+
+    import httpx
+
+    import auth
+    from main import app
+
+    class Principal:
+        id, email, name = 1, "ana@example.com", "Ana"
+
+    monkeypatch.setitem(app.dependency_overrides, auth.get_current_user, lambda: Principal())
+    # El token caduca entre get_current_user y el handler
+    monkeypatch.setattr(auth, "verify_token", lambda token, token_type="access": None)
+
+    async def logout():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/auth/logout", headers={"Authorization": "Bearer expired"})
+
+    response = asyncio.run(logout())
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == "Bearer"
+
+
+def test_refresh_with_a_token_that_expired_after_the_dependency_is_401(monkeypatch):
+    import asyncio
+
+    import httpx
+
+    import auth
+    from main import app
+
+    class Principal:
+        id, email, name = 1, "ana@example.com", "Ana"
+
+    monkeypatch.setitem(app.dependency_overrides, auth.get_current_user_from_refresh_token, lambda: Principal())
+    monkeypatch.setattr(auth, "verify_token", lambda token, token_type="access": None)
+
+    async def refresh():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/auth/refresh", headers={"Authorization": "Bearer expired"})
+
+    assert asyncio.run(refresh()).status_code == 401
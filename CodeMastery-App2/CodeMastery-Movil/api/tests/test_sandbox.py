@@ -0,0 +1,132 @@
+# api/tests/test_sandbox.py - Aislamiento de los envíos: kernel (seccomp/Landlock) y corrección en la API
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sandbox import SandboxPool, SandboxUnavailable
+
+pytestmark = pytest.mark.skipif(sys.platform != "linux", reason="seccomp/Landlock solo en Linux")
+
+ESCAPES = {
+    "socket": "import socket; socket.socket()",
+    "subprocess": "import subprocess; subprocess.run(['id'])",
+    "write": "open('/tmp/codemastery-sandbox-test', 'w').write('x')",
+    "dotenv": f"open({os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')!r}).read()",
+    "kill parent": "import os; os.kill(os.getppid(), 9)",
+}
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = SandboxPool(2, 8, 2, 10, 256, 65536)
+    if not pool.probe():
+        pytest.skip(f"sandbox unavailable on this host: {pool.unavailable}")
+    yield pool
+    pool.shutdown()
+
+
+def test_correct_and_wrong_answers(pool):
+    assert pool.run_sync("print(int(input()) * 2)", [("3", "6"), ("5", "10")])["passed"] is True
+    outcome = pool.run_sync("print(int(input()) * 2)", [("3", "6"), ("5", "11")])
+    assert outcome["passed"] is False
+    assert [result["passed"] for result in outcome["results"]] == [True, False]
+
+
+@pytest.mark.parametrize("name", ESCAPES)
+def test_escape_is_blocked_by_the_kernel(pool, name):
+    # Desactivar lo que antes era el hook de auditoría no cambia nada: el filtro está en el kernel
+    code = "import sys\nsys.modules['sandbox'].BLOCKED_EVENTS = frozenset()\n" + ESCAPES[name]
+    [result] = pool.run_sync(code, [("", "")])["results"]
+    assert result["error"] is not None
+    assert result["error"].startswith("Operación no permitida"), result["error"]
+    assert not os.path.exists("/tmp/codemastery-sandbox-test")
+
+
+def test_submission_cannot_change_another_students_verdict(pool):
+    tamper = "import sys\nsys.modules['sandbox'].normalize_output = lambda text: []\nprint('x')"
+    assert pool.run_sync(tamper, [("", "expected")])["passed"] is False
+    assert pool.run_sync("print('wrong')", [("", "expected")])["passed"] is False
+
+
+def test_environment_is_scrubbed(pool):
+    assert pool.run_sync("import os\nprint(sorted(os.environ))", [("", "[]")])["passed"] is True
+
+
+PICKLE_ESCAPE = """
+import os, sys
+
+class Escape:
+    def __reduce__(self):
+        return (os.makedirs, ({path!r},))
+
+frame, sent = sys._getframe(), []
+while frame is not None:
+    for value in list(frame.f_locals.values()):
+        for channel in (value, getattr(value, "_result_queue", None)):
+            for method in ("send", "put"):
+                try:
+                    getattr(channel, method)(Escape())
+                    sent.append(method)
+                except Exception:
+                    pass
+    frame = frame.f_back
+print(sent)
+"""
+
+
+def test_submission_cannot_reach_a_pickle_channel_to_the_api(pool, tmp_path):
+    target = tmp_path / "escaped"
+    outcome = pool.run_sync(PICKLE_ESCAPE.format(path=str(target)), [("", "[]")])
+    time.sleep(0.2)
+    assert not target.exists()
+    assert outcome["passed"] is True
+
+
+def test_wall_clock_starts_when_the_job_starts():
+    # Un worker y tres trabajos de 1 s con límite de 2 s: los que esperan en cola no caducan
+    pool = SandboxPool(1, 8, 2, 2, 256, 65536)
+    try:
+        with ThreadPoolExecutor(3) as threads:
+            outcomes = list(threads.map(
+                lambda _: pool.run_sync("import time\ntime.sleep(1)\nprint('ok')", [("", "ok")]), range(3)
+            ))
+        assert [outcome["passed"] for outcome in outcomes] == [True, True, True]
+        assert pool.timeouts == 0
+    finally:
+        pool.shutdown()
+
+
+def test_timeout_kills_only_the_stuck_job():
+    pool = SandboxPool(2, 8, 2, 3, 256, 65536)
+    try:
+        with ThreadPoolExecutor(2) as threads:
+            stuck = threads.submit(pool.run_sync, "import time\ntime.sleep(30)", [("", "")])
+            time.sleep(1)
+            # Caduca a los 3 s del primero; este sigue en marcha entonces y termina antes de su propio límite
+            healthy = threads.submit(pool.run_sync, "import time\ntime.sleep(2.5)\nprint('ok')", [("", "ok")])
+            assert stuck.result()["results"][0]["error"] == "Tiempo de ejecución excedido"
+            assert healthy.result()["passed"] is True
+        stats = pool.stats()
+        assert (stats["timeouts"], stats["restarts"], stats["alive_workers"]) == (1, 0, 2)
+    finally:
+        pool.shutdown()
+
+
+def test_workers_are_recycled_after_max_jobs():
+    pool = SandboxPool(1, 8, 2, 10, 256, 65536, max_jobs_per_worker=2)
+    try:
+        for n in range(5):
+            assert pool.run_sync(f"print({n})", [("", str(n))])["passed"] is True
+        assert pool.stats()["recycled"] == 2
+    finally:
+        pool.shutdown()
+
+
+def test_unavailable_pool_rejects_jobs():
+    pool = SandboxPool(1, 1, 2, 10, 256, 65536)
+    pool.unavailable = "BrokenProcessPool: spawn failed"
+    with pytest.raises(SandboxUnavailable):
+        pool.run_sync("print(1)", [("", "1")])
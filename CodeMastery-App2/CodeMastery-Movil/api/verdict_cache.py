@@ -0,0 +1,157 @@
+# api/verdict_cache.py - Caché de veredictos por (lección, versión, hash del código normalizado)
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+import metrics
+from models import GradingVerdict
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuración
+VERDICT_CACHE_ENABLED = os.getenv("VERDICT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+VERDICT_CACHE_SIZE = int(os.getenv("VERDICT_CACHE_SIZE", "50000"))
+# Persistir en grading_verdicts los veredictos del sandbox (los de comparación son más baratos que la consulta)
+VERDICT_CACHE_PERSIST = os.getenv("VERDICT_CACHE_PERSIST", "false").lower() in ("1", "true", "yes")
+
+
+class Verdict:
+    __slots__ = ("is_correct", "test_results", "grade_seconds")
+
+    def __init__(self, is_correct: bool, test_results, grade_seconds: float):
+        self.is_correct = is_correct
+        self.test_results = test_results
+        self.grade_seconds = grade_seconds
+
+
+def code_hash(normalized_code: str) -> str:
+    return hashlib.blake2b(normalized_code.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def verdict_key(lesson_id: int, lesson_version, normalized_code: str):
+    version = lesson_version.isoformat() if hasattr(lesson_version, "isoformat") else str(lesson_version or "")
+    return lesson_id, version, code_hash(normalized_code)
+
+
+class VerdictCache:
+    """LRU en memoria con respaldo opcional en base de datos"""
+
+    def __init__(self, max_size: int = VERDICT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persisted_hits = 0
+        self.misses = 0
+        # Tiempo de corrección ahorrado: suma del coste original de cada acierto
+        self.saved_seconds = 0.0
+
+    def get(self, key):
+        if not VERDICT_CACHE_ENABLED:
+            return None
+        with self._lock:
+            verdict = self._entries.get(key)
+            if verdict is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += verdict.grade_seconds
+            return verdict
+
+    def put(self, key, verdict: Verdict):
+        if not VERDICT_CACHE_ENABLED:
+            return
+        with self._lock:
+            self._entries[key] = verdict
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _stored(self, key, row):
+        """Fila de grading_verdicts -> Verdict, promovida a memoria"""
+        if row is None:
+            return None
+        verdict = Verdict(row.is_correct, json.loads(row.test_results) if row.test_results else None, row.grade_seconds)
+        with self._lock:
+            # get() ya contó el fallo en memoria; pasa a acierto persistido
+            self.misses -= 1
+            self.persisted_hits += 1
+            self.saved_seconds += verdict.grade_seconds
+        self.put(key, verdict)
+        return verdict
+
+    def load(self, db, key):
+        return self._stored(key, db.execute(stored_query(key)).scalars().first())
+
+    async def load_async(self, db, key):
+        return self._stored(key, (await db.execute(stored_query(key))).scalars().first())
+
+    def save(self, db, key, verdict: Verdict):
+        """Guardar dentro de la transacción del envío; un duplicado concurrente se ignora"""
+        try:
+            with db.begin_nested():
+                db.add(stored_row(key, verdict))
+        except IntegrityError:
+            logger.debug("Verdict already stored for lesson %s", key[0])
+
+    async def save_async(self, db, key, verdict: Verdict):
+        try:
+            async with db.begin_nested():
+                db.add(stored_row(key, verdict))
+        except IntegrityError:
+            logger.debug("Verdict already stored for lesson %s", key[0])
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            hits = self.hits + self.persisted_hits
+            total = hits + self.misses
+            return {
+                "enabled": VERDICT_CACHE_ENABLED,
+                "persist": VERDICT_CACHE_PERSIST,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "persisted_hits": self.persisted_hits,
+                "misses": self.misses,
+                "hit_rate": (hits / total) if total else 0.0,
+                "saved_grading_seconds": round(self.saved_seconds, 6),
+            }
+
+
+def stored_query(key):
+    lesson_id, version, digest = key
+    return select(GradingVerdict).where(
+        GradingVerdict.lesson_id == lesson_id,
+        GradingVerdict.code_hash == digest,
+        GradingVerdict.lesson_version == version,
+    )
+
+
+def stored_row(key, verdict: Verdict):
+    lesson_id, version, digest = key
+    return GradingVerdict(
+        lesson_id=lesson_id,
+        code_hash=digest,
+        lesson_version=version,
+        is_correct=verdict.is_correct,
+        test_results=json.dumps(verdict.test_results, ensure_ascii=False) if verdict.test_results is not None else None,
+        grade_seconds=verdict.grade_seconds,
+    )
+
+
+verdicts = VerdictCache()
+metrics.register("verdict_cache", verdicts.stats)